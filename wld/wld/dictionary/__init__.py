@@ -0,0 +1 @@
+default_app_config = 'wld.dictionary.apps.dictionaryConfig'
@@ -24,27 +24,75 @@ def remove_from_fieldsets(fieldsets, fields):
 
                 break
 
-class LemmaAdmin(admin.ModelAdmin):
+class DataChangeAdmin(admin.ModelAdmin):
+    """Admin of a model whose changes alter the dictionary data: raise the data generation
+
+    The search rows of the entries of the changed objects are made again;
+    [entry_path] is the path from Entry to the model of the admin.
+    """
+
+    entry_path = None
+
+    def get_entry_ids(self, lId):
+        """Get the ids of the entries belonging to the objects with an id in [lId]"""
+
+        if self.entry_path == None:
+            return []
+        return list(Entry.objects.filter(**{"{}__in".format(self.entry_path): lId}).values_list('id', flat=True))
+
+    def update_search(self, lEntryId):
+        """Make the search rows of the entries in [lEntryId] again
+
+        The full-text rows follow the saved objects themselves (see the receivers in fulltext.py)
+        """
+
+        if len(lEntryId) > 0:
+            entries_changed.send(sender=self.model, qs=Entry.objects.filter(id__in=lEntryId))
+
+    def save_model(self, request, obj, form, change):
+        super(DataChangeAdmin, self).save_model(request, obj, form, change)
+        self.update_search(self.get_entry_ids([obj.id]))
+        Generation.data_changed()
+
+    def delete_model(self, request, obj):
+        # Entries that remain (e.g. when a coordinate is deleted) need their search rows adapted
+        lEntryId = self.get_entry_ids([obj.id])
+        super(DataChangeAdmin, self).delete_model(request, obj)
+        self.update_search(lEntryId)
+        Generation.data_changed()
+
+    def delete_queryset(self, request, queryset):
+        lEntryId = self.get_entry_ids(list(queryset.values_list('id', flat=True)))
+        super(DataChangeAdmin, self).delete_queryset(request, queryset)
+        self.update_search(lEntryId)
+        Generation.data_changed()
+
+
+class LemmaAdmin(DataChangeAdmin):
+    entry_path = 'lemma'
     fieldsets = ( ('Editable', {'fields': ('gloss', )}),
                 )
     list_display = ['gloss']
     search_fields = ['gloss']
 
 
-class DescriptionAdmin(admin.ModelAdmin):
+class DescriptionAdmin(DataChangeAdmin):
+    entry_path = 'descr'
     fieldsets = ( ('Editable', {'fields': ('toelichting', 'bronnenlijst', 'boek',)}),
                 )
     list_display = ['toelichting', 'bronnenlijst', 'boek']
 
 
-class DialectAdmin(admin.ModelAdmin):
+class DialectAdmin(DataChangeAdmin):
+    entry_path = 'dialect'
     fieldsets = ( ('Editable', {'fields': ('stad', 'code', 'nieuw', 'toelichting', 'coordinate',)}),
                 )
     list_display = ['nieuw', 'stad', 'coordinate']
     search_fields = ['nieuw', 'stad']
 
 
-class CoordinateAdmin(admin.ModelAdmin):
+class CoordinateAdmin(DataChangeAdmin):
+    entry_path = 'dialect__coordinate'
     fieldsets = ( ('Editable', {'fields': ('kloeke', 'country', 'province', 'dictionary', 'place', 'point',)}),
                 )
     list_display = ['kloeke', 'country', 'province', 'dictionary', 'place', 'point']
@@ -52,13 +100,15 @@ class CoordinateAdmin(admin.ModelAdmin):
     search_fields = ['place', 'province', 'country', 'kloeke']
 
 
-class TrefwoordAdmin(admin.ModelAdmin):
+class TrefwoordAdmin(DataChangeAdmin):
+    entry_path = 'trefwoord'
     fieldsets = ( ('Editable', {'fields': ('woord', 'toelichting',)}),
                 )
     list_display = ['woord', 'toelichting']
 
 
-class EntryAdmin(admin.ModelAdmin):
+class EntryAdmin(DataChangeAdmin):
+    entry_path = 'id'
     fieldsets = ( ('Editable', {'fields': ('woord', 'lemma', 'dialect', 'trefwoord', 'toelichting', 'aflevering')}),
                 )
     list_display = ['woord', 'lemma', 'dialect', 'trefwoord', 'toelichting']
@@ -66,7 +116,8 @@ class EntryAdmin(admin.ModelAdmin):
     search_fields = ['woord', 'trefwoord__woord', 'lemma__gloss']
 
 
-class AfleveringAdmin(admin.ModelAdmin):
+class AfleveringAdmin(DataChangeAdmin):
+    entry_path = 'aflevering'
     formfield_overrides = {
             models.CharField: {'widget': TextInput(attrs={'size': '50'})}
         }
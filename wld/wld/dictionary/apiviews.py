@@ -0,0 +1,199 @@
+"""Read-only JSON API over the entries, lemma's, trefwoorden and dialects.
+
+The API takes the same filters as the list views: search, lemma, trefwoord,
+woord, dialectCity, dialectCode, aflevering, mijn, strict and ignoreAccents. The results are
+ordered on id and paginated with a cursor: the response contains a 'next'
+token, which is passed on as 'cursor' to get the next page. The parameter
+'fields' (comma-separated) selects the fields of each result.
+The queries use values(), so no model instances or templates are involved.
+
+The autocompletion of the search fields (lemma, trefwoord, dialectCity and
+dialectCode) is answered from the in-memory index of autocomplete.py.
+"""
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.views.generic.list import View
+from wld.dictionary.models import Entry, Lemma, Trefwoord, Dialect
+from wld.dictionary.wildcard import wildcard_add, mijn_filter, toonbaar_filter
+from wld.dictionary.paging import encode_token, decode_token
+from wld.dictionary.autocomplete import autocomplete, AUTOCOMPLETE_FIELDS, AUTOCOMPLETE_SIZE
+from wld.utils import ErrHandle
+
+# Default and maximum number of results per request
+apiPageSize = 100
+apiPageMax = 1000
+
+# The pattern filters: parameter name, path within Entry, full-text column (or None)
+apiFilters = [('lemma', 'lemma__gloss', 'gloss'),
+              ('trefwoord', 'trefwoord__woord', 'trefwoord'),
+              ('woord', 'woord', 'woord'),
+              ('dialectCity', 'dialect__stad', 'stad'),
+              ('dialectCode', 'dialect__nieuw', None)]
+
+
+class ApiListView(View):
+    """Base class of the JSON list views: filtering, field selection and cursor pagination"""
+
+    model = None
+    # The field of Entry that points to the model ('' for Entry itself)
+    entry_field = ""
+    # The filter that parameter 'search' stands for
+    search_filter = None
+    # The fields that may be asked for: name and path within the model
+    fields = {}
+    # The fields that are returned if 'fields' is not specified
+    default_fields = []
+
+    def get(self, request, *args, **kwargs):
+        oErr = ErrHandle()
+        get = request.GET
+        try:
+            # Determine the fields
+            lField = self.get_fields(get)
+            if lField == None:
+                return JsonResponse({'error': 'unknown field', 'fields': sorted(self.fields.keys())}, status=400)
+            # Determine the page size
+            sLimit = get.get('limit', '')
+            iLimit = min(int(sLimit), apiPageMax) if sLimit.isdigit() and int(sLimit) > 0 else apiPageSize
+            # Determine where to continue
+            qs = self.get_queryset(get)
+            sCursor = get.get('cursor', '')
+            if sCursor != '':
+                oCursor = decode_token(sCursor)
+                if oCursor == None:
+                    return JsonResponse({'error': 'invalid cursor'}, status=400)
+                key, id, number = oCursor
+                qs = qs.filter(id__gt=id)
+            # Get one more than needed to see whether there is a next page
+            lPath = ['id'] + [self.fields[sField] for sField in lField if sField != 'id']
+            lRow = list(qs.order_by('id').values_list(*lPath)[:iLimit + 1])
+            bNext = (len(lRow) > iLimit)
+            lRow = lRow[:iLimit]
+            lName = ['id'] + [sField for sField in lField if sField != 'id']
+            lResult = [dict(zip(lName, row)) for row in lRow]
+            if 'id' not in lField:
+                for oResult in lResult:
+                    del oResult['id']
+            sNext = encode_token(None, lRow[-1][0], 0) if bNext else None
+            return JsonResponse({'results': lResult, 'next': sNext})
+        except:
+            oErr.DoError("ApiListView get")
+            return JsonResponse({'error': 'the request could not be handled'}, status=500)
+
+    def get_fields(self, get):
+        """Get the list of requested field names, or None if one of them is unknown"""
+
+        sFields = get.get('fields', '').strip()
+        if sFields == '':
+            return self.default_fields
+        lField = [sField.strip() for sField in sFields.split(",") if sField.strip() != '']
+        for sField in lField:
+            if sField not in self.fields:
+                return None
+        return lField
+
+    def get_entry_filters(self, get):
+        """Get the filters on Entry from the parameters in [get]: a list of filters for each parameter"""
+
+        lFilter = []
+        bFold = (get.get('ignoreAccents', '') == "True")
+        for sParam, sPath, sColumn in apiFilters:
+            val = get.get(sParam, '')
+            if val == '' and sParam == self.search_filter:
+                val = get.get('search', '')
+            if val != '':
+                lFilter.append(wildcard_add([], sPath, val, None if sColumn == None else (sColumn, 'entry'), fold=bFold))
+        # Check for aflevering and mijn: these should be numbers
+        val = get.get('aflevering', '')
+        if val.isdigit() and int(val) > 0:
+            lFilter.append([Q(aflevering__id=int(val))])
+        val = get.get('mijn', '')
+        if val.isdigit() and int(val) > 0:
+            lFilter.append([mijn_filter(int(val))[0]])
+        return lFilter
+
+    def get_queryset(self, get):
+        """Get the (unordered) queryset of the model that satisfies the filters in [get]"""
+
+        lFilter = self.get_entry_filters(get)
+        # Only entries of visible afleveringen are shown
+        oToonbaar = toonbaar_filter()
+        lstQ = [oToonbaar] + [oQ for lParamQ in lFilter for oQ in lParamQ]
+        if self.entry_field == "":
+            return Entry.objects.filter(*lstQ)
+        qs = self.model.objects.filter(toonbaar=True)
+        sIdField = "{}_id".format(self.entry_field)
+        if get.get('strict', 'True') == "False" and len(lFilter) > 1:
+            # Each parameter may be satisfied by another (visible) entry of the object
+            for lParamQ in lFilter:
+                qs = qs.filter(id__in=Entry.objects.filter(oToonbaar, *lParamQ).values(sIdField))
+        else:
+            # One entry of the object must satisfy all filters
+            qs = qs.filter(id__in=Entry.objects.filter(*lstQ).values(sIdField))
+        return qs
+
+
+class EntryApiView(ApiListView):
+    """The entries: dialect words with their lemma, trefwoord, dialect and aflevering"""
+
+    model = Entry
+    search_filter = "woord"
+    fields = {'id': 'id', 'woord': 'woord', 'toelichting': 'toelichting',
+              'kloeketoelichting': 'kloeketoelichting',
+              'lemma': 'lemma__gloss', 'lemma_id': 'lemma_id',
+              'trefwoord': 'trefwoord__woord', 'trefwoord_id': 'trefwoord_id',
+              'dialect': 'dialect__stad', 'dialect_code': 'dialect__nieuw', 'dialect_id': 'dialect_id',
+              'aflevering': 'aflevering__naam', 'aflevering_id': 'aflevering_id',
+              'bronnenlijst': 'descr__bronnenlijst'}
+    default_fields = ['id', 'woord', 'lemma', 'trefwoord', 'dialect', 'dialect_code', 'aflevering']
+
+
+class LemmaApiView(ApiListView):
+    """The lemma's that have entries satisfying the filters"""
+
+    model = Lemma
+    entry_field = "lemma"
+    search_filter = "lemma"
+    fields = {'id': 'id', 'gloss': 'gloss'}
+    default_fields = ['id', 'gloss']
+
+
+class TrefwoordApiView(ApiListView):
+    """The trefwoorden that have entries satisfying the filters"""
+
+    model = Trefwoord
+    entry_field = "trefwoord"
+    search_filter = "trefwoord"
+    fields = {'id': 'id', 'woord': 'woord', 'toelichting': 'toelichting'}
+    default_fields = ['id', 'woord']
+
+
+class DialectApiView(ApiListView):
+    """The dialects (locations) that have entries satisfying the filters"""
+
+    model = Dialect
+    entry_field = "dialect"
+    search_filter = "dialectCity"
+    fields = {'id': 'id', 'stad': 'stad', 'code': 'code', 'nieuw': 'nieuw', 'streek': 'streek',
+              'toelichting': 'toelichting', 'count': 'count',
+              'kloeke': 'coordinate__kloeke', 'point': 'coordinate__point'}
+    default_fields = ['id', 'stad', 'nieuw']
+
+
+class AutocompleteView(View):
+    """Suggestions for search field [field]: the values starting with 'q', most frequent first"""
+
+    def get(self, request, field, *args, **kwargs):
+        oErr = ErrHandle()
+        get = request.GET
+        try:
+            sLimit = get.get('limit', '')
+            iLimit = int(sLimit) if sLimit.isdigit() and int(sLimit) > 0 else AUTOCOMPLETE_SIZE
+            lResult = autocomplete(field, get.get('q', ''), iLimit)
+            if lResult == None:
+                return JsonResponse({'error': 'unknown field', 'fields': sorted(AUTOCOMPLETE_FIELDS.keys())}, status=400)
+            return JsonResponse({'results': [{'value': sValue, 'count': iCount} for sValue, iCount in lResult]})
+        except:
+            oErr.DoError("AutocompleteView get")
+            return JsonResponse({'error': 'the request could not be handled'}, status=500)
@@ -2,4 +2,13 @@ from django.apps import AppConfig
 
 
 class dictionaryConfig(AppConfig):
-    name = 'dictionary'
+    name = 'wld.dictionary'
+    label = 'dictionary'
+
+    def ready(self):
+        # Connect the receivers that keep the indexes and the derived tables in line with the models
+        #    The search rows (entrysearch) are made before the prebuilt exports (artifacts) that read them
+        import wld.dictionary.fulltext
+        import wld.dictionary.wildcard
+        import wld.dictionary.entrysearch
+        import wld.dictionary.artifacts
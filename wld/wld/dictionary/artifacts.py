@@ -0,0 +1,242 @@
+"""Prebuilt export files per aflevering and for the complete (visible) dataset.
+
+Many users download the same large exports: everything, or everything of one
+aflevering. These exports are made once, in CSV (gzipped), Excel and JSON
+(gzipped), and stored under ARTIFACT_DIR in a directory named after the data
+generation (see models.Generation). As soon as the generation is raised, the
+files are no longer used, until [artifacts_build()] has made them again.
+They are rebuilt in the background after importing and after changing the
+'toonbaar' status of an aflevering (the signal 'entries_changed' from
+Aflevering); several afleveringen are written in parallel.
+
+An export request from the list views whose filter only consists of an
+aflevering (or nothing at all) is served from these files, with an ETag.
+"""
+
+import csv
+import gzip
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from wld.dictionary.models import Aflevering, Entry, Generation, entries_changed
+from wld.dictionary.wildcard import toonbaar_filter
+from wld.dictionary.exports import outputColumns, get_export_rows, get_entry_order, write_xlsx, CsvBuffer
+from wld.settings import MEDIA_ROOT
+from wld.utils import ErrHandle
+
+ARTIFACT_DIR = os.path.join(MEDIA_ROOT, "artifacts")
+
+# The formats and the names of their files
+ARTIFACT_FORMATS = {'csv': 'csv.gz', 'xlsx': 'xlsx', 'json': 'json.gz'}
+
+# Content types of the formats
+ARTIFACT_TYPES = {'csv': 'text/csv',
+                  'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                  'json': 'application/json'}
+
+# Number of afleveringen that are written at the same time
+ARTIFACT_WORKERS = 4
+
+# Request parameters that do not change which entries are exported
+ARTIFACT_NEUTRAL = ['page', 'paginate_by', 'submit_type', 'csrfmiddlewaretoken', 'after', 'before',
+                    'sortOrder', 'optdialect', 'strict', 'format', 'ignoreAccents']
+
+# Only one build at a time per process; a request for a build while one is going on is kept as pending
+artifact_lock = threading.Lock()
+artifact_status = {'pending': False}
+
+
+def get_artifact_dir(iGeneration):
+    return os.path.join(ARTIFACT_DIR, str(iGeneration))
+
+def get_artifact_path(iGeneration, sName, sFormat):
+    return os.path.join(get_artifact_dir(iGeneration), "{}.{}".format(sName, ARTIFACT_FORMATS[sFormat]))
+
+def get_artifact_name(get):
+    """Get the name of the artifact ('all' or 'afl<id>') that matches the filter in [get], or None"""
+
+    sName = "all"
+    for sKey in get.keys():
+        sValue = get.get(sKey, "").strip()
+        if sKey in ARTIFACT_NEUTRAL or sValue == "":
+            continue
+        if sKey == "aflevering" and sValue.isdigit():
+            if int(sValue) > 0:
+                sName = "afl{}".format(int(sValue))
+        elif sKey == "mijn" and sValue == "0":
+            continue
+        else:
+            # Any other filter: there is no artifact for this
+            return None
+    # The artifacts hold the result of strict filtering
+    if get.get('strict', 'True') == "False":
+        return None
+    return sName
+
+def get_artifact_qs(afl_id=None):
+    """Get the visible entries (of the aflevering with id [afl_id]) in the order of the artifacts"""
+
+    qs = Entry.objects.filter(toonbaar_filter())
+    if afl_id != None:
+        qs = qs.filter(aflevering_id=afl_id)
+    return qs.order_by(*get_entry_order("lemma"), 'id')
+
+def artifact_write(sDir, sName, afl_id=None):
+    """Write the CSV, Excel and JSON artifacts [sName] of (the aflevering with id [afl_id]) into [sDir]
+
+    This runs in a worker thread: the queryset is made here, in the thread that uses it.
+    """
+
+    oErr = ErrHandle()
+    try:
+        qs = get_artifact_qs(afl_id)
+        # CSV, the same as export_csv(), but gzipped
+        sPath = os.path.join(sDir, "{}.{}".format(sName, ARTIFACT_FORMATS['csv']))
+        with gzip.open(sPath + ".part", "wt", encoding="utf-8", newline="") as f:
+            writer = csv.writer(CsvBuffer(), csv.excel_tab)
+            f.write(u'\ufeff')
+            f.write(writer.writerow(outputColumns))
+            for row in get_export_rows(qs):
+                f.write(writer.writerow(row))
+        os.replace(sPath + ".part", sPath)
+        # Excel
+        sPath = os.path.join(sDir, "{}.{}".format(sName, ARTIFACT_FORMATS['xlsx']))
+        write_xlsx(qs, sName, sPath + ".part")
+        os.replace(sPath + ".part", sPath)
+        # JSON: a list of objects with the output columns as keys
+        sPath = os.path.join(sDir, "{}.{}".format(sName, ARTIFACT_FORMATS['json']))
+        with gzip.open(sPath + ".part", "wt", encoding="utf-8") as f:
+            f.write("[")
+            bFirst = True
+            for row in get_export_rows(qs):
+                f.write("\n" if bFirst else ",\n")
+                f.write(json.dumps(dict(zip(outputColumns, row)), ensure_ascii=False))
+                bFirst = False
+            f.write("\n]\n")
+        os.replace(sPath + ".part", sPath)
+    except:
+        oErr.DoError("artifact_write " + sName)
+    finally:
+        # Each worker thread has its own database connection
+        connection.close()
+    return True
+
+def artifacts_generation(iGeneration):
+    """Write all artifacts for data generation [iGeneration], and remove those of older generations"""
+
+    oErr = ErrHandle()
+    try:
+        sDir = get_artifact_dir(iGeneration)
+        os.makedirs(sDir, exist_ok=True)
+        # The afleveringen are done in parallel, the complete dataset alongside
+        lJob = [("all", None)]
+        for afl_id in Aflevering.objects.filter(toonbaar=True).values_list('id', flat=True):
+            lJob.append(("afl{}".format(afl_id), afl_id))
+        with ThreadPoolExecutor(max_workers=ARTIFACT_WORKERS) as executor:
+            for sName, afl_id in lJob:
+                executor.submit(artifact_write, sDir, sName, afl_id)
+        # Remove the artifacts of other generations
+        for sName in os.listdir(ARTIFACT_DIR):
+            if sName != str(iGeneration):
+                shutil.rmtree(os.path.join(ARTIFACT_DIR, sName), ignore_errors=True)
+        oErr.Status("artifacts_build: generation {} done".format(iGeneration))
+        return True
+    except:
+        oErr.DoError("artifacts_generation")
+        return False
+
+def artifacts_build():
+    """Write all artifacts for the current data generation, and remove those of older generations
+
+    If another build is going on, that build takes care of the newest generation when it is done.
+    """
+
+    bResult = False
+    iDone = None
+    artifact_status['pending'] = True
+    while artifact_status['pending']:
+        if not artifact_lock.acquire(blocking=False):
+            # The build that is going on will see the pending request
+            return bResult
+        try:
+            while artifact_status['pending']:
+                artifact_status['pending'] = False
+                iGeneration = Generation.get_number()
+                if iGeneration != None and iGeneration != iDone:
+                    bResult = artifacts_generation(iGeneration)
+                    iDone = iGeneration
+        finally:
+            artifact_lock.release()
+        # A request that came in while releasing the lock is handled as well
+    return bResult
+
+def artifacts_background():
+    """Build the artifacts (to be called in a separate thread)"""
+
+    try:
+        artifacts_build()
+    finally:
+        # This thread has its own database connection
+        connection.close()
+
+def artifacts_start():
+    """Start building the artifacts in the background"""
+
+    oThread = threading.Thread(target=artifacts_background, daemon=True)
+    oThread.start()
+    return True
+
+def artifacts_changed(sender, **kwargs):
+    """The visibility of an aflevering has changed: its generation has been raised, so build again"""
+
+    artifacts_start()
+
+entries_changed.connect(artifacts_changed, sender=Aflevering)
+
+def get_unzipped(sPath):
+    """Iterate over the unpacked contents of gzipped file [sPath]"""
+
+    with gzip.open(sPath, "rb") as f:
+        while True:
+            data = f.read(64 * 1024)
+            if not data:
+                break
+            yield data
+
+def artifact_response(request, sFormat, sFileName):
+    """Serve the export of format [sFormat] from a prebuilt artifact, if one matches the request
+
+    Returns None if there is no (up-to-date) artifact for this request.
+    """
+
+    if sFormat not in ARTIFACT_FORMATS:
+        return None
+    get = request.GET if request.method == "GET" else request.POST
+    sName = get_artifact_name(get)
+    iGeneration = Generation.get_number()
+    if sName == None or iGeneration == None:
+        return None
+    sPath = get_artifact_path(iGeneration, sName, sFormat)
+    if not os.path.exists(sPath):
+        return None
+    sETag = '"{}-{}-{}-{}"'.format(iGeneration, sName, sFormat, int(os.path.getmtime(sPath)))
+    if sETag in [s.strip() for s in request.META.get('HTTP_IF_NONE_MATCH', '').split(",")]:
+        response = HttpResponseNotModified()
+    elif not sPath.endswith(".gz"):
+        response = FileResponse(open(sPath, "rb"), content_type=ARTIFACT_TYPES[sFormat])
+    elif 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        # The client unpacks the file itself
+        response = FileResponse(open(sPath, "rb"), content_type=ARTIFACT_TYPES[sFormat])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(get_unzipped(sPath), content_type=ARTIFACT_TYPES[sFormat])
+    response['ETag'] = sETag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if response.status_code == 200:
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(sFileName, sFormat)
+    return response
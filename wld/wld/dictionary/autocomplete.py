@@ -0,0 +1,154 @@
+"""In-memory prefix index for the autocompletion of the search fields.
+
+For each field that can be completed (lemma gloss, trefwoord, dialect place and
+kloeke code) the values that occur in visible entries are kept per process in
+a sorted list of case-folded keys, together with the way they are written and
+their number of entries. A prefix is looked up with a binary search; the
+answers for prefixes of one or two characters, which match many values, are
+worked out while building. The index is built in the background on first use
+and made again as soon as the data generation has changed (checked every
+AUTOCOMPLETE_CHECK_SECONDS); until then the previous index is used.
+"""
+
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from django.db import connection
+from django.db.models import Count
+from wld.dictionary.models import Entry, Generation
+from wld.dictionary.wildcard import toonbaar_filter
+from wld.utils import ErrHandle
+
+# The fields that can be completed, and their path within Entry
+AUTOCOMPLETE_FIELDS = {'lemma': 'lemma__gloss',
+                       'trefwoord': 'trefwoord__woord',
+                       'dialectCity': 'dialect__stad',
+                       'dialectCode': 'dialect__nieuw'}
+
+# Default and maximum number of suggestions
+AUTOCOMPLETE_SIZE = 10
+AUTOCOMPLETE_MAX = 50
+
+# Prefixes up to this length have their answers worked out in advance
+AUTOCOMPLETE_SHORT = 2
+
+# Number of seconds during which the data generation is not checked again
+AUTOCOMPLETE_CHECK_SECONDS = 10
+
+# Process-local index: the generation it belongs to, the index per field and whether it is being built
+autocomplete_status = {'checked': 0, 'number': None, 'fields': {}, 'building': False}
+autocomplete_lock = threading.Lock()
+
+
+def get_fold(sValue):
+    """Get the key under which [sValue] is looked up"""
+
+    return sValue.strip().casefold()
+
+def get_top(lValue, lCount, iStart, iEnd, iLimit):
+    """Get the [iLimit] values from lValue[iStart:iEnd] with the most entries"""
+
+    lIndex = heapq.nsmallest(iLimit, range(iStart, iEnd), key=lambda i: (-lCount[i], i))
+    return [(lValue[i], lCount[i]) for i in lIndex]
+
+def autocomplete_field(sPath):
+    """Make the index of the values of Entry field [sPath]"""
+
+    # Count the visible entries per value; values that only differ in case are taken together
+    dValue = {}
+    qs = Entry.objects.filter(toonbaar_filter()).values_list(sPath).annotate(num=Count('id')).order_by()
+    for sValue, iNum in qs:
+        if sValue == None or sValue.strip() == "":
+            continue
+        sKey = get_fold(sValue)
+        oValue = dValue.get(sKey)
+        if oValue == None:
+            dValue[sKey] = [sValue.strip(), iNum, iNum]
+        else:
+            # The way of writing with the most entries is shown
+            if iNum > oValue[2]:
+                oValue[0] = sValue.strip()
+                oValue[2] = iNum
+            oValue[1] += iNum
+    lKey = sorted(dValue.keys())
+    lValue = [dValue[sKey][0] for sKey in lKey]
+    lCount = [dValue[sKey][1] for sKey in lKey]
+    # The answers for short prefixes: keys with the same prefix are next to each other
+    dRange = {}
+    for i, sKey in enumerate(lKey):
+        for iLen in range(1, min(len(sKey), AUTOCOMPLETE_SHORT) + 1):
+            dRange.setdefault(sKey[:iLen], [i, i])[1] = i
+    dShort = {}
+    for sPrefix, lRange in dRange.items():
+        dShort[sPrefix] = get_top(lValue, lCount, lRange[0], lRange[1] + 1, AUTOCOMPLETE_MAX)
+    return {'keys': lKey, 'values': lValue, 'counts': lCount, 'short': dShort}
+
+def autocomplete_build():
+    """Make the index of all fields for the current data generation"""
+
+    oErr = ErrHandle()
+    try:
+        iNumber = Generation.get_number()
+        dField = {}
+        for sField, sPath in AUTOCOMPLETE_FIELDS.items():
+            dField[sField] = autocomplete_field(sPath)
+        with autocomplete_lock:
+            autocomplete_status['fields'] = dField
+            autocomplete_status['number'] = iNumber
+            autocomplete_status['checked'] = time.time()
+        return True
+    except:
+        oErr.DoError("autocomplete_build")
+        return False
+    finally:
+        autocomplete_status['building'] = False
+        # This thread has its own database connection
+        connection.close()
+
+def autocomplete_start():
+    """Make the index again in the background (unless that is being done already)"""
+
+    with autocomplete_lock:
+        if autocomplete_status['building']:
+            return True
+        autocomplete_status['building'] = True
+    oThread = threading.Thread(target=autocomplete_build, daemon=True)
+    oThread.start()
+    return True
+
+def get_index(sField):
+    """Get the index of [sField] (or None), and have it made again if it is out of date"""
+
+    iNow = time.time()
+    if iNow - autocomplete_status['checked'] > AUTOCOMPLETE_CHECK_SECONDS:
+        iNumber = Generation.get_number()
+        if iNumber == None or iNumber != autocomplete_status['number'] or len(autocomplete_status['fields']) == 0:
+            # The request does not wait: the previous index is used until the new one is ready
+            autocomplete_start()
+        else:
+            autocomplete_status['checked'] = iNow
+    return autocomplete_status['fields'].get(sField)
+
+def autocomplete(sField, sPrefix, iLimit=AUTOCOMPLETE_SIZE):
+    """Get at most [iLimit] (value, count) tuples of [sField] starting with [sPrefix], most frequent first
+
+    Returns None if [sField] cannot be completed.
+    """
+
+    if sField not in AUTOCOMPLETE_FIELDS:
+        return None
+    oIndex = get_index(sField)
+    if oIndex == None:
+        return []
+    sPrefix = get_fold(sPrefix)
+    iLimit = min(iLimit, AUTOCOMPLETE_MAX)
+    if sPrefix == "":
+        return []
+    if len(sPrefix) <= AUTOCOMPLETE_SHORT:
+        return oIndex['short'].get(sPrefix, [])[:iLimit]
+    # All keys with this prefix are next to each other
+    lKey = oIndex['keys']
+    iStart = bisect_left(lKey, sPrefix)
+    iEnd = bisect_left(lKey, sPrefix + "\U0010ffff", iStart)
+    return get_top(oIndex['values'], oIndex['counts'], iStart, iEnd, iLimit)
@@ -0,0 +1,440 @@
+"""In-memory columnar index of the entries, answering the filters of the list views.
+
+The lemma, trefwoord and location lists select the (visible) objects that
+have at least one entry satisfying the filters of the user, in a fixed order.
+Instead of letting the database join Entry with its related tables, this
+module keeps per process:
+
+    entries     NumPy arrays of the id, the position of the lemma, trefwoord
+                and dialect in their own table, the aflevering id, the
+                visibility, the bitmask of mijnen and the code of the woord
+    lemma's     (and trefwoorden, dialects) arrays of the id, the visibility
+                and the order of the list, plus their texts
+    woorden     the distinct dialect words of the entries
+
+Each text column has its texts, their folded versions (see
+get_search_key_fold) and the lower-case and folded texts in sorted order.
+A pattern is matched against the distinct texts once: exact and prefix
+patterns with a binary search, suffix and infix patterns (literal text only)
+with the regular expression of wildcard.py. Patterns with character classes,
+word boundaries or regular expressions are left to the database. The outcome is spread over the entries with vectorized masks.
+Only the ordered ids of the result are returned: the objects of a page are
+fetched from the database as before.
+
+NumPy is optional: without it (or while the index is being built) the views
+use the database. The index is built in the background and made again as soon
+as the data generation has changed.
+
+The index that has been built is written to a snapshot file next to the
+database (see COLUMNAR_FILE), with a header holding the format version and the
+data generation. Other processes map this file read-only instead of building
+the index themselves: starting a worker takes no time, and the pages of the
+file are shared by all workers. The texts are stored as UTF-8 bytes with their
+offsets, and read through [TextTable].
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from django.conf import settings
+from django.db.models.functions import Coalesce
+from wld.dictionary.models import Entry, Lemma, Trefwoord, Dialect, Mijn, Generation, \
+     get_search_key, get_search_key_fold
+from wld.dictionary.wildcard import wildcard_classify, wildcard_regex, wildcard_filled
+from wld.utils import ErrHandle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The list views that can be answered, with their target table, the column their 'search'
+#   parameter filters on, the other parameters that filter on the objects themselves and
+#   those that filter on their entries (parameter: column), and the parameters it cannot handle
+COLUMNAR_VIEWS = {
+    'lemma': {'target': 'lemma', 'search': 'gloss', 'fields': {},
+              'entry': {'dialectCity': 'stad', 'dialectCode': 'nieuw', 'woord': 'woord'},
+              'skip': []},
+    'trefwoord': {'target': 'trefwoord', 'search': 'trefwoord', 'fields': {},
+                  'entry': {'dialectwoord': 'woord', 'lemma': 'gloss', 'dialectCity': 'stad', 'dialectCode': 'nieuw'},
+                  'skip': ['toelichting']},
+    'location': {'target': 'dialect', 'search': 'stad', 'fields': {'nieuw': 'nieuw'},
+                 'entry': {}, 'skip': []}
+    }
+
+# The text columns: the table they belong to and whether they have a folded version
+COLUMNAR_COLUMNS = {'gloss': ('lemma', True), 'trefwoord': ('trefwoord', True), 'stad': ('dialect', True),
+                    'nieuw': ('dialect', False), 'woord': ('woord', True)}
+
+# The derived columns (see wildcard.WILDCARD_MARKERS) the index is made from
+COLUMNAR_MARKERS = ['searchfields', 'mijnen']
+
+# Number of seconds during which the data generation is not checked again
+COLUMNAR_CHECK_SECONDS = 10
+
+# Number of seconds after a failed build during which no new build is started
+COLUMNAR_RETRY_SECONDS = 10 * 60
+
+# The snapshot file: its name, the version of its format and its header
+#   (magic, format version, data generation, offset and size of the table of contents)
+COLUMNAR_FILE = os.path.join(os.path.dirname(settings.DATABASES['default']['NAME']), "wld.columnar")
+COLUMNAR_FORMAT = 1
+COLUMNAR_MAGIC = b"WLDCOLIX"
+COLUMNAR_HEADER = struct.Struct("<8sIqqq")
+
+# Alignment of the arrays in the snapshot file
+COLUMNAR_ALIGN = 64
+
+# Process-local index: the generation it belongs to, the index itself and whether it is being built
+columnar_status = {'checked': 0, 'number': None, 'index': None, 'building': False, 'failed': 0}
+columnar_lock = threading.Lock()
+
+
+class TextTable():
+    """Read-only sequence of the texts stored as UTF-8 [data] with [offsets] (one more than the texts)"""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("TextTable index out of range")
+        return str(self.data[int(self.offsets[i]):int(self.offsets[i + 1])], "utf-8")
+
+    def __iter__(self):
+        lOffset = self.offsets.tolist()
+        for i in range(len(lOffset) - 1):
+            yield str(self.data[lOffset[i]:lOffset[i + 1]], "utf-8")
+
+
+def get_column(lText, bFold):
+    """Make a text column from the texts in [lText]"""
+
+    lLower = [get_search_key(sText) for sText in lText]
+    aLower = numpy.argsort(numpy.array(lLower, dtype=object), kind="stable")
+    oColumn = {'text': lText,
+               'lower_sorted': [lLower[i] for i in aLower], 'lower_rows': aLower}
+    if bFold:
+        lFold = [get_search_key_fold(sText) for sText in lText]
+        aFold = numpy.argsort(numpy.array(lFold, dtype=object), kind="stable")
+        oColumn['fold'] = lFold
+        oColumn['fold_sorted'] = [lFold[i] for i in aFold]
+        oColumn['fold_rows'] = aFold
+    return oColumn
+
+def get_table(qs, lField):
+    """Make a table from [qs]: the id, visibility and list order of the objects, and their texts [lField]"""
+
+    # The first field is the (lower-case) text the list is ordered on
+    lRow = list(qs.order_by('id').values_list('id', 'toonbaar', *lField))
+    aId = numpy.array([row[0] for row in lRow], dtype=numpy.int64)
+    oTable = {'id': aId,
+              'toonbaar': numpy.array([row[1] for row in lRow], dtype=bool)}
+    lOrder = sorted(range(len(lRow)), key=lambda i: (lRow[i][2], lRow[i][0]))
+    oTable['order'] = numpy.array(lOrder, dtype=numpy.int32)
+    for i, sField in enumerate(lField):
+        oTable[sField] = [row[i + 2] for row in lRow]
+    return oTable
+
+def get_snapshot_items(oIndex):
+    """Get the (path, value) pairs of the arrays and texts of [oIndex] that are stored in the snapshot"""
+
+    lItem = []
+    for sTable in ['lemma', 'trefwoord', 'dialect']:
+        for sKey in ['id', 'toonbaar', 'order']:
+            lItem.append(([sTable, sKey], oIndex[sTable][sKey]))
+    for sKey, aValue in oIndex['entry'].items():
+        lItem.append((['entry', sKey], aValue))
+    for sColumn, oColumn in oIndex['columns'].items():
+        for sKey, value in oColumn.items():
+            lItem.append((['columns', sColumn, sKey], value))
+    return lItem
+
+def columnar_save(oIndex, iNumber):
+    """Write [oIndex] of data generation [iNumber] to the snapshot file"""
+
+    oErr = ErrHandle()
+    sPart = "{}.{}.part".format(COLUMNAR_FILE, os.getpid())
+
+    def write_array(f, aValue):
+        # Start each array at an aligned offset
+        iOffset = f.tell()
+        iOffset += (-iOffset) % COLUMNAR_ALIGN
+        f.seek(iOffset)
+        f.write(numpy.ascontiguousarray(aValue).tobytes())
+        return iOffset
+
+    try:
+        lContents = []
+        with open(sPart, "wb") as f:
+            f.write(b"\0" * COLUMNAR_ALIGN)
+            for lPath, value in get_snapshot_items(oIndex):
+                if isinstance(value, numpy.ndarray):
+                    oItem = {'path': lPath, 'dtype': value.dtype.str, 'count': len(value)}
+                    oItem['offset'] = write_array(f, value)
+                else:
+                    # A list of texts: the UTF-8 bytes and the offsets of the texts within these
+                    lBytes = [sText.encode("utf-8") for sText in value]
+                    aOffset = numpy.zeros(len(lBytes) + 1, dtype=numpy.int64)
+                    numpy.cumsum([len(bText) for bText in lBytes], out=aOffset[1:])
+                    oItem = {'path': lPath, 'dtype': 'text', 'count': len(lBytes), 'size': int(aOffset[-1])}
+                    oItem['offsets'] = write_array(f, aOffset)
+                    oItem['offset'] = write_array(f, numpy.frombuffer(b"".join(lBytes), dtype=numpy.uint8))
+                lContents.append(oItem)
+            # The table of contents follows the arrays, the header is written last
+            bContents = json.dumps(lContents).encode("utf-8")
+            iContents = f.tell()
+            f.write(bContents)
+            f.seek(0)
+            f.write(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_FORMAT, iNumber, iContents, len(bContents)))
+        # Processes that have mapped the previous file keep on using that one
+        os.replace(sPart, COLUMNAR_FILE)
+        return True
+    except:
+        oErr.DoError("columnar_save")
+        if os.path.exists(sPart):
+            os.remove(sPart)
+        return False
+
+def columnar_load(iNumber):
+    """Map the snapshot file read-only, if it holds the index of data generation [iNumber] (or return None)"""
+
+    oErr = ErrHandle()
+    try:
+        if numpy == None or not os.path.exists(COLUMNAR_FILE):
+            return None
+        with open(COLUMNAR_FILE, "rb") as f:
+            sMagic, iFormat, iFileNumber, iContents, iSize = COLUMNAR_HEADER.unpack(f.read(COLUMNAR_HEADER.size))
+            if sMagic != COLUMNAR_MAGIC or iFormat != COLUMNAR_FORMAT or iFileNumber != iNumber:
+                return None
+            # The mapping remains valid after closing the file (and after replacing it)
+            oMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        bData = memoryview(oMap)
+        lContents = json.loads(str(bData[iContents:iContents + iSize], "utf-8"))
+        oIndex = {'number': iNumber, 'lemma': {}, 'trefwoord': {}, 'dialect': {}, 'entry': {},
+                  'columns': {sColumn: {} for sColumn in COLUMNAR_COLUMNS}}
+        for oItem in lContents:
+            if oItem['dtype'] == 'text':
+                aOffset = numpy.frombuffer(oMap, dtype=numpy.int64, count=oItem['count'] + 1, offset=oItem['offsets'])
+                value = TextTable(bData[oItem['offset']:oItem['offset'] + oItem['size']], aOffset)
+            else:
+                value = numpy.frombuffer(oMap, dtype=numpy.dtype(oItem['dtype']), count=oItem['count'], offset=oItem['offset'])
+            oTarget = oIndex
+            for sKey in oItem['path'][:-1]:
+                oTarget = oTarget[sKey]
+            oTarget[oItem['path'][-1]] = value
+        return oIndex
+    except:
+        oErr.DoError("columnar_load")
+        return None
+
+def columnar_build():
+    """Make the index for the current data generation"""
+
+    oErr = ErrHandle()
+    try:
+        if numpy == None:
+            return False
+        iStart = time.time()
+        iNumber = Generation.get_number()
+        oIndex = {'number': iNumber}
+        # The tables of the lemma's, trefwoorden and dialects, ordered as in their lists
+        oIndex['lemma'] = get_table(Lemma.objects.all(), ['gloss'])
+        oIndex['trefwoord'] = get_table(Trefwoord.objects.all(), ['woord_lower', 'woord'])
+        oIndex['dialect'] = get_table(Dialect.objects.all(), ['stad_lower', 'stad', 'nieuw'])
+        # The entries: their woord is stored as the code of a distinct text
+        dWoord = {}
+        lEntry = []
+        # (the visibility of an entry that has not been filled is that of its aflevering)
+        qs = Entry.objects.annotate(zichtbaar=Coalesce('toonbaar', 'aflevering__toonbaar'))
+        for row in qs.order_by('id').values_list('id', 'lemma_id', 'trefwoord_id', 'dialect_id',
+                                                 'aflevering_id', 'zichtbaar', 'mijnen', 'woord').iterator():
+            lEntry.append(row[:7] + (dWoord.setdefault(row[7], len(dWoord)),))
+        aEntry = numpy.array(lEntry, dtype=numpy.int64).reshape((len(lEntry), 8))
+        oEntry = {'id': aEntry[:, 0].copy(), 'aflevering': aEntry[:, 4].copy(),
+                  'toonbaar': aEntry[:, 5] != 0, 'mijnen': aEntry[:, 6].copy(),
+                  'woord': aEntry[:, 7].astype(numpy.int32)}
+        for iCol, sTable in [(1, 'lemma'), (2, 'trefwoord'), (3, 'dialect')]:
+            oEntry[sTable] = numpy.searchsorted(oIndex[sTable]['id'], aEntry[:, iCol]).astype(numpy.int32)
+        oIndex['entry'] = oEntry
+        oIndex['woord'] = {'woord': list(dWoord.keys())}
+        # The text columns
+        oIndex['columns'] = {}
+        for sColumn, (sTable, bFold) in COLUMNAR_COLUMNS.items():
+            sField = 'woord' if sColumn in ['trefwoord', 'woord'] else sColumn
+            oIndex['columns'][sColumn] = get_column(oIndex[sTable][sField], bFold)
+        # Write the snapshot for the other processes, and share its pages with them
+        if iNumber != None and columnar_save(oIndex, iNumber):
+            oIndex = columnar_load(iNumber) or oIndex
+        with columnar_lock:
+            columnar_status['index'] = oIndex
+            columnar_status['number'] = iNumber
+            columnar_status['checked'] = time.time()
+            columnar_status['failed'] = 0
+        oErr.Status("columnar_build took {:.1f}s".format(time.time() - iStart))
+        return True
+    except:
+        oErr.DoError("columnar_build")
+        columnar_status['failed'] = time.time()
+        return False
+    finally:
+        with columnar_lock:
+            columnar_status['building'] = False
+
+def columnar_start():
+    """Make the index again in the background (if NumPy is available)"""
+
+    if numpy == None:
+        return False
+    with columnar_lock:
+        if columnar_status['building']:
+            return True
+        columnar_status['building'] = True
+    oThread = threading.Thread(target=columnar_build, daemon=True)
+    oThread.start()
+    return True
+
+def get_index():
+    """Get the index if it belongs to the current data generation (or None)"""
+
+    if numpy == None:
+        return None
+    iNow = time.time()
+    if iNow - columnar_status['checked'] > COLUMNAR_CHECK_SECONDS:
+        iNumber = Generation.get_number()
+        if iNumber == None or iNumber != columnar_status['number']:
+            # The index is out of date: use the snapshot of another process, if it is there
+            oIndex = None if iNumber == None else columnar_load(iNumber)
+            if oIndex == None:
+                # Use the database until it has been made again (after a failed build: for a while)
+                with columnar_lock:
+                    columnar_status['index'] = None
+                    columnar_status['checked'] = iNow
+                if iNow - columnar_status['failed'] > COLUMNAR_RETRY_SECONDS:
+                    columnar_start()
+            else:
+                with columnar_lock:
+                    columnar_status['index'] = oIndex
+                    columnar_status['number'] = iNumber
+                    columnar_status['checked'] = iNow
+        else:
+            columnar_status['checked'] = iNow
+    return columnar_status['index']
+
+def get_match(oColumn, val, bFold):
+    """Get the boolean array of the rows of [oColumn] whose text matches pattern [val]
+
+    Returns None for a pattern the database should answer: character classes
+    (the database uses GLOB), word boundaries and regular expressions.
+    """
+
+    bFold = bFold and 'fold' in oColumn
+    if bFold:
+        val = get_search_key_fold(val)
+    sKind, lParts = wildcard_classify(val)
+    iSize = len(oColumn['text'])
+    if sKind == 'all':
+        return numpy.ones(iSize, dtype=bool)
+    if sKind in ['exact', 'prefix']:
+        # The matching texts are next to each other in sorted order
+        sValue = lParts[0][1] if len(lParts) > 0 else ""
+        lSorted = oColumn['fold_sorted' if bFold else 'lower_sorted']
+        iStart = bisect_left(lSorted, sValue)
+        if sKind == 'exact':
+            iEnd = bisect_right(lSorted, sValue, iStart)
+        else:
+            iNext = ord(sValue[-1]) + 1
+            if iNext > 0x10ffff or (iNext >= 0xd800 and iNext <= 0xdfff):
+                iEnd = None
+            else:
+                iEnd = bisect_left(lSorted, sValue[:-1] + chr(iNext), iStart)
+        if iEnd != None:
+            bMatch = numpy.zeros(iSize, dtype=bool)
+            bMatch[oColumn['fold_rows' if bFold else 'lower_rows'][iStart:iEnd]] = True
+            return bMatch
+    if sKind not in ['exact', 'prefix', 'suffix', 'infix']:
+        return None
+    # Literal text anywhere in the text: the regular expression finds it
+    oRegex = re.compile(wildcard_regex(val), re.IGNORECASE)
+    lText = oColumn['fold' if bFold else 'text']
+    return numpy.fromiter((oRegex.search(sText) != None for sText in lText), dtype=bool, count=iSize)
+
+def columnar_select(sView, get, bFold=False, iGeneration=None):
+    """Get the ordered ids of the visible objects of list view [sView] satisfying the filters in [get]
+
+    Returns None if the index cannot answer this (yet), or if it does not belong
+    to data generation [iGeneration]: the database should be used.
+    """
+
+    oErr = ErrHandle()
+    try:
+        oView = COLUMNAR_VIEWS.get(sView)
+        if oView == None or not all([wildcard_filled(sMarker) for sMarker in COLUMNAR_MARKERS]):
+            return None
+        oIndex = get_index()
+        if oIndex == None or iGeneration == None or oIndex['number'] != iGeneration:
+            # An index of an older generation would give ids that are cached as if they were new
+            return None
+        dColumn = oIndex['columns']
+        oEntry = oIndex['entry']
+        oTable = oIndex[oView['target']]
+        sSearch = get.get('search', '').strip()
+        if sView == "trefwoord" and re.match(r'^\d+$', sSearch):
+            # Numbers are looked up differently
+            return None
+        for sParam in oView['skip']:
+            if get.get(sParam, '') != '':
+                return None
+        # The filters on the objects themselves
+        bTarget = oTable['toonbaar'].copy()
+        lTarget = [(oView['search'], get.get('search', ''))]
+        for sParam, sColumn in oView['fields'].items():
+            lTarget.append((sColumn, get.get(sParam, '')))
+        for sColumn, val in lTarget:
+            if val != '':
+                bMatch = get_match(dColumn[sColumn], val, bFold)
+                if bMatch is None:
+                    return None
+                bTarget &= bMatch
+        # The filters on the entries
+        bEntry = None
+        for sParam, sColumn in oView['entry'].items():
+            val = get.get(sParam, '')
+            if val != '':
+                bMatch = get_match(dColumn[sColumn], val, bFold)
+                if bMatch is None:
+                    return None
+                sTable = COLUMNAR_COLUMNS[sColumn][0]
+                bEntry = bMatch[oEntry[sTable]] if bEntry is None else bEntry & bMatch[oEntry[sTable]]
+        val = get.get('aflevering', '')
+        if val.isdigit() and int(val) > 0:
+            bMatch = (oEntry['aflevering'] == int(val))
+            bEntry = bMatch if bEntry is None else bEntry & bMatch
+        val = get.get('mijn', '')
+        if val.isdigit() and int(val) > 0:
+            iMask = Mijn.get_mask(int(val))
+            if iMask == None:
+                return None
+            bMatch = ((oEntry['mijnen'] & iMask) != 0)
+            bEntry = bMatch if bEntry is None else bEntry & bMatch
+        if bEntry is not None:
+            # Only objects with at least one entry satisfying all of these
+            bHas = numpy.zeros(len(bTarget), dtype=bool)
+            bHas[oEntry[oView['target']][bEntry]] = True
+            bTarget &= bHas
+        aOrder = oTable['order']
+        return oTable['id'][aOrder[bTarget[aOrder]]].tolist()
+    except:
+        oErr.DoError("columnar_select")
+        return None
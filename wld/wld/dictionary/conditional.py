@@ -0,0 +1,97 @@
+"""Conditional responses for the public read-only views, based on the data generation.
+
+The dictionary only changes through imports, repairs, kloeke imports and edits
+in the admin, and each of these raises the data generation (see
+Generation.data_changed). The response to a request is therefore fully
+determined by the request itself (path and parameters) and the generations of
+the data and of the reference tables. That gives an ETag and a Last-Modified
+time without computing the response, and a request whose If-None-Match or
+If-Modified-Since header matches is answered with 304 Not Modified.
+
+A request that filters on one aflevering uses the generation of that
+aflevering instead of the global one, so that it stays valid while other
+afleveringen are imported. Pages of logged-in users contain user-specific
+parts, so they are always sent in full, and so are the responses to POST
+requests (searches and exports submitted by a form).
+
+Only the read-only list, detail and map views of the dictionary use this (see
+ConditionalView); the lists of dialects, mijnen and delen and the dialect check
+do not.
+"""
+
+import hashlib
+from django.http import HttpResponseNotModified
+from django.http.response import HttpResponseBase
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from wld.dictionary.models import Generation
+from wld.dictionary.refdata import REFDATA_GENERATION
+
+# Parameters that do not influence the response
+CONDITIONAL_SKIP = ['csrfmiddlewaretoken']
+
+
+def get_validators(request):
+    """Get the ETag and the Last-Modified time of the response to [request], or (None, None)"""
+
+    if request.user.is_authenticated or request.method not in ['GET', 'HEAD']:
+        return None, None
+    get = request.GET
+    # The aflevering filter decides which data generation applies
+    sAfl = get.get('aflevering', '')
+    sName = Generation.get_afl_name(int(sAfl)) if sAfl.isdigit() and int(sAfl) > 0 else "data"
+    oData = Generation.get_stamp(sName)
+    oReference = Generation.get_stamp(REFDATA_GENERATION)
+    if oData == None or oReference == None:
+        return None, None
+    # The request itself: path and (sorted) parameters
+    lParam = [request.path]
+    for sKey in sorted(get.keys()):
+        if sKey not in CONDITIONAL_SKIP:
+            lParam.append("{}={}".format(sKey, "|".join(get.getlist(sKey))))
+    sRequest = hashlib.md5("&".join(lParam).encode('utf-8')).hexdigest()
+    # The ETag is weak: the same content may be sent compressed or not
+    sETag = 'W/"{}-{}-{}-{}"'.format(sName, oData[0], oReference[0], sRequest)
+    lTime = [oStamp[1] for oStamp in [oData, oReference] if oStamp[1] != None]
+    iLast = int(max(lTime).timestamp()) if len(lTime) > 0 else None
+    return sETag, iLast
+
+def is_not_modified(request, sETag, iLast):
+    """Check whether the client's copy of the response, with validators [sETag] and [iLast], is still valid"""
+
+    if sETag == None:
+        return False
+    sMatch = request.META.get('HTTP_IF_NONE_MATCH')
+    if sMatch != None:
+        # Weak comparison: the 'W/' prefix does not matter
+        lMatch = [s.strip().replace('W/', '', 1) for s in sMatch.split(",")]
+        return sMatch.strip() == "*" or sETag.replace('W/', '', 1) in lMatch
+    iSince = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return iLast != None and iSince != None and iLast <= iSince
+
+def set_validators(response, sETag, iLast):
+    """Add the ETag and Last-Modified headers to [response]"""
+
+    if sETag != None and isinstance(response, HttpResponseBase) and response.status_code in [200, 304]:
+        # Prebuilt exports have a validator of their own
+        if not response.has_header('ETag'):
+            response['ETag'] = sETag
+        if iLast != None and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(iLast)
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+def conditional_response(request, get_response):
+    """Answer [request] with 304 if the client's copy is valid, otherwise with [get_response]() plus validators"""
+
+    sETag, iLast = get_validators(request)
+    if is_not_modified(request, sETag, iLast):
+        return set_validators(HttpResponseNotModified(), sETag, iLast)
+    return set_validators(get_response(), sETag, iLast)
+
+
+class ConditionalView():
+    """Mixin for read-only views whose GET (and HEAD) responses only depend on the request and the data generation"""
+
+    def dispatch(self, request, *args, **kwargs):
+        return conditional_response(request, lambda: super(ConditionalView, self).dispatch(request, *args, **kwargs))
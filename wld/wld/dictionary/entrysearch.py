@@ -0,0 +1,127 @@
+"""Flattened copy of the visible entries, read by the exports and the lemma map.
+
+The table of [EntrySearch] has one row per visible [Entry], with the same id.
+Each row holds the texts of the entry together with those of its lemma,
+trefwoord, dialect (and its coordinates), description and aflevering, as well
+as the search fields ('_lower', '_rev', '_fold') and the sort keys of these
+texts and a bitmask of the mijnen of the entry (see Mijn.get_mask). Reading
+these rows needs no joins, and filtering on a mijn needs no DISTINCT.
+
+Entry and its related tables remain the source: the rows of the entries that
+change are made again by entrysearch_update(), which the importer calls for
+each aflevering it reads, and which follows the signal 'entries_changed' (see
+models.py). Use the management command 'searchfields' after loading fixtures
+by hand: rebuilding the whole table sets its marker (see Generation.get_filled),
+and loading objects from a fixture clears it.
+
+Only the exports and the lemma map read this table. The lemma, trefwoord and
+location lists select lemma's, trefwoorden and dialects (not entries), and
+get their ordered ids from the search snapshots and the columnar index (see
+paging.py and columnar.py); the entries of one page are read from Entry.
+"""
+
+import time
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from wld.dictionary.models import Entry, EntryMijn, EntrySearch, Lemma, Trefwoord, Dialect, Description, \
+     Aflevering, Coordinate, Mijn, Generation, entries_changed
+from wld.utils import ErrHandle
+
+# The columns of the table and the expression they are filled with
+ENTRYSEARCH_COLUMNS = [
+    ('id', 'e.id'), ('entry_id', 'e.id'),
+    ('lemma_id', 'e.lemma_id'), ('trefwoord_id', 'e.trefwoord_id'),
+    ('dialect_id', 'e.dialect_id'), ('aflevering_id', 'e.aflevering_id'),
+    ('woord', 'e.woord'), ('woord_lower', 'e.woord_lower'), ('woord_rev', 'e.woord_rev'), ('woord_fold', 'e.woord_fold'),
+    ('toelichting', 'e.toelichting'), ('toelichting_key', 'e.toelichting_key'),
+    ('gloss', 'l.gloss'), ('gloss_lower', 'l.gloss_lower'), ('gloss_rev', 'l.gloss_rev'), ('gloss_fold', 'l.gloss_fold'),
+    ('trefwoord_woord', 't.woord'), ('trefwoord_key', 't.woord_lower'), ('trefwoord_fold', 't.woord_fold'),
+    ('stad', 'd.stad'), ('stad_lower', 'd.stad_lower'), ('stad_rev', 'd.stad_rev'), ('stad_fold', 'd.stad_fold'),
+    ('nieuw', 'd.nieuw'), ('nieuw_lower', 'd.nieuw_lower'), ('nieuw_rev', 'd.nieuw_rev'),
+    ('bronnenlijst', 'o.bronnenlijst'),
+    ('aflevering_naam', 'a.naam'), ('aflevering_summary', 'a.summary'), ('aflevering_key', 'a.sortkey'),
+    ('point', 'c.point'), ('place', 'c.place'),
+    # The bitmask of the entry, or calculated from EntryMijn if it has not been filled yet
+    ('mijnen', "COALESCE(e.mijnen, {})".format(Mijn.get_mijnen_sql("e.id"))),
+    ]
+
+# Number of seconds during which the outcome of [entrysearch_ready()] is kept
+ENTRYSEARCH_CHECK_SECONDS = 60
+
+# Loading objects of these models from a fixture leaves the table out of date
+ENTRYSEARCH_SOURCES = [Entry, EntryMijn, Lemma, Trefwoord, Dialect, Description, Aflevering, Coordinate]
+
+# Process-local status of the table: (time of checking, ready or not), and whether this process cleared the marker
+entrysearch_status = {'checked': 0, 'ready': False, 'cleared': False}
+
+
+def entrysearch_update(qs = None):
+    """Make the rows of the entries in [qs] (or of all entries) again"""
+
+    oErr = ErrHandle()
+    try:
+        iStart = time.time()
+        sColumns = ", ".join([sColumn for sColumn, sValue in ENTRYSEARCH_COLUMNS])
+        sValues = ", ".join([sValue for sColumn, sValue in ENTRYSEARCH_COLUMNS])
+        sSql = "INSERT INTO {} ({}) SELECT {} " \
+               "FROM dictionary_entry e " \
+               "INNER JOIN dictionary_lemma l ON l.id = e.lemma_id " \
+               "INNER JOIN dictionary_trefwoord t ON t.id = e.trefwoord_id " \
+               "INNER JOIN dictionary_dialect d ON d.id = e.dialect_id " \
+               "INNER JOIN dictionary_description o ON o.id = e.descr_id " \
+               "INNER JOIN dictionary_aflevering a ON a.id = e.aflevering_id " \
+               "LEFT OUTER JOIN dictionary_coordinate c ON c.id = d.coordinate_id " \
+               "WHERE COALESCE(e.toonbaar, a.toonbaar)".format(EntrySearch._meta.db_table, sColumns, sValues)
+        lParam = []
+        with transaction.atomic():
+            if qs == None:
+                EntrySearch.objects.all().delete()
+            else:
+                # Only the rows of these entries are made again
+                sIds, lParam = qs.order_by().values('id').query.sql_with_params()
+                EntrySearch.objects.filter(id__in=qs.order_by().values('id')).delete()
+                sSql += " AND e.id IN ({})".format(sIds)
+            with connection.cursor() as cursor:
+                cursor.execute(sSql, lParam)
+        if qs == None:
+            # The whole table has been made
+            Generation.set_filled('entrysearch')
+            entrysearch_status['cleared'] = False
+        # Make sure the next reader re-checks the table
+        entrysearch_status['checked'] = 0
+        oErr.Status("entrysearch_update took {:.1f}s".format(time.time() - iStart))
+        return True
+    except:
+        oErr.DoError("entrysearch_update")
+        return False
+
+def entrysearch_ready():
+    """Check if the table has been made (using its marker instead of counting the rows)"""
+
+    oErr = ErrHandle()
+    iNow = time.time()
+    if iNow - entrysearch_status['checked'] > ENTRYSEARCH_CHECK_SECONDS:
+        bReady = ('entrysearch' in Generation.get_filled(['entrysearch']))
+        if not bReady:
+            oErr.Status("entrysearch_ready: the table has not been made (see the command 'searchfields')")
+        entrysearch_status['ready'] = bReady
+        entrysearch_status['checked'] = iNow
+    return entrysearch_status['ready']
+
+def entrysearch_changed(sender, qs=None, **kwargs):
+    """The entries in [qs] have changed (e.g. their visibility): make their rows again"""
+
+    if qs != None:
+        entrysearch_update(qs)
+
+def entrysearch_loaded(sender, instance, raw=False, **kwargs):
+    """Objects loaded from a fixture have no search rows: clear the marker of the table (once per process)"""
+
+    if raw and not entrysearch_status['cleared']:
+        Generation.set_filled('entrysearch', False)
+        entrysearch_status['cleared'] = True
+        entrysearch_status['checked'] = 0
+
+entries_changed.connect(entrysearch_changed)
+for cls in ENTRYSEARCH_SOURCES:
+    post_save.connect(entrysearch_loaded, sender=cls)
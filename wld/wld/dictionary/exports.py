@@ -0,0 +1,114 @@
+"""Rows of the exports, and the ordering of the entries in the lists.
+
+The list views (views.py) and the prebuilt exports (artifacts.py) write the
+same rows in the same order; both take them from here.
+"""
+
+import csv
+from django.db.models.functions import Lower
+from wld.dictionary.models import Entry, EntrySearch
+from wld.dictionary.entrysearch import entrysearch_ready
+from wld.dictionary.wildcard import sortkeys_ready
+
+# The columns of the exports
+outputColumns = ['begrip', 'trefwoord', 'dialectopgave', 'Kloekecode', 'aflevering', 'bronnenlijst']
+# The Entry fields of the [outputColumns]
+outputFields = ['lemma__gloss', 'trefwoord__woord', 'woord', 'dialect__nieuw', 'aflevering__naam', 'descr__bronnenlijst']
+# The same fields in EntrySearch
+outputSearchFields = ['gloss', 'trefwoord_woord', 'woord', 'nieuw', 'aflevering_naam', 'bronnenlijst']
+# Number of rows read from the database at once while exporting
+exportChunkSize = 2000
+# The orderings of the entries in the trefwoord, lemma and location lists, on the sort keys of Entry
+entryOrders = {'trefwoord': ['trefwoord_key', 'lemma_key', 'toelichting_key', 'woord_lower', 'dialect_key'],
+               'lemma': ['lemma_key', 'trefwoord_key', 'toelichting_key', 'woord_lower', 'dialect_key'],
+               'location': ['dialect_key', 'lemma_key', 'trefwoord_key', 'toelichting_key', 'woord_lower'],
+               # The lemma list with the word order 'dialectopgave-toelichting' (no index of its own: the
+               #   entries of one page are sorted)
+               'lemma_wrdtoel': ['lemma_key', 'trefwoord_key', 'woord_lower', 'toelichting_key', 'dialect_key']}
+# The texts these sort keys are made of
+entrySortTexts = {'trefwoord_key': 'trefwoord__woord', 'lemma_key': 'lemma__gloss', 'toelichting_key': 'toelichting',
+                  'woord_lower': 'woord', 'dialect_key': 'dialect__stad'}
+
+
+def get_entry_order(sView):
+    """Get the ordering of the entries in list [sView]: on the (indexed) sort keys, if these have been filled"""
+
+    lOrder = entryOrders[sView]
+    if not sortkeys_ready():
+        lOrder = [Lower(entrySortTexts[sKey]) for sKey in lOrder]
+    return lOrder
+
+def get_export_rows(qs):
+    """Iterate over the rows (following [outputColumns]) of the Entry queryset [qs], reading them in chunks
+
+    The texts are read from the flattened search rows where possible, so that
+    only the ids (in their order) need to come from [qs].
+    """
+
+    if not entrysearch_ready():
+        for row in qs.values_list(*outputFields).iterator(chunk_size=exportChunkSize):
+            yield row
+        return
+    lId = []
+    for iId in qs.values_list('id', flat=True).iterator(chunk_size=exportChunkSize):
+        lId.append(iId)
+        if len(lId) >= exportChunkSize:
+            yield from get_export_chunk(lId)
+            lId = []
+    if len(lId) > 0:
+        yield from get_export_chunk(lId)
+
+def get_export_chunk(lId):
+    """Get the rows (following [outputColumns]) of the entries with the ids in [lId], in that order"""
+
+    dRow = {}
+    for row in EntrySearch.objects.filter(id__in=lId).values_list('id', *outputSearchFields):
+        dRow[row[0]] = row[1:]
+    # Entries without a search row (e.g. not visible) are read from Entry itself
+    lMissing = [iId for iId in lId if iId not in dRow]
+    if len(lMissing) > 0:
+        for row in Entry.objects.filter(id__in=lMissing).values_list('id', *outputFields):
+            dRow[row[0]] = row[1:]
+    return [dRow[iId] for iId in lId if iId in dRow]
+
+class CsvBuffer():
+    """Pseudo file for the CSV writer: [write()] returns what should be written"""
+
+    def write(self, sValue):
+        return sValue
+
+def write_xlsx(qs, sTitle, output):
+    """Write the rows of Entry queryset [qs] as an Excel workbook to [output] (a file name or file object)
+
+    The workbook is made in write-only mode: the rows are written to a temporary
+    file as they come, and all cells share the same (few) style objects.
+    """
+
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils.cell import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=sTitle)
+    # Styles are shared by all cells
+    fontBold = openpyxl.styles.Font(bold=True)
+    alignWrap = openpyxl.styles.Alignment(wrap_text=True)
+    # Column widths must be set before writing the first row
+    for col_num in range(len(outputColumns)):
+        ws.column_dimensions[get_column_letter(col_num+1)].width = 20.0
+    # The row with the headings
+    lCells = []
+    for sColumn in outputColumns:
+        c = WriteOnlyCell(ws, value=sColumn)
+        c.font = fontBold
+        lCells.append(c)
+    ws.append(lCells)
+    # Walk the queryset
+    for row in get_export_rows(qs):
+        lCells = []
+        for value in row:
+            c = WriteOnlyCell(ws, value=value)
+            c.alignment = alignWrap
+            lCells.append(c)
+        ws.append(lCells)
+    wb.save(output)
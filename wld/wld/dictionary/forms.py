@@ -81,6 +81,7 @@ class LemmaSearchForm(forms.ModelForm):
     aflevering = forms.CharField(label=_("Deel/sectie/aflevering"), required=False)
     mijn = forms.CharField(label=_("Mijn"), required=False)
     strict = forms.CharField(label=_("Strict filteren"), required=False)
+    ignoreAccents = forms.CharField(label=_("Negeer accenten"), required=False)
 
     class Meta:
 
@@ -110,6 +111,7 @@ class TrefwoordSearchForm(forms.ModelForm):
     aflevering = forms.CharField(label=_("Deel/sectie/aflevering"))
     mijn = forms.CharField(label=_("Mijn"))
     strict = forms.CharField(label=_("Strict filteren"))
+    ignoreAccents = forms.CharField(label=_("Negeer accenten"))
 
     class Meta:
 
@@ -0,0 +1,350 @@
+"""Full-text index for the searchable texts of the dictionary.
+
+The index is an SQLite FTS5 virtual table with one row per [Entry].
+It holds the dialect word and its toelichting, the gloss of the lemma,
+the trefwoord (and its toelichting) and the place name of the dialect.
+Search filters of the list views are resolved through this table into sets
+of Entry (or Lemma, Trefwoord, Dialect) ids, so that the expensive REGEXP
+filter only needs to be evaluated on the rows that are candidates anyway.
+
+A second FTS5 table uses the trigram tokenizer on the lower-case dialect word,
+gloss and trefwoord. It answers which rows contain a given piece of text of at
+least three characters, which narrows down infix searches such as '*kaol*'
+and patterns with character classes, where the words themselves are unknown.
+
+The indexes are rebuilt after importing and after repairing; use the management
+command 'fulltext' after loading fixtures by hand. Saving an entry, lemma,
+trefwoord or dialect whose indexed texts change makes the rows of its entries
+again, and deleting an entry removes its rows (see the receivers at the end).
+"""
+
+import re
+import time
+from django.db import connection, transaction, OperationalError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import pre_save, post_save, post_delete
+from wld.dictionary.models import Dialect, Entry, Lemma, Trefwoord, get_search_key, get_text_changed
+from wld.utils import ErrHandle
+
+FTS_TABLE = "dictionary_entryfts"
+
+# The (indexed) text columns of the FTS table and where they come from
+FTS_COLUMNS = ['woord', 'toelichting', 'gloss', 'trefwoord', 'trefwoord_toelichting', 'stad']
+
+# The ids that can be retrieved from the FTS table
+FTS_TARGETS = {'entry': 'rowid', 'lemma': 'lemma_id', 'trefwoord': 'trefwoord_id', 'dialect': 'dialect_id'}
+
+# The trigram table and its (lower-case) text columns
+TRIGRAM_TABLE = "dictionary_entrytrigram"
+TRIGRAM_COLUMNS = ['woord', 'gloss', 'trefwoord']
+
+# Pieces of text shorter than this cannot be looked up in the trigram table
+TRIGRAM_MIN = 3
+
+# The models whose texts are in the indexes: the fields these texts depend on, and the path from Entry
+FTS_SOURCES = {Entry: (['woord', 'toelichting', 'lemma', 'trefwoord', 'dialect'], 'id'),
+               Lemma: (['gloss'], 'lemma'),
+               Trefwoord: (['woord', 'toelichting'], 'trefwoord'),
+               Dialect: (['stad'], 'dialect')}
+
+# Number of seconds during which the outcome of [fulltext_ready()] is kept
+FTS_CHECK_SECONDS = 60
+
+# Process-local status of the indexes: (time of checking, ready or not)
+fts_status = {'checked': 0, 'ready': False}
+trigram_status = {'checked': 0, 'ready': False}
+
+
+class SubqueryIds(RawSQL):
+    """Raw SQL subquery returning ids, to be used with an '__in' lookup
+
+    The '__in' lookup puts the subquery between brackets itself: RawSQL would add
+    a second pair, turning the subquery into a scalar (SQLite then only uses the first row).
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def fulltext_supported():
+    """Check if the database supports the FTS5 full-text index"""
+
+    return connection.vendor == "sqlite"
+
+def fulltext_create(cursor):
+    """Create the FTS5 table (if it does not exist yet)"""
+
+    sColumns = ", ".join(FTS_COLUMNS)
+    sSql = "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(lemma_id UNINDEXED, trefwoord_id UNINDEXED, " \
+           "dialect_id UNINDEXED, {}, tokenize = 'unicode61 remove_diacritics 0')".format(FTS_TABLE, sColumns)
+    cursor.execute(sSql)
+
+def get_fulltext_sql():
+    """Get the SQL filling the full-text index from Entry, Lemma, Trefwoord and Dialect"""
+
+    sColumns = ", ".join(FTS_COLUMNS)
+    return "INSERT INTO {} (rowid, lemma_id, trefwoord_id, dialect_id, {}) " \
+           "SELECT e.id, e.lemma_id, e.trefwoord_id, e.dialect_id, e.woord, e.toelichting, " \
+           "l.gloss, t.woord, t.toelichting, d.stad " \
+           "FROM dictionary_entry e " \
+           "INNER JOIN dictionary_lemma l ON l.id = e.lemma_id " \
+           "INNER JOIN dictionary_trefwoord t ON t.id = e.trefwoord_id " \
+           "INNER JOIN dictionary_dialect d ON d.id = e.dialect_id".format(FTS_TABLE, sColumns)
+
+def fulltext_rebuild():
+    """Fill the full-text index with the current contents of Entry, Lemma, Trefwoord and Dialect"""
+
+    oErr = ErrHandle()
+    bResult = False
+    try:
+        if not fulltext_supported():
+            return False
+        iStart = time.time()
+        sSql = get_fulltext_sql()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                fulltext_create(cursor)
+                cursor.execute("DELETE FROM {}".format(FTS_TABLE))
+                cursor.execute(sSql)
+        # Make sure the next search re-checks the index
+        fts_status['checked'] = 0
+        oErr.Status("fulltext_rebuild took {:.1f}s".format(time.time() - iStart))
+        bResult = True
+    except OperationalError:
+        # This SQLite version has no FTS5: searching just goes without the index
+        oErr.DoError("fulltext_rebuild: FTS5 is not available")
+    except:
+        oErr.DoError("fulltext_rebuild")
+    # The trigram index is optional: it does not influence the result
+    if bResult:
+        trigram_rebuild()
+    return bResult
+
+def fulltext_update(qs):
+    """Make the rows of the entries in [qs] in the full-text and trigram indexes again
+
+    This keeps the indexes in line with the texts when single objects are saved.
+    Nothing is done for an index that is not in use: it is rebuilt as a whole.
+    """
+
+    oErr = ErrHandle()
+    try:
+        lSql = []
+        if fulltext_ready():
+            lSql.append((FTS_TABLE, get_fulltext_sql()))
+        if trigram_ready():
+            lSql.append((TRIGRAM_TABLE, get_trigram_sql()))
+        if len(lSql) == 0:
+            return False
+        # Entries that no longer exist only lose their rows
+        sIds, lParam = qs.order_by().values('id').query.sql_with_params()
+        with transaction.atomic():
+            # The trigram index uses the lower-case texts (see trigram_rebuild)
+            connection.ensure_connection()
+            connection.connection.create_function("wld_search_key", 1, get_search_key)
+            with connection.cursor() as cursor:
+                for sTable, sSql in lSql:
+                    cursor.execute("DELETE FROM {} WHERE rowid IN ({})".format(sTable, sIds), lParam)
+                    cursor.execute(sSql + " WHERE e.id IN ({})".format(sIds), lParam)
+        return True
+    except:
+        oErr.DoError("fulltext_update")
+        return False
+
+def fulltext_remove(lId):
+    """Remove the rows of the entries with an id in [lId] from the full-text and trigram indexes"""
+
+    oErr = ErrHandle()
+    try:
+        if not fulltext_supported() or len(lId) == 0:
+            return False
+        sIds = ", ".join(["%s"] * len(lId))
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # The entries are gone already, so the indexes may look out of date: use any table that exists
+                for sTable in [FTS_TABLE, TRIGRAM_TABLE]:
+                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=%s", [sTable])
+                    if cursor.fetchone() != None:
+                        cursor.execute("DELETE FROM {} WHERE rowid IN ({})".format(sTable, sIds), list(lId))
+        # Make sure the next reader re-checks the indexes
+        fts_status['checked'] = 0
+        trigram_status['checked'] = 0
+        return True
+    except:
+        oErr.DoError("fulltext_remove")
+        return False
+
+def get_trigram_sql():
+    """Get the SQL filling the trigram index from Entry, Lemma and Trefwoord (using 'wld_search_key')"""
+
+    sColumns = ", ".join(TRIGRAM_COLUMNS)
+    return "INSERT INTO {} (rowid, lemma_id, trefwoord_id, dialect_id, {}) " \
+           "SELECT e.id, e.lemma_id, e.trefwoord_id, e.dialect_id, wld_search_key(e.woord), " \
+           "wld_search_key(l.gloss), wld_search_key(t.woord) " \
+           "FROM dictionary_entry e " \
+           "INNER JOIN dictionary_lemma l ON l.id = e.lemma_id " \
+           "INNER JOIN dictionary_trefwoord t ON t.id = e.trefwoord_id".format(TRIGRAM_TABLE, sColumns)
+
+def trigram_rebuild():
+    """Fill the trigram index with the lower-case texts of Entry, Lemma and Trefwoord"""
+
+    oErr = ErrHandle()
+    bResult = False
+    try:
+        if not fulltext_supported():
+            return False
+        iStart = time.time()
+        sColumns = ", ".join(TRIGRAM_COLUMNS)
+        sSql = get_trigram_sql()
+        with transaction.atomic():
+            # SQLite's own LOWER() only handles ASCII: use the version of the '_lower' search fields instead
+            connection.ensure_connection()
+            connection.connection.create_function("wld_search_key", 1, get_search_key)
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(lemma_id UNINDEXED, " \
+                               "trefwoord_id UNINDEXED, dialect_id UNINDEXED, {}, tokenize = 'trigram')".format(
+                                   TRIGRAM_TABLE, sColumns))
+                cursor.execute("DELETE FROM {}".format(TRIGRAM_TABLE))
+                cursor.execute(sSql)
+        # Make sure the next search re-checks the index
+        trigram_status['checked'] = 0
+        oErr.Status("trigram_rebuild took {:.1f}s".format(time.time() - iStart))
+        bResult = True
+    except OperationalError:
+        # This SQLite version has no trigram tokenizer (it needs 3.34 or later)
+        oErr.DoError("trigram_rebuild: the trigram tokenizer is not available")
+    except:
+        oErr.DoError("trigram_rebuild")
+    return bResult
+
+def get_ready(sTable, oStatus):
+    """Check if FTS table [sTable] exists and is in line with the Entry table, using the cached [oStatus]"""
+
+    oErr = ErrHandle()
+    if not fulltext_supported():
+        return False
+    iNow = time.time()
+    if iNow - oStatus['checked'] > FTS_CHECK_SECONDS:
+        bReady = False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=%s", [sTable])
+                if cursor.fetchone() != None:
+                    # The index may only be used if it covers the same entries as the Entry table
+                    cursor.execute("SELECT MAX(rowid), COUNT(*) FROM {}".format(sTable))
+                    tFts = cursor.fetchone()
+                    cursor.execute("SELECT MAX(id), COUNT(*) FROM dictionary_entry")
+                    tEntry = cursor.fetchone()
+                    bReady = (tuple(tFts) == tuple(tEntry))
+                    if not bReady:
+                        oErr.Status("get_ready: index {} is out of date".format(sTable))
+        except:
+            oErr.DoError("get_ready " + sTable)
+            bReady = False
+        oStatus['ready'] = bReady
+        oStatus['checked'] = iNow
+    return oStatus['ready']
+
+def fulltext_ready():
+    """Check if the full-text index exists and is in line with the Entry table"""
+
+    return get_ready(FTS_TABLE, fts_status)
+
+def trigram_ready():
+    """Check if the trigram index exists and is in line with the Entry table"""
+
+    return get_ready(TRIGRAM_TABLE, trigram_status)
+
+def fulltext_query(val):
+    """Convert the user's search pattern [val] into an FTS5 phrase query, if possible
+
+    The phrase is chosen such that it matches a *superset* of what the pattern matches:
+    - a pattern without wildcards matches its literal as a phrase
+    - a pattern that starts with a literal matches that literal as a prefix phrase
+    - a pattern 'woord#' matches 'woord' as a phrase
+    Patterns starting with a wildcard cannot be answered by the index: None is returned.
+    """
+
+    val = val.strip()
+    if '#' in val:
+        # Only the literal part before the first '#' is used
+        sLiteral = val.split('#')[0]
+        if sLiteral == "" or re.search(r'[\*\?\[\]\.\(\)\|\\]', sLiteral):
+            return None
+        bPrefix = False
+    else:
+        oMatch = re.match(r'^([^\*\?\[]*)(.*)$', val)
+        sLiteral = oMatch.group(1)
+        bPrefix = (oMatch.group(2) != "")
+    # There must be at least one word character to search for
+    if not re.search(r'\w', sLiteral):
+        return None
+    sPhrase = '"{}"'.format(sLiteral.replace('"', '""'))
+    if bPrefix:
+        sPhrase += " *"
+    return sPhrase
+
+def fulltext_filter(field, val, target="entry", path="id"):
+    """Get a Q-filter restricting [path] to the [target] ids whose [field] may match [val]
+
+    Returns None if the full-text index cannot help for this pattern.
+    """
+
+    if field not in FTS_COLUMNS or target not in FTS_TARGETS:
+        return None
+    sPhrase = fulltext_query(val)
+    if sPhrase == None or not fulltext_ready():
+        return None
+    sMatch = "{} : ({})".format(field, sPhrase)
+    sSql = "SELECT {} FROM {} WHERE {} MATCH %s".format(FTS_TARGETS[target], FTS_TABLE, FTS_TABLE)
+    return Q(**{"{}__in".format(path): SubqueryIds(sSql, [sMatch])})
+
+def fulltext_add(lstQ, field, val, target="entry", path="id"):
+    """Add a full-text pre-selection for [field] to the list of filters [lstQ] (where possible)"""
+
+    oQ = fulltext_filter(field, val, target, path)
+    if oQ != None:
+        lstQ.append(oQ)
+    return lstQ
+
+def trigram_filter(field, lLiteral, target="entry", path="id"):
+    """Get a Q-filter restricting [path] to the [target] ids whose [field] contains all of [lLiteral]
+
+    The pieces of text in [lLiteral] must be in lower case. Those shorter than
+    TRIGRAM_MIN are skipped; None is returned if none is left, or if the
+    trigram index cannot be used.
+    """
+
+    if field not in TRIGRAM_COLUMNS or target not in FTS_TARGETS:
+        return None
+    lPhrase = ['"{}"'.format(sLiteral.replace('"', '""')) for sLiteral in lLiteral if len(sLiteral) >= TRIGRAM_MIN]
+    if len(lPhrase) == 0 or not trigram_ready():
+        return None
+    sMatch = "{} : ({})".format(field, " AND ".join(lPhrase))
+    sSql = "SELECT {} FROM {} WHERE {} MATCH %s".format(FTS_TARGETS[target], TRIGRAM_TABLE, TRIGRAM_TABLE)
+    return Q(**{"{}__in".format(path): SubqueryIds(sSql, [sMatch])})
+
+def fulltext_check(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Before saving [instance]: note whether its indexed texts change (fixtures are indexed as a whole)"""
+
+    lField, sPath = FTS_SOURCES[sender]
+    instance.fulltext_changed = not raw and (fulltext_ready() or trigram_ready()) and \
+        get_text_changed(instance, lField, update_fields)
+
+def fulltext_changed(sender, instance, **kwargs):
+    """After saving [instance]: make the rows of its entries again, if its indexed texts have changed"""
+
+    if getattr(instance, 'fulltext_changed', False):
+        lField, sPath = FTS_SOURCES[sender]
+        fulltext_update(Entry.objects.filter(**{sPath: instance.pk}))
+
+def fulltext_deleted(sender, instance, **kwargs):
+    """After deleting an entry (also when its lemma etc. is deleted): remove its rows"""
+
+    fulltext_remove([instance.pk])
+
+for cls in FTS_SOURCES:
+    pre_save.connect(fulltext_check, sender=cls)
+    post_save.connect(fulltext_changed, sender=cls)
+post_delete.connect(fulltext_deleted, sender=Entry)
@@ -0,0 +1,74 @@
+"""Grouping of the entries on a page into nested groups for the list templates.
+
+The entries of a page are sorted already (e.g. on lemma, trefwoord, toelichting
+and dialectopgave). Walking through them once, [group_entries()] builds the
+nested groups: a list of lemma groups, each with a list of trefwoord groups,
+and so on. The groups of the deepest level hold the entries themselves.
+The templates loop over these groups, so that they no longer need 'first'
+and 'last' flags for every entry and every level.
+"""
+
+import operator
+
+
+class EntryGroup():
+    """A series of consecutive entries that have the same key value"""
+
+    __slots__ = ['key', 'entry', 'groups', 'entries', 'members', 'final', 'alist', 'dlist']
+
+    def __init__(self, key, entry):
+        # The key value and the first entry of the group
+        self.key = key
+        self.entry = entry
+        # The groups of the next level, or the entries for the deepest level
+        self.groups = []
+        self.entries = []
+        # All entries of a top-level group
+        self.members = []
+        # Whether this is the final group (on its level) within its top-level group
+        self.final = False
+        # Lists the views attach to a top-level group (afleveringen, descriptions)
+        self.alist = None
+        self.dlist = None
+
+
+def get_accessor(spec):
+    """Turn [spec] into a function: a callable is used as it is, 'lemma.gloss' becomes an attribute getter"""
+
+    if callable(spec):
+        return spec
+    return operator.attrgetter(spec)
+
+def group_entries(entries, lSpec):
+    """Group the (sorted) [entries] in one pass into nested groups, following the keys in [lSpec]
+
+    Each key in [lSpec] is a callable or a (dotted) attribute name. A new group on
+    one level always starts new groups on all the levels below it.
+    Returns the list of top-level groups.
+    """
+
+    lFun = [get_accessor(spec) for spec in lSpec]
+    iDepth = len(lFun)
+    lTop = []
+    lOpen = [None] * iDepth
+    for entry in entries:
+        bNew = False
+        for iLevel in range(iDepth):
+            key = lFun[iLevel](entry)
+            oGroup = lOpen[iLevel]
+            if bNew or oGroup == None or oGroup.key != key:
+                oGroup = EntryGroup(key, entry)
+                if iLevel == 0:
+                    lTop.append(oGroup)
+                else:
+                    lOpen[iLevel-1].groups.append(oGroup)
+                lOpen[iLevel] = oGroup
+                bNew = True
+        lOpen[0].members.append(entry)
+        lOpen[-1].entries.append(entry)
+    # Mark the final group on each level of every top-level group
+    for oGroup in lTop:
+        while oGroup != None:
+            oGroup.final = True
+            oGroup = oGroup.groups[-1] if len(oGroup.groups) > 0 else None
+    return lTop
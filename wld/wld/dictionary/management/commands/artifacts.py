@@ -0,0 +1,15 @@
+"""Make the prebuilt exports (per aflevering and for everything) of the dictionary"""
+
+from django.core.management.base import BaseCommand, CommandError
+from wld.dictionary.artifacts import artifacts_build
+
+class Command(BaseCommand):
+
+    help = 'make the prebuilt CSV, Excel and JSON exports for the current data generation'
+    args = ''
+
+    def handle(self, *args, **options):
+
+        if not artifacts_build():
+            raise CommandError("Could not make the prebuilt exports")
+        self.stdout.write("The prebuilt exports have been made")
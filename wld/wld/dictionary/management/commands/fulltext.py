@@ -0,0 +1,17 @@
+"""Rebuild the full-text index of the dictionary"""
+
+from django.core.management.base import BaseCommand, CommandError
+from wld.dictionary.fulltext import fulltext_rebuild, fulltext_supported
+
+class Command(BaseCommand):
+
+    help = 'rebuild the full-text (FTS5) search index, e.g. after loading fixtures'
+    args = ''
+
+    def handle(self, *args, **options):
+
+        if not fulltext_supported():
+            raise CommandError("The full-text index is only available for SQLite databases")
+        if not fulltext_rebuild():
+            raise CommandError("Could not rebuild the full-text index")
+        self.stdout.write("The full-text index has been rebuilt")
@@ -0,0 +1,24 @@
+"""Link the dialects without a coordinate to their coordinate, using the kloeke code and the place name"""
+
+from django.core.management.base import BaseCommand, CommandError
+from wld.dictionary.models import Generation, Dialect
+from wld.dictionary.fulltext import fulltext_rebuild
+
+class Command(BaseCommand):
+
+    help = 'link all dialects that have no coordinate yet to the coordinate with the same place name and kloeke prefix, and list the ones that remain unresolved'
+    args = ''
+
+    def handle(self, *args, **options):
+
+        oResult = Dialect.match_coordinates()
+        if oResult == None:
+            raise CommandError("Could not match the dialects to the coordinates")
+        if oResult['matched'] > 0:
+            # The kloeke codes and place names have changed (match_coordinates has adapted the search rows)
+            fulltext_rebuild()
+            Generation.data_changed()
+        self.stdout.write("Matched dialects: {}".format(oResult['matched']))
+        self.stdout.write("Unresolved dialects: {}".format(len(oResult['unresolved'])))
+        for dialect in oResult['unresolved']:
+            self.stdout.write("  {}\t{}".format(dialect.nieuw, dialect.stad))
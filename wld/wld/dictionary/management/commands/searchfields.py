@@ -0,0 +1,27 @@
+"""Fill the search fields ('_lower', '_rev', '_fold') that are used for wildcard searching"""
+
+from django.core.management.base import BaseCommand, CommandError
+from wld.dictionary.models import Generation, Aflevering, Entry
+from wld.dictionary.wildcard import wildcard_refresh
+from wld.dictionary.entrysearch import entrysearch_update
+from wld.dictionary.columnar import columnar_build
+
+class Command(BaseCommand):
+
+    help = 'fill the lower-case, reversed and accent-free search fields of Entry, Lemma, Trefwoord and Dialect, the mijnen of Entry, the sort keys of Aflevering, the visibility of Entry, the EntrySearch rows and the snapshot of the columnar index, e.g. after loading fixtures (this also invalidates cached search results)'
+    args = ''
+
+    def handle(self, *args, **options):
+
+        if not wildcard_refresh():
+            raise CommandError("Could not fill the search fields")
+        # The sort keys of the afleveringen and the visibility of the entries are not filled by loading fixtures either
+        Aflevering.update_sortkeys()
+        Entry.update_toonbaar()
+        # The flattened search rows are made from all of these
+        entrysearch_update()
+        # Loading fixtures changes the data: cached search results are no longer valid
+        Generation.data_changed()
+        # Write the snapshot of the columnar index for the new data (if NumPy is available)
+        columnar_build()
+        self.stdout.write("The search fields have been filled")
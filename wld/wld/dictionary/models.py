@@ -7,11 +7,17 @@ The dialects are identified by locations, and the locations are indicated by a '
 """
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import transaction
+from django.db import transaction, connection
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q, F, Func, Lookup, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal
+from django.utils import timezone
 from datetime import datetime
 import time
+import unicodedata
 from wld.settings import APP_PREFIX, MEDIA_ROOT
 from wld.utils import *
 import os, os.path
@@ -25,12 +31,18 @@ import copy
 
 MAX_IDENTIFIER_LEN = 10
 MAX_LEMMA_LEN = 100
+# Mijnen with an id up to this number have a bit of their own in a bitmask of mijnen
+MAX_MIJN_BITS = 63
 # oCsvImport = {'read': 0, 'skipped': 0, 'status': 'idle', 'method': 'none'}
 
 
 # ============================= LOCAL CLASSES ======================================
 errHandle = ErrHandle()
 
+# Sent when the entries in [qs] have changed in a way the save signals do not show (e.g. bulk updates)
+#    The derived tables (see entrysearch.py) and the prebuilt exports (see artifacts.py) listen to it
+entries_changed = Signal(providing_args=["qs"])
+
 class FieldChoice(models.Model):
 
     field = models.CharField(max_length=50)
@@ -48,6 +60,45 @@ class FieldChoice(models.Model):
 def get_now_time():
     return time.process_time()
 
+def get_search_key(sValue):
+    """Get the lower-case version of [sValue], as stored in the '_lower' search fields"""
+    return None if sValue == None else sValue.lower()
+
+def get_search_key_rev(sValue):
+    """Get the reversed lower-case version of [sValue], used for suffix searching"""
+    return None if sValue == None else sValue.lower()[::-1]
+
+def get_search_key_fold(sValue):
+    """Get the case-folded version of [sValue] without diacritics, as stored in the '_fold' search fields"""
+    if sValue == None:
+        return None
+    sValue = unicodedata.normalize("NFKD", sValue.casefold())
+    return unicodedata.normalize("NFC", "".join([c for c in sValue if not unicodedata.combining(c)]))
+
+def get_text_changed(instance, lField, update_fields = None):
+    """Check if saving [instance] changes one of the fields in [lField] (e.g. the texts of the full-text index)"""
+
+    # Only the fields in [update_fields] are saved
+    if update_fields != None and len(set(lField) & set(update_fields)) == 0:
+        return False
+    # A new object has not been stored yet
+    if instance.pk == None:
+        return True
+    lAttr = [instance._meta.get_field(sField).attname for sField in lField]
+    oOrig = instance.__class__.objects.filter(pk=instance.pk).values(*lAttr).first()
+    return oOrig == None or any([oOrig[sAttr] != getattr(instance, sAttr) for sAttr in lAttr])
+
+@models.BigIntegerField.register_lookup
+class HasBits(Lookup):
+    """Check if any of the bits of the right-hand side is set in the (bitmask) field"""
+
+    lookup_name = 'hasbits'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return "({} & {}) != 0".format(lhs, rhs), lhs_params + rhs_params
+
 def build_choice_list(field):
     """Create a list of choice-tuples"""
 
@@ -59,8 +110,10 @@ def build_choice_list(field):
             # Take a default list
             choice_list = [('0','-'),('1','N/A')]
         else:
-            for choice in FieldChoice.objects.filter(field__iexact=field):
-                choice_list.append((str(choice.machine_value),choice.english_name));
+            # The choices are cached (imported here, since refdata uses this module)
+            from wld.dictionary.refdata import get_choice_list
+            for choice in get_choice_list(field):
+                choice_list.append(choice);
 
             choice_list = sorted(choice_list,key=lambda x: x[1]);
     except:
@@ -294,10 +347,11 @@ def get_help(field):
     # find the correct instance in the database
     help_text = ""
     try:
-        entry_list = HelpChoice.objects.filter(field__iexact=field)
-        entry = entry_list[0]
-        # Note: only take the first actual instance!!
-        help_text = entry.Text()
+        # The help texts are cached (imported here, since refdata uses this module)
+        from wld.dictionary.refdata import get_help_text
+        help_text = get_help_text(field)
+        if help_text == None:
+            help_text = "Sorry, no help available for " + field
     except:
         help_text = "Sorry, no help available for " + field
 
@@ -423,6 +477,10 @@ class Lemma(models.Model):
     """Lemma"""
 
     gloss = models.CharField("Gloss voor dit lemma", db_index=True, blank=False, max_length=MAX_LEMMA_LEN, default="(unknown)")
+    # Lower-case, reversed lower-case and accent-free copies of [gloss] for searching (see wildcard.py)
+    gloss_lower = models.CharField("Gloss (kleine letters)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    gloss_rev = models.CharField("Gloss (omgekeerd)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    gloss_fold = models.CharField("Gloss (zonder accenten)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
     # toelichting = models.TextField("Omschrijving van het lemma", blank=True)
     # bronnenlijst = models.TextField("Bronnenlijst bij dit lemma", db_index=True, blank=True)
     # boek = models.TextField("Boekaanduiding", db_index=True, null=True,blank=True)
@@ -438,6 +496,16 @@ class Lemma(models.Model):
     def __str__(self):
         return self.gloss
 
+    def save(self, force_insert = False, force_update = False, using = None, update_fields = None):
+        # Keep the search fields in line with the gloss
+        self.gloss_lower = get_search_key(self.gloss)
+        self.gloss_rev = get_search_key_rev(self.gloss)
+        self.gloss_fold = get_search_key_fold(self.gloss)
+        response = super(Lemma, self).save(force_insert, force_update, using, update_fields)
+        # The sort key of the entries follows the gloss
+        Entry.objects.filter(lemma=self).exclude(lemma_key=self.gloss_lower).update(lemma_key=self.gloss_lower)
+        return response
+
     def get_pk(self):
         """Check if this lemma exists and return a PK"""
         qs = Lemma.objects.filter(gloss__iexact=self['gloss'])
@@ -507,7 +575,7 @@ class Lemma(models.Model):
                     lemma.toonbaar = True
                     lemma.save()
         # Get a list of all lemma's that are NOT toonbaar
-        lemma_show = Lemma.objects.filter(entry__aflevering__toonbaar=1).distinct()
+        lemma_show = Lemma.objects.filter(Entry.get_toonbaar_filter("entry__")).distinct()
         lemma_hide = Lemma.objects.exclude(Q(id__in=lemma_show))
         with transaction.atomic():
             for lemma in lemma_hide:
@@ -620,6 +688,13 @@ class Dialect(models.Model):
     code = models.CharField("Plaatscode (Kloeke)", blank=False, max_length=6, default="xxxxxx")
     # [1] The 'new' Kloeke code
     nieuw = models.CharField("Plaatscode (Nieuwe Kloeke)", db_index=True, blank=False, max_length=6, default="xxxxxx")
+    # [0-1] Lower-case and reversed lower-case copies of [stad] and [nieuw] for searching (see wildcard.py)
+    #       as well as a copy of [stad] without case and accents
+    stad_lower = models.CharField("Dialectlocatie (kleine letters)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    stad_rev = models.CharField("Dialectlocatie (omgekeerd)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    stad_fold = models.CharField("Dialectlocatie (zonder accenten)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    nieuw_lower = models.CharField("Plaatscode (kleine letters)", db_index=True, null=True, blank=True, max_length=6)
+    nieuw_rev = models.CharField("Plaatscode (omgekeerd)", db_index=True, null=True, blank=True, max_length=6)
     # [1] The area
     streek = models.CharField("Streek", db_index=True, blank=False, max_length=MAX_LEMMA_LEN, default="(unknown)")
 
@@ -640,6 +715,18 @@ class Dialect(models.Model):
     def __str__(self):
         return self.nieuw
 
+    def save(self, force_insert = False, force_update = False, using = None, update_fields = None):
+        # Keep the search fields in line with the place name and the code
+        self.stad_lower = get_search_key(self.stad)
+        self.stad_rev = get_search_key_rev(self.stad)
+        self.stad_fold = get_search_key_fold(self.stad)
+        self.nieuw_lower = get_search_key(self.nieuw)
+        self.nieuw_rev = get_search_key_rev(self.nieuw)
+        response = super(Dialect, self).save(force_insert, force_update, using, update_fields)
+        # The sort key of the entries follows the place name
+        Entry.objects.filter(dialect=self).exclude(dialect_key=self.stad_lower).update(dialect_key=self.stad_lower)
+        return response
+
     def get_pk(self):
         """Check if this dialect exists and return a PK"""
         qs = Dialect.objects.filter(stad__iexact=self['stad'], 
@@ -690,7 +777,7 @@ class Dialect(models.Model):
                     inst.toonbaar = True
                     inst.save()
         # Get a list of all inst's that are NOT toonbaar
-        dialect_show = Dialect.objects.filter(entry__aflevering__toonbaar=1).distinct()
+        dialect_show = Dialect.objects.filter(Entry.get_toonbaar_filter("entry__")).distinct()
         dialect_hide = Dialect.objects.exclude(Q(id__in=dialect_show))
         with transaction.atomic():
             for inst in dialect_hide:
@@ -699,11 +786,75 @@ class Dialect(models.Model):
         # Return positively
         return True
 
+    def match_coordinates():
+        """Link all dialects without a coordinate to the coordinate with the same place and kloeke prefix
+
+        The coordinates are read once into an index on the (lower-case) place name.
+        A dialect matches the first coordinate of its place whose kloeke code starts
+        with the first four characters of the dialect's code; a place name with a
+        hyphen is also tried with a space instead. Matched dialects take over the
+        kloeke code and place name of the coordinate, and are saved in bulk.
+        Returns a dictionary with the number of matched dialects and the list of unresolved ones.
+        """
+
+        oErr = ErrHandle()
+        oBack = {'matched': 0, 'unresolved': []}
+        try:
+            # Index of the coordinates on place name
+            dPlace = {}
+            for coordinate in Coordinate.objects.all().order_by('id'):
+                dPlace.setdefault(coordinate.place.lower(), []).append(coordinate)
+
+            def find(stad, kloeke_truncated):
+                for coordinate in dPlace.get(stad.lower(), []):
+                    if coordinate.kloeke.startswith(kloeke_truncated):
+                        return coordinate
+                return None
+
+            lChanged = []
+            for dialect in Dialect.objects.filter(coordinate__isnull=True).order_by('id'):
+                # Get the kloekecode minus the last letter and the place-name
+                kloeke_truncated = dialect.nieuw[0:4]
+                stad = dialect.stad
+                coordinate = find(stad, kloeke_truncated)
+                if coordinate == None and "-" in stad:
+                    stad = stad.replace("-", " ")
+                    coordinate = find(stad, kloeke_truncated)
+                if coordinate == None:
+                    oBack['unresolved'].append(dialect)
+                else:
+                    # Adapt the kloeke code, the coordinate and the place name, as well as the search fields
+                    dialect.nieuw = coordinate.kloeke
+                    dialect.coordinate = coordinate
+                    dialect.stad = stad
+                    dialect.stad_lower = get_search_key(dialect.stad)
+                    dialect.stad_rev = get_search_key_rev(dialect.stad)
+                    dialect.stad_fold = get_search_key_fold(dialect.stad)
+                    dialect.nieuw_lower = get_search_key(dialect.nieuw)
+                    dialect.nieuw_rev = get_search_key_rev(dialect.nieuw)
+                    lChanged.append(dialect)
+            with transaction.atomic():
+                Dialect.objects.bulk_update(lChanged, ['nieuw', 'coordinate', 'stad', 'stad_lower', 'stad_rev',
+                                                       'stad_fold', 'nieuw_lower', 'nieuw_rev'], batch_size=500)
+            # The place names may have changed: so may the sort keys and the search rows of their entries
+            if len(lChanged) > 0:
+                Entry.update_sortkeys(Entry.objects.filter(dialect__in=lChanged))
+                entries_changed.send(sender=Dialect, qs=Entry.objects.filter(dialect__in=lChanged))
+            oBack['matched'] = len(lChanged)
+        except:
+            oErr.DoError("Dialect/match_coordinates")
+            return None
+        return oBack
+
 
 class Trefwoord(models.Model):
     """Trefwoord"""
 
     woord = models.CharField("Trefwoord", db_index=True, blank=False, max_length=MAX_LEMMA_LEN, default="(unknown)")
+    # Lower-case, reversed lower-case and accent-free copies of [woord] for searching (see wildcard.py)
+    woord_lower = models.CharField("Trefwoord (kleine letters)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    woord_rev = models.CharField("Trefwoord (omgekeerd)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    woord_fold = models.CharField("Trefwoord (zonder accenten)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
     toelichting = models.TextField("Toelichting bij trefwoord", blank=True)
     # A field that indicates this item may be showed
     toonbaar = models.BooleanField("Mag getoond worden", blank=False, default=True)
@@ -715,6 +866,16 @@ class Trefwoord(models.Model):
     def __str__(self):
         return self.woord
 
+    def save(self, force_insert = False, force_update = False, using = None, update_fields = None):
+        # Keep the search fields in line with the woord
+        self.woord_lower = get_search_key(self.woord)
+        self.woord_rev = get_search_key_rev(self.woord)
+        self.woord_fold = get_search_key_fold(self.woord)
+        response = super(Trefwoord, self).save(force_insert, force_update, using, update_fields)
+        # The sort key of the entries follows the woord
+        Entry.objects.filter(trefwoord=self).exclude(trefwoord_key=self.woord_lower).update(trefwoord_key=self.woord_lower)
+        return response
+
     def get_pk(self):
         """Check if this dialect exists and return a PK"""
         qs = Trefwoord.objects.filter(woord__iexact=self['woord'])
@@ -773,7 +934,7 @@ class Trefwoord(models.Model):
                     inst.toonbaar = True
                     inst.save()
         # Get a list of all inst's that are NOT toonbaar
-        trefwoord_show = Trefwoord.objects.filter(entry__aflevering__toonbaar=1).distinct()
+        trefwoord_show = Trefwoord.objects.filter(Entry.get_toonbaar_filter("entry__")).distinct()
         trefwoord_hide = Trefwoord.objects.exclude(Q(id__in=trefwoord_show))
         with transaction.atomic():
             for inst in trefwoord_hide:
@@ -873,6 +1034,108 @@ class Repair(models.Model):
         self.save()
 
 
+class Generation(models.Model):
+    """Generation of the dictionary data: raised whenever the data change
+
+    Cached search results (see paging.py) are only valid for the generation they were made in.
+    """
+
+    # The name of this counter
+    name = models.CharField("Naam", blank=False, unique=True, max_length=MAX_LEMMA_LEN, default="data")
+    # The current generation number
+    number = models.IntegerField("Generatie", blank=False, default=0)
+    # When the number was raised for the last time
+    saved = models.DateTimeField("Gewijzigd", auto_now=True)
+
+    def __str__(self):
+        return "{}: {}".format(self.name, self.number)
+
+    def get_number(name = "data"):
+        """Get the current generation number, or None if it is not available"""
+
+        try:
+            obj = Generation.objects.filter(name=name).first()
+            iNumber = 0 if obj == None else obj.number
+        except:
+            errHandle.DoError("Generation/get_number")
+            iNumber = None
+        return iNumber
+
+    def bump(name = "data"):
+        """Raise the generation number"""
+
+        try:
+            with transaction.atomic():
+                obj, bCreated = Generation.objects.get_or_create(name=name)
+                obj.number = models.F('number') + 1
+                obj.save()
+        except:
+            errHandle.DoError("Generation/bump")
+        return True
+
+    def get_stamp(name = "data"):
+        """Get the current generation number and the time it was raised, or None if it is not available
+
+        The time is None if the number has never been raised.
+        """
+
+        try:
+            obj = Generation.objects.filter(name=name).first()
+            oStamp = (0, None) if obj == None else (obj.number, obj.saved)
+        except:
+            errHandle.DoError("Generation/get_stamp")
+            oStamp = None
+        return oStamp
+
+    def get_filled_name(sMarker):
+        """Get the name of the counter that marks that the derived column(s) [sMarker] have been filled for all rows"""
+        return "filled_{}".format(sMarker)
+
+    def set_filled(sMarker, bFilled = True):
+        """Set (or clear) the marker of the derived column(s) [sMarker]"""
+
+        if bFilled:
+            return Generation.bump(Generation.get_filled_name(sMarker))
+        try:
+            Generation.objects.filter(name=Generation.get_filled_name(sMarker)).delete()
+        except:
+            errHandle.DoError("Generation/set_filled")
+        return True
+
+    def get_filled(lMarker):
+        """Get the set of the markers in [lMarker] that have been set (using the unique index on 'name')"""
+
+        try:
+            dName = {Generation.get_filled_name(sMarker): sMarker for sMarker in lMarker}
+            lName = Generation.objects.filter(name__in=list(dName.keys())).values_list('name', flat=True)
+            oFilled = set([dName[sName] for sName in lName])
+        except:
+            errHandle.DoError("Generation/get_filled")
+            oFilled = set()
+        return oFilled
+
+    def get_afl_name(afl_id):
+        """Get the name of the generation counter of aflevering [afl_id]"""
+        return "afl{}".format(afl_id)
+
+    def data_changed(afl_id = None):
+        """Raise the data generation, as well as that of aflevering [afl_id], or those of all afleveringen"""
+
+        Generation.bump()
+        if afl_id != None:
+            Generation.bump(Generation.get_afl_name(afl_id))
+        else:
+            try:
+                with transaction.atomic():
+                    lName = [Generation.get_afl_name(id) for id in Aflevering.objects.values_list('id', flat=True)]
+                    lExist = Generation.objects.filter(name__in=lName).values_list('name', flat=True)
+                    Generation.objects.bulk_create([Generation(name=sName) for sName in set(lName) - set(lExist)])
+                    Generation.objects.filter(name__in=lName).update(number=models.F('number') + 1, saved=timezone.now())
+            except:
+                errHandle.DoError("Generation/data_changed")
+        return True
+
+
 class Aflevering(models.Model):
     """Aflevering van een woordenboek"""
 
@@ -900,6 +1163,10 @@ class Aflevering(models.Model):
     plaats = models.CharField("Plaats van publicatie", blank=False, max_length=MAX_LEMMA_LEN, default="(unknown)")
     # Any additional information
     toelichting = models.TextField("Toelichting bij aflevering", blank=True)
+    # Numerical sort key, following deel, sectie and aflnum (see get_sortkey)
+    sortkey = models.IntegerField("Sorteervolgorde", db_index=True, blank=True, null=True)
+    # The summary (e.g. 'III-1-2'), as calculated by calc_summary()
+    summary = models.CharField("Samenvatting", blank=True, max_length=MAX_LEMMA_LEN, default="")
 
     class Meta:
         verbose_name_plural = "Afleveringen"
@@ -912,13 +1179,22 @@ class Aflevering(models.Model):
         # Get the original
         orig = Aflevering.objects.get(pk=self.pk)
         bToonbaarChanged = (self.toonbaar != orig.toonbaar)
+        # Keep the sort key and the summary in line with deel, sectie and aflnum
+        self.sortkey = self.get_sortkey()
+        self.summary = self.calc_summary()
         result = super(Aflevering, self).save(force_insert, force_update, using, update_fields)
         # Action if Toonbaar has changed
         if bToonbaarChanged:
+            # Adapt the entries of this aflevering
+            Entry.update_toonbaar(self)
             # Adapt Lemma, Trefwoord and Dialect instances
             Lemma.change_toonbaar()
             Trefwoord.change_toonbaar()
             Dialect.change_toonbaar()
+            # Search results that have been cached are no longer valid
+            Generation.data_changed(self.id)
+            # The search rows and the prebuilt exports of the entries are made again
+            entries_changed.send(sender=Aflevering, qs=Entry.objects.filter(aflevering=self))
         return result
 
     def get_number(self):
@@ -928,13 +1204,39 @@ class Aflevering(models.Model):
             iNumber = self.sectie * 10 + self.aflnum
         return iNumber
 
-    def get_summary(self):
+    def get_sortkey(self):
+        """Numerical sort key: deel first, then sectie (if any), then aflnum"""
+        iSectie = 0 if self.sectie == None else self.sectie
+        return self.deel.nummer * 1000000 + iSectie * 1000 + self.aflnum
+
+    def calc_summary(self):
         sSum = int_to_roman(self.deel.nummer) + "-"
         if self.sectie != None:
             sSum += str(self.sectie) + "-"
         sSum += str(self.aflnum)
         return sSum
 
+    def get_summary(self):
+        # Use the stored summary, if it is there
+        if self.summary != None and self.summary != "":
+            return self.summary
+        return self.calc_summary()
+
+    def update_sortkeys():
+        """Fill the sort keys and the summaries of all afleveringen (e.g. after loading fixtures)"""
+
+        with transaction.atomic():
+            for afl in Aflevering.objects.select_related('deel'):
+                sortkey = afl.get_sortkey()
+                summary = afl.calc_summary()
+                if afl.sortkey != sortkey or afl.summary != summary:
+                    # Don't use save(): that would also check 'toonbaar'
+                    Aflevering.objects.filter(id=afl.id).update(sortkey=sortkey, summary=summary)
+        # The cached afleveringen are no longer valid
+        reference_changed(Aflevering)
+        # Return positively
+        return True
+
     def get_pdf(self):
         # sPdf =  "{}/static/dictionary/content/pdf{}/{}".format(APP_PREFIX, self.deel.nummer,self.naam)
         sPdf =  "wld-{}/{}".format(self.deel.nummer,self.naam)
@@ -996,6 +1298,30 @@ class Mijn(models.Model):
     def __str__(self):
         return self.naam
 
+    def get_mask(id):
+        """Get the bit of mijn [id] in a bitmask of mijnen, or None if it has no bit of its own"""
+
+        if id >= 1 and id <= MAX_MIJN_BITS:
+            return 1 << (id - 1)
+        return None
+
+    def get_mijnen(lId):
+        """Get the bitmask of the mijnen with the ids in [lId]"""
+
+        iMijnen = 0
+        for id in lId:
+            iMask = Mijn.get_mask(id)
+            if iMask != None:
+                iMijnen |= iMask
+        return iMijnen
+
+    def get_mijnen_sql(sEntryId):
+        """Get the SQL expression calculating the bitmask of the mijnen of entry [sEntryId] from EntryMijn"""
+
+        # Each mijn adds its own bit once; mijnen without a bit are left out
+        return "(SELECT COALESCE(SUM(DISTINCT 1 << (m.mijn_id - 1)), 0) FROM dictionary_entrymijn m " \
+               "WHERE m.entry_id = {} AND m.mijn_id BETWEEN 1 AND {})".format(sEntryId, MAX_MIJN_BITS)
+
     def get_pk(self):
         """Check if this [mijn] exists and return a PK"""
         qs = Mijn.objects.filter(naam__iexact=self['naam'])
@@ -1047,6 +1373,14 @@ class Entry(models.Model):
         index_together = [
             ["dialect", "lemma", "trefwoord", "woord"],
             ["lemma", "aflevering"],
+            ["toonbaar", "lemma"],
+            ["toonbaar", "trefwoord"],
+            ["toonbaar", "dialect"],
+            ["toonbaar", "aflevering"],
+            # The orderings of the lemma, trefwoord and location lists
+            ["toonbaar", "lemma_key", "trefwoord_key", "toelichting_key", "woord_lower", "dialect_key"],
+            ["toonbaar", "trefwoord_key", "lemma_key", "toelichting_key", "woord_lower", "dialect_key"],
+            ["toonbaar", "dialect_key", "lemma_key", "trefwoord_key", "toelichting_key", "woord_lower"],
           ]
 
     def __str__(self):
@@ -1068,10 +1402,86 @@ class Entry(models.Model):
     aflevering = models.ForeignKey(Aflevering, db_index=True, blank=False, on_delete=models.CASCADE)
     # Dialectal entry: obligatory
     woord = models.CharField("Dialectopgave", db_index=True, blank=False, max_length=MAX_LEMMA_LEN, default="(unknown)")
+    # Lower-case, reversed lower-case and accent-free copies of [woord] for searching (see wildcard.py)
+    woord_lower = models.CharField("Dialectopgave (kleine letters)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    woord_rev = models.CharField("Dialectopgave (omgekeerd)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    woord_fold = models.CharField("Dialectopgave (zonder accenten)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
     # Notes to this entry: optional
     toelichting = models.TextField("Toelichting", db_index=True, blank=True)
     # See WLD issue #22
     kloeketoelichting = models.TextField("Toelichting bij dialectopgave voor een bepaalde kloekelocatie", blank=True)
+    # Copy of aflevering.toonbaar, so that the lists need not join the aflevering (see update_toonbaar)
+    #    As long as it has not been filled, the aflevering itself is used (see toonbaar_filter)
+    toonbaar = models.BooleanField("Mag getoond worden", null=True, blank=True)
+    # Lower-case copies of the texts the lists are ordered on, so that they can use an index (see update_sortkeys)
+    lemma_key = models.CharField("Begrip (sorteersleutel)", null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    trefwoord_key = models.CharField("Trefwoord (sorteersleutel)", null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    dialect_key = models.CharField("Dialectlocatie (sorteersleutel)", null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    toelichting_key = models.TextField("Toelichting (sorteersleutel)", null=True, blank=True)
+    # Bitmask of the mijnen in [mijnlijst], so that filtering on a mijn needs no join (see Mijn.get_mask)
+    #    EntryMijn remains the source: it keeps this copy in line
+    mijnen = models.BigIntegerField("Mijnen", null=True, blank=True)
+
+    def save(self, force_insert = False, force_update = False, using = None, update_fields = None):
+        # Keep the search fields in line with the woord
+        self.woord_lower = get_search_key(self.woord)
+        self.woord_rev = get_search_key_rev(self.woord)
+        self.woord_fold = get_search_key_fold(self.woord)
+        # Keep the sort keys in line with the texts
+        self.lemma_key = get_search_key(self.lemma.gloss)
+        self.trefwoord_key = get_search_key(self.trefwoord.woord)
+        self.dialect_key = get_search_key(self.dialect.stad)
+        self.toelichting_key = get_search_key(self.toelichting)
+        # Keep the visibility in line with the aflevering
+        self.toonbaar = self.aflevering.toonbaar
+        # A new entry has no mijnen yet
+        if self.mijnen == None:
+            self.mijnen = 0 if self.pk == None else Mijn.get_mijnen(self.mijnlijst.values_list('id', flat=True))
+        response = super(Entry, self).save(force_insert, force_update, using, update_fields)
+        return response
+
+    def get_toonbaar_filter(path=""):
+        """Get a Q-filter on the visible entries (at [path]), whether or not their 'toonbaar' has been filled"""
+
+        return Q(**{"{}toonbaar".format(path): True}) | \
+               Q(**{"{}toonbaar__isnull".format(path): True, "{}aflevering__toonbaar".format(path): True})
+
+    def update_toonbaar(afl = None):
+        """Copy the 'toonbaar' status of aflevering [afl] (or of all afleveringen) to its entries"""
+
+        lAfl = Aflevering.objects.all() if afl == None else [afl]
+        with transaction.atomic():
+            for afl in lAfl:
+                Entry.objects.filter(aflevering=afl).exclude(toonbaar=afl.toonbaar).update(toonbaar=afl.toonbaar)
+        return True
+
+    def update_sortkeys(qs = None):
+        """Fill the sort keys of the entries in [qs] (or of all entries) from the '_lower' search fields"""
+
+        if qs == None:
+            qs = Entry.objects.all()
+        if connection.vendor == "sqlite":
+            # SQLite's own LOWER() only handles ASCII: use Python's version instead
+            connection.ensure_connection()
+            connection.connection.create_function("wld_search_key", 1, get_search_key)
+            toelichting_key = Func(F('toelichting'), function="wld_search_key", output_field=models.TextField())
+        else:
+            toelichting_key = Lower('toelichting')
+        with transaction.atomic():
+            qs.update(lemma_key=Subquery(Lemma.objects.filter(id=OuterRef('lemma_id')).values('gloss_lower')[:1]),
+                      trefwoord_key=Subquery(Trefwoord.objects.filter(id=OuterRef('trefwoord_id')).values('woord_lower')[:1]),
+                      dialect_key=Subquery(Dialect.objects.filter(id=OuterRef('dialect_id')).values('stad_lower')[:1]),
+                      toelichting_key=toelichting_key)
+        return True
+
+    def update_mijnen(qs = None):
+        """Fill the bitmask of mijnen of the entries in [qs] (or of all entries) from EntryMijn"""
+
+        if qs == None:
+            qs = Entry.objects.all()
+        with transaction.atomic():
+            qs.update(mijnen=RawSQL(Mijn.get_mijnen_sql("{}.id".format(Entry._meta.db_table)), []))
+        return True
 
     def get_trefwoord_woord(self):
         return self.trefwoord.woord + '_' + self.woord
@@ -1081,8 +1491,8 @@ class Entry(models.Model):
 
     def dialectopgave(self):
         sWoord = "*"
-        # Are we allowed to show it?
-        if self.aflevering.toonbaar:
+        # Are we allowed to show it? (the visibility may not have been filled yet)
+        if self.aflevering.toonbaar if self.toonbaar == None else self.toonbaar:
             sWoord = self.woord
         return sWoord
 
@@ -1197,6 +1607,18 @@ class EntryMijn(models.Model):
     entry=models.ForeignKey(Entry, db_index=True, on_delete=models.CASCADE)
     mijn=models.ForeignKey(Mijn, db_index=True, on_delete=models.CASCADE)
 
+    def save(self, force_insert = False, force_update = False, using = None, update_fields = None):
+        result = super(EntryMijn, self).save(force_insert, force_update, using, update_fields)
+        # Keep the bitmask of the entry in line
+        Entry.update_mijnen(Entry.objects.filter(id=self.entry_id))
+        return result
+
+    def delete(self, using = None, keep_parents = False):
+        entry_id = self.entry_id
+        result = super(EntryMijn, self).delete(using, keep_parents)
+        Entry.update_mijnen(Entry.objects.filter(id=entry_id))
+        return result
+
     def get_item(self, bSet):
         # Get the parameters
         entry = self['entry']
@@ -1220,6 +1642,59 @@ class EntryMijn(models.Model):
 
         # Return the result
         return iPk
+
+
+class EntrySearch(models.Model):
+    """One visible entry with the texts of its lemma, trefwoord, dialect and aflevering (see entrysearch.py)
+
+    This is a copy that is read instead of joining Entry with these tables.
+    The [id] is the id of the entry.
+    """
+
+    id = models.IntegerField("Id van de entry", primary_key=True)
+    entry = models.OneToOneField(Entry, on_delete=models.CASCADE, related_name="searchrow")
+    # The objects the entry belongs to (filtering on their id needs no join)
+    lemma = models.ForeignKey(Lemma, db_index=True, on_delete=models.CASCADE, related_name="searchrows")
+    trefwoord = models.ForeignKey(Trefwoord, db_index=True, on_delete=models.CASCADE, related_name="searchrows")
+    dialect = models.ForeignKey(Dialect, db_index=True, on_delete=models.CASCADE, related_name="searchrows")
+    aflevering = models.ForeignKey(Aflevering, db_index=True, on_delete=models.CASCADE, related_name="searchrows")
+    # The texts, with their search fields (see wildcard.py)
+    woord = models.CharField("Dialectopgave", max_length=MAX_LEMMA_LEN)
+    woord_lower = models.CharField("Dialectopgave (kleine letters)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    woord_rev = models.CharField("Dialectopgave (omgekeerd)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    woord_fold = models.CharField("Dialectopgave (zonder accenten)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    toelichting = models.TextField("Toelichting", blank=True)
+    toelichting_key = models.TextField("Toelichting (kleine letters)", null=True, blank=True)
+    gloss = models.CharField("Gloss", max_length=MAX_LEMMA_LEN)
+    gloss_lower = models.CharField("Gloss (kleine letters)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    gloss_rev = models.CharField("Gloss (omgekeerd)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    gloss_fold = models.CharField("Gloss (zonder accenten)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    trefwoord_woord = models.CharField("Trefwoord", max_length=MAX_LEMMA_LEN)
+    trefwoord_key = models.CharField("Trefwoord (kleine letters)", null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    trefwoord_fold = models.CharField("Trefwoord (zonder accenten)", null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    stad = models.CharField("Dialectlocatie", max_length=MAX_LEMMA_LEN)
+    stad_lower = models.CharField("Dialectlocatie (kleine letters)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    stad_rev = models.CharField("Dialectlocatie (omgekeerd)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    stad_fold = models.CharField("Dialectlocatie (zonder accenten)", db_index=True, null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    nieuw = models.CharField("Plaatscode (Nieuwe Kloeke)", max_length=6)
+    nieuw_lower = models.CharField("Plaatscode (kleine letters)", db_index=True, null=True, blank=True, max_length=6)
+    nieuw_rev = models.CharField("Plaatscode (omgekeerd)", db_index=True, null=True, blank=True, max_length=6)
+    bronnenlijst = models.TextField("Bronnenlijst", blank=True)
+    # The aflevering: its name, summary and sort key
+    aflevering_naam = models.CharField("PDF naam", max_length=MAX_LEMMA_LEN)
+    aflevering_summary = models.CharField("Samenvatting", blank=True, max_length=MAX_LEMMA_LEN)
+    aflevering_key = models.IntegerField("Sorteervolgorde", db_index=True, blank=True, null=True)
+    # The coordinates of the dialect
+    point = models.CharField("Coordinates", null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    place = models.CharField("Place name", null=True, blank=True, max_length=MAX_LEMMA_LEN)
+    # The mijnen of the entry as a bitmask (see Mijn.get_mask)
+    mijnen = models.BigIntegerField("Mijnen", default=0)
+
+    class Meta:
+        verbose_name_plural = "Entry search rows"
+
+    def __str__(self):
+        return self.woord
     
 
 
@@ -1892,6 +2367,17 @@ def csv_to_fixture(csv_file, iDeel, iSectie, iAflevering, iStatus, bUseDbase=Fal
                                 errHandle.DoError("csv_to_fixture has a negative index", True)
                                 return oBack
 
+                            # Get the PKs of the mijnen of this entry: the entry gets their bitmask
+                            lPkMijn = []
+                            if bDoMijnen:
+                                for sMijn in lMijnen:
+                                    if bUseDbase and bUsdDbaseMijnen:
+                                        iPkMijn = Mijn.get_item({'naam': sMijn}, oTime)
+                                    else:
+                                        iPkMijn = oFix.get_pk(oMijn, "dictionary.mijn", True,
+                                                              naam=sMijn)
+                                    lPkMijn.append(iPkMijn)
+
                             # Process the ENTRY
                             sDialectWoord = oLine['dialectopgave_name']
                             # Make sure that I use my OWN continuous [pk] for Entry
@@ -1907,25 +2393,22 @@ def csv_to_fixture(csv_file, iDeel, iSectie, iAflevering, iStatus, bUseDbase=Fal
                                                    descr=iPkDescr,     # This is the Description that in principle is valid for the whole lemma, but not in practice
                                                    dialect=iPkDialect,
                                                    trefwoord=iPkTrefwoord,
-                                                   aflevering=iPkAflevering)
+                                                   aflevering=iPkAflevering,
+                                                   toonbaar=oAfl.toonbaar,
+                                                   mijnen=Mijn.get_mijnen(lPkMijn))
                             oTime['entry'] += get_now_time() - iStarttime
 
                             if bDoMijnen:
                                 if bUseDbase and bUsdDbaseMijnen:
                                     # Walk all the mijnen for this entry
-                                    for sMijn in lMijnen:
-                                        # Get the PK for this mijn
-                                        iPkMijn = Mijn.get_item({'naam': sMijn}, oTime)
+                                    for iPkMijn in lPkMijn:
                                         # Process the PK for EntryMijn
                                         iPkEntryMijn = EntryMijn.get_item({'entry': iPkEntry,
                                                                            'mijn': iPkMijn}, True)
 
                                 else:
                                     # Walk all the mijnen for this entry
-                                    for sMijn in lMijnen:
-                                        # Get the PK for this mijn
-                                        iPkMijn = oFix.get_pk(oMijn, "dictionary.mijn", True,
-                                                              naam=sMijn)
+                                    for iPkMijn in lPkMijn:
                                         # Process the PK for EntryMijn
                                         iPkEntryMijn = oFix.get_pk(oEntryMijn, "dictionary.entrymijn", False,
                                                                    pk=iPkEntryMijn,
@@ -2167,4 +2650,16 @@ def do_repair_entrydescr(oRepair):
         msg = oErr.get_error_message()
         oRepair.status = "Error: {}".format(msg)
         oRepair.save()
-        return False
\ No newline at end of file
+        return False
+
+
+def reference_changed(sender, **kwargs):
+    """One of the reference tables has been changed: the cached versions (see refdata.py) are no longer valid"""
+
+    from wld.dictionary.refdata import refdata_clear, REFDATA_GENERATION
+    refdata_clear()
+    Generation.bump(REFDATA_GENERATION)
+
+for cls in [Aflevering, Deel, Mijn, HelpChoice, FieldChoice]:
+    post_save.connect(reference_changed, sender=cls)
+    post_delete.connect(reference_changed, sender=cls)
@@ -0,0 +1,213 @@
+"""Search snapshots and keyset pagination for the paginated list views.
+
+A list view used to evaluate its complete (distinct) queryset on every page
+request, just to know the number of results. A search snapshot stores the
+ordered list of ids of the result once, under a key made of the view and its
+normalized filter parameters. Subsequent pages and the count are served by
+slicing this list. Snapshots expire after SNAPSHOT_SECONDS, and are no longer
+used as soon as the data generation (see models.Generation) has been raised.
+
+Keyset (seek) pagination is an alternative to the offset pages: the page
+token holds the sort key and id of the last (or first) item on the current
+page, and the next (or previous) page is fetched with a range condition on the
+indexed sort key. Fetching a page deep into the alphabet then costs the same
+as fetching the first one. The tokens are passed on as 'after' or 'before'.
+"""
+
+import base64
+import hashlib
+import json
+import math
+from django.core.cache import cache
+from django.db.models import Q
+from wld.dictionary.models import Generation
+from wld.utils import ErrHandle
+
+# Number of seconds a search snapshot is kept
+SNAPSHOT_SECONDS = 30 * 60
+
+# Parameters that do not influence the search result itself
+SNAPSHOT_SKIP = ['page', 'paginate_by', 'submit_type', 'csrfmiddlewaretoken', 'after', 'before']
+
+
+class SearchSnapshot():
+    """The ordered ids of a search result, behaving like a (paginatable) queryset"""
+
+    def __init__(self, queryset, id_list):
+        # The lazy queryset that produced the ids (used for exports)
+        self.queryset = queryset
+        self.model = queryset.model
+        self.id_list = id_list
+
+    def count(self):
+        return len(self.id_list)
+
+    def exists(self):
+        return len(self.id_list) > 0
+
+    def __len__(self):
+        return len(self.id_list)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return self.get_objects(self.id_list[k])
+        return self.get_objects([self.id_list[k]])[0]
+
+    def __iter__(self):
+        # Retrieve the objects in chunks
+        iSize = 500
+        for iStart in range(0, len(self.id_list), iSize):
+            for obj in self.get_objects(self.id_list[iStart:iStart+iSize]):
+                yield obj
+
+    def get_objects(self, id_list):
+        """Get the objects with the ids in [id_list], in this order"""
+
+        dObj = self.model.objects.in_bulk(id_list)
+        return [dObj[id] for id in id_list if id in dObj]
+
+
+def get_snapshot_key(sView, get):
+    """Make a cache key from view [sView] and the normalized filter parameters in [get]"""
+
+    lParam = []
+    for sKey in sorted(get.keys()):
+        if sKey not in SNAPSHOT_SKIP:
+            sValue = get.get(sKey, "").strip()
+            if sValue != "":
+                lParam.append("{}={}".format(sKey, sValue))
+    sParams = "&".join(lParam)
+    return "snapshot_{}_{}".format(sView, hashlib.md5(sParams.encode('utf-8')).hexdigest())
+
+def get_snapshot(sView, get, qs, get_ids=None):
+    """Get the search snapshot of queryset [qs] for the filter in [get]
+
+    The ids are taken from the cache if the same search has been done before in
+    the current generation of the data; otherwise they are taken from the
+    (optional) function [get_ids] of the generation, or [qs] is evaluated (ids only).
+    """
+
+    oErr = ErrHandle()
+    id_list = None
+    iGeneration = Generation.get_number()
+    sKey = get_snapshot_key(sView, get)
+    try:
+        if iGeneration != None:
+            oCached = cache.get(sKey)
+            if oCached != None and oCached['generation'] == iGeneration:
+                id_list = oCached['ids']
+    except:
+        oErr.DoError("get_snapshot")
+    if id_list == None:
+        if get_ids != None:
+            id_list = get_ids(iGeneration)
+        if id_list == None:
+            id_list = list(qs.values_list('id', flat=True))
+        if iGeneration != None:
+            cache.set(sKey, {'generation': iGeneration, 'ids': id_list}, SNAPSHOT_SECONDS)
+    return SearchSnapshot(qs, id_list)
+
+
+class KeysetPaginator():
+    """Minimal paginator information for a [KeysetPage]"""
+
+    def __init__(self, count, per_page):
+        self.count = count
+        self.per_page = per_page
+        self.num_pages = max(1, int(math.ceil(count / per_page))) if per_page > 0 else 1
+        self.page_range = range(1, self.num_pages + 1)
+
+
+class KeysetPage():
+    """One page of a keyset-paginated list, to be used like Django's Page"""
+
+    def __init__(self, object_list, number, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.bPrevious = has_previous
+        self.bNext = has_next
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, k):
+        return self.object_list[k]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.bNext
+
+    def has_previous(self):
+        return self.bPrevious
+
+    def has_other_pages(self):
+        return self.bNext or self.bPrevious
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def encode_token(key, id, number):
+    """Make a page token from the sort [key], the [id] and the page [number]"""
+
+    sToken = json.dumps([key, id, number])
+    return base64.urlsafe_b64encode(sToken.encode('utf-8')).decode('ascii')
+
+def decode_token(sToken):
+    """Get the sort key, the id and the page number from [sToken] (or None if it is invalid)"""
+
+    try:
+        key, id, number = json.loads(base64.urlsafe_b64decode(sToken.encode('ascii')).decode('utf-8'))
+        return key, int(id), int(number)
+    except:
+        return None
+
+def get_keyset_tokens(page_obj, field):
+    """Get the tokens for the next and the previous page of (any kind of) [page_obj]"""
+
+    sNext = None
+    sPrevious = None
+    lObject = list(page_obj.object_list)
+    if len(lObject) > 0:
+        if page_obj.has_next():
+            sNext = encode_token(getattr(lObject[-1], field), lObject[-1].id, page_obj.number)
+        if page_obj.has_previous():
+            sPrevious = encode_token(getattr(lObject[0], field), lObject[0].id, page_obj.number)
+    return sNext, sPrevious
+
+def get_keyset_page(qs, field, get, page_size, count):
+    """Get the page indicated by the 'after' or 'before' token in [get], or None if there is no token
+
+    [qs] must be ordered on ([field], id), and [count] is the total number of items.
+    """
+
+    page_size = int(page_size)
+    oAfter = decode_token(get.get('after', ''))
+    oBefore = decode_token(get.get('before', ''))
+    if oAfter != None:
+        key, id, number = oAfter
+        qs = qs.filter(Q(**{"{}__gt".format(field): key}) | Q(**{field: key, 'id__gt': id}))
+        lObject = list(qs.order_by(field, 'id')[:page_size + 1])
+        bNext = (len(lObject) > page_size)
+        lObject = lObject[:page_size]
+        bPrevious = True
+        number += 1
+    elif oBefore != None:
+        key, id, number = oBefore
+        qs = qs.filter(Q(**{"{}__lt".format(field): key}) | Q(**{field: key, 'id__lt': id}))
+        lObject = list(qs.order_by("-{}".format(field), '-id')[:page_size + 1])
+        bPrevious = (len(lObject) > page_size)
+        lObject = lObject[:page_size]
+        lObject.reverse()
+        bNext = True
+        number = max(1, number - 1)
+    else:
+        return None
+    oPaginator = KeysetPaginator(count, page_size)
+    return KeysetPage(lObject, number, oPaginator, bPrevious, bNext)
@@ -0,0 +1,98 @@
+"""Process-wide cache of the small reference tables.
+
+The list views show the afleveringen and the mijnen on every request, look up
+the chosen aflevering or mijn by id, and the help texts and field choices are
+read each time they are needed. These tables hardly ever change. They are kept
+in memory per process here, under the 'reference' Generation stamp: saving or
+deleting an Aflevering, Deel, Mijn, HelpChoice or FieldChoice (in the admin or
+while importing) raises the stamp, and the other processes notice that within
+REFDATA_CHECK_SECONDS.
+"""
+
+import time
+from wld.dictionary.models import Aflevering, Mijn, HelpChoice, FieldChoice, Generation
+from wld.utils import ErrHandle
+
+# The name of the Generation stamp of the reference data
+REFDATA_GENERATION = "reference"
+
+# Number of seconds during which the stamp is not checked again
+REFDATA_CHECK_SECONDS = 10
+
+# Process-local cache: the stamp it belongs to and the tables loaded so far
+refdata_status = {'checked': 0, 'number': None, 'tables': {}}
+
+
+def refdata_clear():
+    """Forget all cached reference tables of this process"""
+
+    refdata_status['tables'] = {}
+    refdata_status['checked'] = 0
+
+def refdata_get(sName, load):
+    """Get the cached reference table [sName], using function [load] to (re-)load it if needed"""
+
+    oErr = ErrHandle()
+    iNow = time.time()
+    if iNow - refdata_status['checked'] > REFDATA_CHECK_SECONDS:
+        iNumber = Generation.get_number(REFDATA_GENERATION)
+        if iNumber == None or iNumber != refdata_status['number']:
+            refdata_status['tables'] = {}
+        refdata_status['number'] = iNumber
+        refdata_status['checked'] = iNow
+    oTable = refdata_status['tables'].get(sName)
+    if oTable == None:
+        try:
+            oTable = load()
+        except:
+            oErr.DoError("refdata_get: could not load " + sName)
+            return load()
+        refdata_status['tables'][sName] = oTable
+    return oTable
+
+def get_afleveringen():
+    """Get the list of all afleveringen"""
+
+    return refdata_get("afleveringen", lambda: list(Aflevering.objects.select_related('deel').order_by('id')))
+
+def get_aflevering(id):
+    """Get the aflevering with [id], or None"""
+
+    dAfl = refdata_get("aflevering_ids", lambda: {afl.id: afl for afl in get_afleveringen()})
+    return dAfl.get(id)
+
+def get_mijnen():
+    """Get the list of all mijnen, sorted by name"""
+
+    return refdata_get("mijnen", lambda: list(Mijn.objects.all().order_by('naam')))
+
+def get_mijn(id):
+    """Get the mijn with [id], or None"""
+
+    dMijn = refdata_get("mijn_ids", lambda: {mijn.id: mijn for mijn in get_mijnen()})
+    return dMijn.get(id)
+
+def get_help_text(field):
+    """Get the help text for [field] (case-insensitive), or None if there is none"""
+
+    def load():
+        dHelp = {}
+        for entry in HelpChoice.objects.all().order_by('id'):
+            # Note: only take the first actual instance!!
+            sKey = entry.field.lower()
+            if sKey not in dHelp:
+                dHelp[sKey] = entry.Text()
+        return dHelp
+
+    return refdata_get("help", load).get(field.lower())
+
+def get_choice_list(field):
+    """Get the (machine_value, english_name) tuples of [field] (case-insensitive)"""
+
+    def load():
+        dChoice = {}
+        for choice in FieldChoice.objects.all():
+            dChoice.setdefault(choice.field.lower(), []).append((str(choice.machine_value), choice.english_name))
+        return dChoice
+
+    return refdata_get("choices", load).get(field.lower(), [])
@@ -8,6 +8,8 @@ $(document).ready(function () {
   // Initialize Bootstrap popover
   // Note: this is used when hovering over the question mark button
   $('[data-toggle="popover"]').popover();
+  // Suggestions for the search fields that have them
+  init_autocomplete();
 });
 
 var oProgressTimer = null;
@@ -39,6 +41,45 @@ function errMsg(sMsg, ex) {
 function errClear() {
   $("#" + loc_divErr).html("");
 }
+/**
+ * Goal: show suggestions for the inputs that have a [data-autocomplete] url
+ *
+ * @returns {bool}
+ */
+function init_autocomplete() {
+  try {
+    $("input[data-autocomplete]").each(function (idx, el) {
+      var sList = "autocomplete_" + $(el).attr("name");
+      var oTimer = null;
+      var sLast = "";
+
+      // Connect the input to a list of options
+      $(el).attr("list", sList).attr("autocomplete", "off");
+      $(el).after("<datalist id='" + sList + "'></datalist>");
+      $(el).on("input", function () {
+        var sValue = $(el).val();
+        // Wildcard patterns get no suggestions
+        if (sValue === sLast || /[*?\[#]/.test(sValue)) { return; }
+        sLast = sValue;
+        if (oTimer !== null) { clearTimeout(oTimer); }
+        oTimer = setTimeout(function () {
+          $.get($(el).attr("data-autocomplete"), { q: sValue }, function (response) {
+            var lHtml = [];
+            if (response.results === undefined) { return; }
+            for (var i = 0; i < response.results.length; i++) {
+              lHtml.push($("<option>").attr("value", response.results[i].value));
+            }
+            $("#" + sList).empty().append(lHtml);
+          });
+        }, 150);
+      });
+    });
+    return true;
+  } catch (ex) {
+    errMsg("init_autocomplete", ex);
+    return false;
+  }
+}
 /**
  * Goal: initiate a lemma search
  * Source: http://www.javascript-coder.com/javascript-form/javascript-reset-form.phtml
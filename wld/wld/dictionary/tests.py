@@ -6,7 +6,8 @@ Replace this with more appropriate tests for your application.
 """
 
 import django
-from django.test import TestCase
+from django.db.models import Q
+from django.test import TestCase, Client
 
 # TODO: Configure your database in settings.py and sync before running tests.
 
@@ -23,3 +24,542 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class SearchDataTest(TestCase):
+    """Test data: a lemma, trefwoord, dialect and entry for each text"""
+
+    # The texts of the lemma's, trefwoorden, dialect words and place names
+    texts = ['kat', 'Kat', 'kater', 'kèts', 'Kaoljer', 'kaol', 'bôm', 'mös', 'Ääp', 'de kat', 'kat-en-muis',
+             'kat[1]', 'huis', 'hoes', 'straot', 'Mêerssen']
+
+    @classmethod
+    def setUpClass(cls):
+        django.setup()
+        super(SearchDataTest, cls).setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        from wld.dictionary.models import Deel, Aflevering, Description, Lemma, Trefwoord, Dialect, Entry
+        from wld.dictionary import fulltext
+        from wld.dictionary.wildcard import wildcard_refresh
+
+        # The indexes of a previous test class have been rolled back
+        fulltext.fts_status['checked'] = 0
+        fulltext.trigram_status['checked'] = 0
+        deel = Deel.objects.create(titel="Deel I", nummer=1)
+        Aflevering.objects.bulk_create([Aflevering(naam="afl.pdf", deel=deel, aflnum=1)])
+        afl = Aflevering.objects.first()
+        descr = Description.objects.create(toelichting="", bronnenlijst="", boek="")
+        for i, sText in enumerate(cls.texts):
+            lemma = Lemma.objects.create(gloss=sText)
+            trefwoord = Trefwoord.objects.create(woord=sText)
+            dialect = Dialect.objects.create(stad=sText, nieuw="Q{:03d}p".format(i), code="-")
+            # Each entry gets another dialect word than its lemma
+            Entry.objects.create(lemma=lemma, descr=descr, dialect=dialect, trefwoord=trefwoord, aflevering=afl,
+                                 woord=cls.texts[(i + 3) % len(cls.texts)])
+        # The search fields have been filled by save(): this (also) sets their markers
+        wildcard_refresh()
+        fulltext.fulltext_rebuild()
+
+    def setUp(self):
+        from wld.dictionary import wildcard, fulltext, entrysearch
+
+        # The markers of the search fields have been set: check them again
+        wildcard.wildcard_status['checked'] = 0
+        fulltext.fts_status['checked'] = 0
+        fulltext.trigram_status['checked'] = 0
+        entrysearch.entrysearch_status['checked'] = 0
+        # Requests without a user agent are blocked
+        self.client = Client(HTTP_USER_AGENT="Mozilla/5.0")
+
+    def get_ids(self, cls, *lstQ):
+        return sorted(cls.objects.filter(*lstQ).values_list('id', flat=True))
+
+    def add_entry(self, sLemma, sDialect, sWoord, bToonbaar=True, sTrefwoord=None):
+        """Add an entry of the lemma [sLemma] in the dialect of [sDialect], in a new aflevering"""
+
+        from wld.dictionary.models import Deel, Aflevering, Lemma, Trefwoord, Dialect, Entry
+
+        # The aflevering is made without save(), which would start building the prebuilt exports
+        iNum = Aflevering.objects.count() + 1
+        Aflevering.objects.bulk_create([Aflevering(naam="afl{}.pdf".format(iNum), deel=Deel.objects.first(),
+                                                   aflnum=iNum, toonbaar=bToonbaar)])
+        afl = Aflevering.objects.get(aflnum=iNum)
+        entry = Entry.objects.first()
+        return Entry.objects.create(lemma=Lemma.objects.get(gloss=sLemma), descr=entry.descr,
+                                    dialect=Dialect.objects.get(stad=sDialect),
+                                    trefwoord=Trefwoord.objects.get(woord=sTrefwoord or sLemma), aflevering=afl, woord=sWoord)
+
+
+class WildcardTest(SearchDataTest):
+    """The compiled wildcard filters must select the same rows as the regular expression they replace"""
+
+    # The search patterns per kind (see wildcard_classify)
+    patterns = {
+        'exact': ['kat', 'KAT', 'Ääp', 'de kat', 'kat-en-muis', 'Q001p'],
+        'prefix': ['ka*', 'Kaol*', 'ää*', 'de *', 'q0*'],
+        'suffix': ['*ts', '*ER', '*muis', '*1p'],
+        'infix': ['*aol*', '*AT*', '*-en-*', '*00*'],
+        'charclass': ['k?t', 'k?t*', '*a?l*', 'h??s', '[kp]at', '[k-p]*', '*[st]', 'Q[0-9]*', '[!k]*', '*[!s]', 'k[!a]*'],
+        'word': ['kat#', 'de#', '#kat#', 'muis#', 'en#'],
+        'regex': ['[\\w]at', '[A-z]*'],
+        # A '[' without closing bracket is taken literally
+        'bracket': ['kat[', 'kat[1*', '*[1', '*t[*'],
+        }
+
+    def get_fields(self):
+        from wld.dictionary.models import Lemma, Trefwoord, Dialect, Entry
+
+        return [(Entry, 'woord'), (Lemma, 'gloss'), (Trefwoord, 'woord'), (Dialect, 'stad'), (Dialect, 'nieuw')]
+
+    def test_classify(self):
+        """Each pattern is recognized as the kind it stands for"""
+
+        from wld.dictionary.wildcard import wildcard_classify
+
+        for sKind, lPattern in self.patterns.items():
+            for val in lPattern:
+                sFound, lParts = wildcard_classify(val)
+                if sKind == 'bracket':
+                    self.assertTrue(any(sType == 'lit' and '[' in sPart for sType, sPart in lParts), val)
+                else:
+                    self.assertEqual(sFound, sKind, val)
+
+    def test_compile(self):
+        """The compiled filter selects the same rows as 'iregex', and uses the search fields where it can"""
+
+        from wld.dictionary.wildcard import wildcard_compile, wildcard_regex, wildcard_ready
+
+        self.assertTrue(wildcard_ready())
+        for cls, sField in self.get_fields():
+            for sKind, lPattern in self.patterns.items():
+                for val in lPattern:
+                    oQ, bIndexed = wildcard_compile(sField, val)
+                    lExpect = self.get_ids(cls, Q(**{"{}__iregex".format(sField): wildcard_regex(val)}))
+                    self.assertEqual(self.get_ids(cls, oQ), lExpect, "{}.{} {}".format(cls.__name__, sField, val))
+                    if sKind not in ['word', 'regex']:
+                        self.assertNotIn("iregex", str(oQ), val)
+                    if sKind in ['exact', 'prefix', 'suffix']:
+                        self.assertTrue(bIndexed, val)
+
+    def test_compile_fold(self):
+        """Ignoring accents selects the same rows as 'iregex' on the folded field with the folded pattern"""
+
+        from wld.dictionary.models import Lemma, get_search_key_fold
+        from wld.dictionary.wildcard import wildcard_compile, wildcard_regex, FOLD_FIELDS
+
+        for cls, sField in self.get_fields():
+            if sField not in FOLD_FIELDS:
+                continue
+            for lPattern in self.patterns.values():
+                for val in lPattern + ['kets', 'BOM*', '*os', 'aap', 'meerssen#']:
+                    oQ, bIndexed = wildcard_compile(sField, val, fold=True)
+                    oExpect = Q(**{"{}_fold__iregex".format(sField): wildcard_regex(get_search_key_fold(val))})
+                    self.assertEqual(self.get_ids(cls, oQ), self.get_ids(cls, oExpect), "{}.{} {}".format(cls.__name__, sField, val))
+        # Accents and case are ignored indeed
+        lExpect = self.get_ids(Lemma, Q(gloss="kèts"))
+        self.assertEqual(self.get_ids(Lemma, wildcard_compile('gloss', 'KETS', fold=True)[0]), lExpect)
+
+    def test_fulltext(self):
+        """The full-text and trigram pre-selections do not change the rows that are selected"""
+
+        from wld.dictionary.models import Entry
+        from wld.dictionary.fulltext import fulltext_ready, trigram_ready
+        from wld.dictionary.wildcard import wildcard_add, wildcard_regex
+
+        if not fulltext_ready():
+            self.skipTest("FTS5 is not available")
+        for lPattern in self.patterns.values():
+            for val in lPattern:
+                for sPath, sColumn, sTarget in [('woord', 'woord', 'entry'), ('lemma__gloss', 'gloss', 'entry')]:
+                    lExpect = self.get_ids(Entry, Q(**{"{}__iregex".format(sPath): wildcard_regex(val)}))
+                    lstQ = wildcard_add([], sPath, val, (sColumn, sTarget))
+                    self.assertEqual(self.get_ids(Entry, *lstQ), lExpect, "{} {}".format(sPath, val))
+        # Infixes are narrowed down by the trigram index, if there is one
+        if trigram_ready():
+            self.assertEqual(len(wildcard_add([], 'woord', '*aol*', ('woord', 'entry'))), 2)
+
+
+class ColumnarTest(SearchDataTest):
+    """The columnar index must give the same ids, in the same order, as the database"""
+
+    # The list views, and the parameters that filter on their texts
+    views = {'lemma': ('LemmaListView', ['search', 'dialectCity', 'woord']),
+             'trefwoord': ('TrefwoordListView', ['search', 'dialectwoord', 'lemma', 'dialectCity']),
+             'location': ('LocationListView', ['search', 'nieuw'])}
+
+    def test_select(self):
+        """Each pattern the index answers gives the ids of the (uncached) database query of the list view"""
+
+        import os
+        import tempfile
+        from unittest import mock
+        from django.core.cache import cache
+        from django.test import RequestFactory
+        from wld.dictionary import columnar, views
+        from wld.dictionary.models import Generation
+
+        if columnar.numpy == None:
+            self.skipTest("NumPy is not available")
+        # The snapshot file of the test data must not replace that of the database
+        with tempfile.TemporaryDirectory() as sDir:
+            with mock.patch.object(columnar, 'COLUMNAR_FILE', os.path.join(sDir, "wld.columnar")):
+                self.assertTrue(columnar.columnar_build())
+        iGeneration = Generation.get_number()
+        for sView, (sClass, lParam) in self.views.items():
+            for sParam in lParam:
+                for sKind, lPattern in WildcardTest.patterns.items():
+                    for val in lPattern:
+                        for bFold in [False, True]:
+                            get = {sParam: val, 'ignoreAccents': str(bFold)}
+                            request = RequestFactory().get("/", get)
+                            lId = columnar.columnar_select(sView, request.GET, bFold, iGeneration)
+                            sMsg = "{} {}={} {}".format(sView, sParam, val, bFold)
+                            if sKind in ['charclass', 'word', 'regex']:
+                                # These are left to the database
+                                self.assertIsNone(lId, sMsg)
+                            elif sKind != 'bracket':
+                                self.assertIsNotNone(lId, sMsg)
+                            if lId == None:
+                                continue
+                            # The same search in the database
+                            cache.clear()
+                            view = getattr(views, sClass)()
+                            view.setup(request)
+                            with mock.patch.object(views, 'columnar_select', return_value=None):
+                                qs = view.get_queryset()
+                            self.assertEqual(lId, qs.id_list, sMsg)
+
+
+class PagingTest(SearchDataTest):
+    """Search snapshots and keyset pages must give the rows of the queryset, in its order"""
+
+    def test_snapshot(self):
+        """A snapshot is kept until the data generation is raised"""
+
+        from django.core.cache import cache
+        from wld.dictionary.models import Entry, Generation
+        from wld.dictionary.paging import get_snapshot
+
+        cache.clear()
+        get = {'search': 'ka*', 'page': '2'}
+        qs = Entry.objects.filter(woord_lower__startswith="k").order_by('woord_lower', 'id')
+        lExpect = list(qs.values_list('id', flat=True))
+        oSnapshot = get_snapshot("lemma", get, qs)
+        self.assertEqual(oSnapshot.id_list, lExpect)
+        self.assertEqual(oSnapshot.count(), len(lExpect))
+        self.assertEqual([entry.id for entry in oSnapshot[1:3]], lExpect[1:3])
+        self.assertEqual([entry.id for entry in oSnapshot], lExpect)
+        # The same search (on another page) comes from the cache
+        self.assertEqual(get_snapshot("lemma", {'search': 'ka*'}, qs.none()).id_list, lExpect)
+        # ... but no longer once the data have changed
+        Generation.data_changed()
+        self.assertEqual(get_snapshot("lemma", get, qs.none()).id_list, [])
+
+    def test_keyset(self):
+        """Walking forward with 'after' and back with 'before' gives the offset pages"""
+
+        from django.core.paginator import Paginator
+        from wld.dictionary.models import Entry
+        from wld.dictionary.paging import get_keyset_page, get_keyset_tokens
+
+        sField = "woord_lower"
+        iSize = 3
+        qs = Entry.objects.order_by(sField, 'id')
+        oPaginator = Paginator(qs, iSize)
+        lExpect = [[entry.id for entry in oPaginator.page(i).object_list] for i in oPaginator.page_range]
+        self.assertIsNone(get_keyset_page(qs, sField, {}, iSize, qs.count()))
+        # Forward, starting from the first offset page
+        oPage = oPaginator.page(1)
+        lPage = [[entry.id for entry in oPage]]
+        while oPage.has_next():
+            sNext, sPrevious = get_keyset_tokens(oPage, sField)
+            oPage = get_keyset_page(qs, sField, {'after': sNext}, iSize, qs.count())
+            lPage.append([entry.id for entry in oPage])
+            self.assertEqual(oPage.number, len(lPage))
+        self.assertEqual(lPage, lExpect)
+        # And back again
+        lPage = [[entry.id for entry in oPage]]
+        while oPage.has_previous():
+            sNext, sPrevious = get_keyset_tokens(oPage, sField)
+            oPage = get_keyset_page(qs, sField, {'before': sPrevious}, iSize, qs.count())
+            lPage.insert(0, [entry.id for entry in oPage])
+        self.assertEqual(lPage, lExpect)
+        self.assertEqual(oPage.number, 1)
+
+
+class GroupingTest(SearchDataTest):
+    """The nested groups of a page hold all its entries once, in their order"""
+
+    def test_group(self):
+        from wld.dictionary.models import Entry
+        from wld.dictionary.exports import get_entry_order
+        from wld.dictionary.grouping import group_entries
+
+        # A lemma with more than one trefwoord, and a dialectopgave in more than one place
+        self.add_entry('huis', 'kat', 'poes')
+        self.add_entry('huis', 'kater', 'poes')
+        self.add_entry('huis', 'bôm', 'hoes', sTrefwoord='hoes')
+        lEntry = list(Entry.objects.order_by(*get_entry_order("lemma"), 'id'))
+        lSpec = ["lemma.gloss", "trefwoord.woord", Entry.get_toelichting, Entry.dialectopgave]
+        lGroup = group_entries(lEntry, lSpec)
+        # The lemma groups follow the order of the entries, and hold all of them
+        lGloss = [entry.lemma.gloss for entry in lEntry]
+        self.assertEqual([oGroup.key for oGroup in lGroup], [sGloss for i, sGloss in enumerate(lGloss)
+                                                             if i == 0 or sGloss != lGloss[i-1]])
+        self.assertEqual([entry.id for oGroup in lGroup for entry in oGroup.members], [entry.id for entry in lEntry])
+        oHuis = [oGroup for oGroup in lGroup if oGroup.key == 'huis'][0]
+        self.assertEqual(len(oHuis.members), 4)
+        self.assertEqual([oGroup.key for oGroup in oHuis.groups], ['hoes', 'huis'])
+        oTrefwoord = oHuis.groups[1]
+        self.assertEqual(len(oTrefwoord.groups), 1)
+        self.assertEqual([oGroup.key for oGroup in oTrefwoord.groups[0].groups], ['Mêerssen', 'poes'])
+        self.assertEqual(len(oTrefwoord.groups[0].groups[1].entries), 2)
+        # Only the last group on each level is final
+        self.assertEqual([oGroup.final for oGroup in oHuis.groups], [False, True])
+        self.assertEqual([oGroup.final for oGroup in oTrefwoord.groups[0].groups], [False, True])
+
+
+class ConditionalTest(SearchDataTest):
+    """The read-only lists answer with 304 as long as the data have not changed"""
+
+    def test_etag(self):
+        from unittest import mock
+        from django.urls import reverse
+        from wld.dictionary import columnar
+
+        # The columnar index of the test data is not built in the background
+        with mock.patch.object(columnar, 'columnar_start'):
+            for sName in ['lemmasearch', 'trefwoordsearch', 'locationsearch']:
+                self.check_etag(reverse(sName))
+            # A search submitted by a form is always answered in full
+            response = self.client.get(reverse('lemmasearch'))
+            response = self.client.post(reverse('lemmasearch'), {'search': 'ka*'}, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('ETag'))
+
+    def check_etag(self, sUrl):
+        from wld.dictionary.models import Generation
+
+        get = {'search': 'ka*'}
+        response = self.client.get(sUrl, get)
+        self.assertEqual(response.status_code, 200)
+        sETag = response['ETag']
+        # The same request with the validator of the client
+        response = self.client.get(sUrl, get, HTTP_IF_NONE_MATCH=sETag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], sETag)
+        # Another search, or another generation of the data, gives another response
+        response = self.client.get(sUrl, {'search': 'kat'}, HTTP_IF_NONE_MATCH=sETag)
+        self.assertEqual(response.status_code, 200)
+        Generation.data_changed()
+        response = self.client.get(sUrl, get, HTTP_IF_NONE_MATCH=sETag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], sETag)
+
+
+class ExportTest(SearchDataTest):
+    """The streamed CSV and the Excel export hold the rows of the queryset, in its order"""
+
+    def get_expected(self, qs):
+        from wld.dictionary.exports import outputColumns, outputFields
+
+        return [list(outputColumns)] + [["" if value == None else value for value in row]
+                                        for row in qs.values_list(*outputFields)]
+
+    def get_csv(self, response):
+        import csv
+
+        sText = b"".join(response.streaming_content).decode('utf-8')
+        self.assertTrue(sText.startswith(u'\ufeff'))
+        return [row for row in csv.reader(sText[1:].splitlines(), csv.excel_tab)]
+
+    def test_csv(self):
+        from wld.dictionary.models import Entry
+        from wld.dictionary.entrysearch import entrysearch_update, entrysearch_status
+        from wld.dictionary.views import export_csv
+
+        self.add_entry('kat', 'huis', 'verborgen', bToonbaar=False)
+        qs = Entry.objects.order_by('-woord_lower', 'id')
+        lExpect = self.get_expected(qs)
+        self.assertEqual(self.get_csv(export_csv(qs, "test")), lExpect)
+        # The same rows from the flattened search rows (where the hidden entry has none)
+        self.assertTrue(entrysearch_update(None))
+        entrysearch_status['checked'] = 0
+        self.assertEqual(self.get_csv(export_csv(qs, "test")), lExpect)
+
+    def test_xlsx(self):
+        import io
+        import openpyxl
+        from wld.dictionary.models import Entry
+        from wld.dictionary.views import export_xlsx
+
+        qs = Entry.objects.filter(woord_lower__startswith="k").order_by('woord_lower', 'id')
+        response = export_xlsx(qs, "test")
+        wb = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content)), read_only=True)
+        lRow = [["" if value == None else value for value in row] for row in wb["test"].iter_rows(values_only=True)]
+        self.assertEqual(lRow, self.get_expected(qs))
+
+
+class ArtifactTest(SearchDataTest):
+    """The prebuilt exports hold the visible entries, and are served with an ETag"""
+
+    def test_artifacts(self):
+        import csv
+        import gzip
+        import os
+        import tempfile
+        from unittest import mock
+        from django.test import RequestFactory
+        from wld.dictionary import artifacts
+        from wld.dictionary.exports import outputColumns, outputFields
+        from wld.dictionary.models import Generation
+
+        entry = self.add_entry('kat', 'huis', 'verborgen', bToonbaar=False)
+        iGeneration = Generation.get_number()
+        with tempfile.TemporaryDirectory() as sDir:
+            with mock.patch.object(artifacts, 'ARTIFACT_DIR', sDir):
+                # The workers of the build each have a database connection of their own, which
+                #   does not see the test data: write the artifacts in this thread instead
+                sGenDir = artifacts.get_artifact_dir(iGeneration)
+                os.makedirs(sGenDir)
+                for sName, afl_id in [("all", None), ("afl{}".format(entry.aflevering_id), entry.aflevering_id)]:
+                    artifacts.artifact_write(sGenDir, sName, afl_id)
+                with gzip.open(artifacts.get_artifact_path(iGeneration, "all", 'csv'), "rt", encoding="utf-8") as f:
+                    lRow = [row for row in csv.reader(f.read()[1:].splitlines(), csv.excel_tab)]
+                qs = artifacts.get_artifact_qs()
+                self.assertEqual(lRow[0], outputColumns)
+                self.assertEqual(lRow[1:], [list(row) for row in qs.values_list(*outputFields)])
+                self.assertNotIn('verborgen', [row[2] for row in lRow])
+                # The aflevering holds nothing visible
+                with gzip.open(artifacts.get_artifact_path(iGeneration, "afl{}".format(entry.aflevering_id), 'json'), "rt") as f:
+                    self.assertEqual(f.read().strip(), "[\n]")
+                # Only a request without other filters is served from the artifacts
+                request = RequestFactory().get("/", {'page': '2', 'mijn': '0'})
+                response = artifacts.artifact_response(request, 'csv', "test")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Disposition'], 'attachment; filename="test.csv"')
+                request = RequestFactory().get("/", HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(artifacts.artifact_response(request, 'csv', "test").status_code, 304)
+                self.assertIsNone(artifacts.artifact_response(RequestFactory().get("/", {'search': 'kat'}), 'csv', "test"))
+                self.assertIsNone(artifacts.artifact_response(RequestFactory().get("/", {'strict': 'False'}), 'csv', "test"))
+                # Nor after the data have changed
+                Generation.data_changed()
+                self.assertIsNone(artifacts.artifact_response(RequestFactory().get("/"), 'csv', "test"))
+
+
+class AutocompleteTest(SearchDataTest):
+    """The suggestions are the values of the visible entries with the prefix, most frequent first"""
+
+    def test_complete(self):
+        from django.urls import reverse
+        from wld.dictionary import autocomplete
+
+        self.add_entry('kat', 'huis', 'poes')
+        self.add_entry('kater', 'huis', 'kater')
+        self.add_entry('kaol', 'huis', 'kaol', bToonbaar=False)
+        self.add_entry('kaol', 'hoes', 'kaol', bToonbaar=False)
+        self.assertTrue(autocomplete.autocomplete_build())
+        # Values that only differ in case are taken together; the hidden entries do not count
+        self.assertEqual(autocomplete.autocomplete('lemma', 'KA', 3), [('kat', 3), ('kater', 2), ('kaol', 1)])
+        self.assertEqual(autocomplete.autocomplete('lemma', 'kao'), [('kaol', 1), ('Kaoljer', 1)])
+        self.assertEqual(autocomplete.autocomplete('lemma', 'kat-'), [('kat-en-muis', 1)])
+        self.assertEqual(autocomplete.autocomplete('dialectCode', 'q01'),
+                         [('Q012p', 3)] + [('Q01{}p'.format(i), 1) for i in [0, 1, 3, 4, 5]])
+        self.assertEqual(autocomplete.autocomplete('lemma', 'x'), [])
+        self.assertIsNone(autocomplete.autocomplete('woord', 'ka'))
+        # The same through the API
+        response = self.client.get(reverse('api_complete', kwargs={'field': 'lemma'}), {'q': 'kat', 'limit': '2'})
+        self.assertEqual(response.json(), {'results': [{'value': 'kat', 'count': 3}, {'value': 'kater', 'count': 2}]})
+        response = self.client.get(reverse('api_complete', kwargs={'field': 'woord'}), {'q': 'kat'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MijnTest(SearchDataTest):
+    """Filtering on the bitmask of mijnen selects the entries of the mijn"""
+
+    def test_hasbits(self):
+        from wld.dictionary.models import Mijn, Entry, EntryMijn, MAX_MIJN_BITS
+        from wld.dictionary.wildcard import mijn_filter
+
+        lMijn = [Mijn.objects.create(naam="mijn{}".format(i)) for i in range(3)]
+        # A mijn without a bit of its own
+        lMijn.append(Mijn.objects.create(id=MAX_MIJN_BITS + 1, naam="mijn"))
+        lEntry = list(Entry.objects.order_by('id'))
+        for i, entry in enumerate(lEntry):
+            for iMijn, mijn in enumerate(lMijn):
+                if i % (iMijn + 2) == 0:
+                    EntryMijn.objects.create(entry=entry, mijn=mijn)
+        for mijn in lMijn:
+            lExpect = self.get_ids(Entry, Q(mijnlijst__id=mijn.id))
+            self.assertTrue(len(lExpect) > 0)
+            oQ, bJoin = mijn_filter(mijn.id)
+            self.assertEqual(bJoin, Mijn.get_mask(mijn.id) == None)
+            self.assertEqual(self.get_ids(Entry, oQ), lExpect, mijn.naam)
+        # Any of several mijnen
+        iMask = Mijn.get_mijnen([lMijn[0].id, lMijn[1].id])
+        lExpect = self.get_ids(Entry, Q(mijnlijst__id__in=[lMijn[0].id, lMijn[1].id]))
+        self.assertEqual(sorted(set(self.get_ids(Entry, Q(mijnen__hasbits=iMask)))), sorted(set(lExpect)))
+        # Removing a mijn from an entry takes its bit away
+        EntryMijn.objects.filter(entry=lEntry[0], mijn=lMijn[0]).first().delete()
+        self.assertNotIn(lEntry[0].id, self.get_ids(Entry, mijn_filter(lMijn[0].id)[0]))
+
+
+class ApiTest(SearchDataTest):
+    """The API gives the visible objects that satisfy the filters, page by page"""
+
+    def get_results(self, sName, get):
+        from django.urls import reverse
+
+        response = self.client.get(reverse(sName), get)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_entries(self):
+        from wld.dictionary.models import Entry
+        from wld.dictionary.wildcard import wildcard_regex, toonbaar_filter
+
+        self.add_entry('kat', 'huis', 'kater', bToonbaar=False)
+        lExpect = self.get_ids(Entry, toonbaar_filter(), Q(lemma__gloss__iregex=wildcard_regex('ka*')))
+        oResult = self.get_results('api_entries', {'lemma': 'ka*', 'fields': 'id,lemma'})
+        self.assertEqual([oRow['id'] for oRow in oResult['results']], lExpect)
+        self.assertTrue(all([oRow['lemma'].lower().startswith('ka') for oRow in oResult['results']]))
+        # All pages, following the cursor
+        lId = []
+        get = {'limit': '4', 'fields': 'id'}
+        while True:
+            oResult = self.get_results('api_entries', get)
+            self.assertTrue(len(oResult['results']) <= 4)
+            lId += [oRow['id'] for oRow in oResult['results']]
+            if oResult['next'] == None:
+                break
+            get['cursor'] = oResult['next']
+        self.assertEqual(lId, self.get_ids(Entry, toonbaar_filter()))
+        # Errors
+        self.assertEqual(self.client.get("/api/entries/", {'fields': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get("/api/entries/", {'cursor': 'x'}).status_code, 400)
+
+    def test_strict(self):
+        """Without 'strict', each filter may be satisfied by another visible entry of the lemma"""
+
+        from unittest import mock
+        from wld.dictionary import artifacts
+
+        # The lemma 'kat' has the dialectopgave 'kèts' in 'kat', and gets 'hoes' in 'huis'
+        entry = self.add_entry('kat', 'huis', 'hoes', bToonbaar=False)
+        get = {'woord': 'kèts', 'dialectCity': 'huis', 'fields': 'gloss'}
+        for sStrict in ['True', 'False']:
+            get['strict'] = sStrict
+            # The entry in 'huis' is not visible
+            self.assertEqual(self.get_results('api_lemmas', get)['results'], [])
+        # Making the aflevering visible does not build the prebuilt exports of the test data
+        entry.aflevering.toonbaar = True
+        with mock.patch.object(artifacts, 'artifacts_start'):
+            entry.aflevering.save()
+        self.assertEqual(self.get_results('api_lemmas', get)['results'], [{'gloss': 'kat'}])
+        get['strict'] = 'True'
+        self.assertEqual(self.get_results('api_lemmas', get)['results'], [])
+        # One entry satisfies both
+        get['woord'] = 'hoes'
+        self.assertEqual(self.get_results('api_lemmas', get)['results'], [{'gloss': 'kat'}])
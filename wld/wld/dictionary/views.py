@@ -5,17 +5,21 @@ Definition of views.
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView, View
 from django.shortcuts import get_object_or_404, render
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, StreamingHttpResponse, FileResponse, Http404
 from django.urls import reverse
 from django.template import RequestContext, loader
 from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 from django.db import connection
-from django.db.models import Q
+from django.db.models import Q, Count
+from django.core.cache import cache
 from django.db.models.functions import Lower
 from django.http import JsonResponse
 from datetime import datetime
 from xml.dom import minidom
 from operator import itemgetter
+from urllib.parse import urlencode
 import xml.etree.ElementTree as ET
 import os
 import operator
@@ -25,12 +29,28 @@ import csv
 import codecs
 import copy
 import sys
+import hashlib
+import tempfile
+import threading
+import time
 from wld.dictionary.models import *
 from wld.dictionary.forms import *
 from wld.mapview.views import MapView
 #from wld.dictionary.adminviews import order_queryset_by_sort_order
-from wld.settings import APP_PREFIX, WSGI_FILE
+from wld.settings import APP_PREFIX, WSGI_FILE, MEDIA_ROOT
 from wld.dictionary.conversion import rd_to_wgs, wgs_to_rd
+from wld.dictionary.fulltext import fulltext_rebuild
+from wld.dictionary.entrysearch import entrysearch_update, entrysearch_ready
+from wld.dictionary.wildcard import wildcard_add, wildcard_filter, wildcard_ready, wildcard_refresh, \
+     mijn_filter, toonbaar_filter
+from wld.dictionary.paging import get_snapshot, get_snapshot_key, get_keyset_page, get_keyset_tokens
+from wld.dictionary.grouping import group_entries
+from wld.dictionary.exports import outputColumns, get_export_rows, get_entry_order, write_xlsx, CsvBuffer
+from wld.dictionary.artifacts import artifact_response, artifacts_start
+from wld.dictionary.autocomplete import autocomplete_start
+from wld.dictionary.columnar import columnar_select, columnar_start
+from wld.dictionary.conditional import ConditionalView
+from wld.dictionary.refdata import get_afleveringen, get_aflevering, get_mijnen, get_mijn, REFDATA_GENERATION
 
 # Global variables
 paginateSize = 10
@@ -38,7 +58,19 @@ paginateLocations = 2
 paginateEntries = 100
 # paginateValues = (1000, 500, 250, 100, 50, 40, 30, 20, 10, )
 paginateValues = (100, 50, 20, 10, 5, 2, 1, )
-outputColumns = ['begrip', 'trefwoord', 'dialectopgave', 'Kloekecode', 'aflevering', 'bronnenlijst']
+# Excel exports with more rows than this are made in the background
+xlsxBackgroundRows = 20000
+# Number of seconds an Excel export made in the background is kept
+xlsxKeepSeconds = 24 * 60 * 60
+# Number of seconds after which an unfinished Excel export that is no longer touched counts as dead
+#   (e.g. when the process writing it has been restarted); the writer touches it every xlsxTouchSeconds
+xlsxPartSeconds = 15 * 60
+xlsxTouchSeconds = 60
+# Number of seconds a rendered lemma or trefwoord block is kept in the cache
+fragmentSeconds = 60 * 60
+# Cache key of the dialect check report, and the number of seconds it is kept
+dialectCheckKey = "dialect_check"
+dialectCheckSeconds = 24 * 60 * 60
 
 THIS_DICTIONARY = "e-WLD"
 
@@ -95,63 +127,45 @@ def order_queryset_by_sort_order(get, qs, sOrder = 'gloss'):
     # return the ordered list
     return ordered
 
-def get_item_list(lVar, lFun, qs):
-    """Turn the queryset [qs] into a list of Items that have first and last information"""
-
-    lItem = []
-    oErr = ErrHandle()
-    try:
-        # Initialize the variables whose changes are important
-        oVariable = {}
-        for i, key in enumerate(lVar):
-            oVariable[key] = "" # {'name': key, 'fun': lFun[i]}
-        iLast = len(qs)-1
-        # Iterate over the entries looking for first, last etc
-        for i, entry in enumerate(qs):
-            bIsLastEntry = (i==iLast)
-            oItem = {'entry': entry}
-            for k in lVar:
-                oItem[k] = {'first':False, 'last':False}
-            bIsDict = isinstance(entry, dict)
-            bVarIsLast = False
-            # Check for changes in all the variables
-            for j, k in enumerate(lVar):
-                fun = lFun[j]
-                if callable(fun):
-                    sValue = fun(entry)
-                else:
-                    for idx, val in enumerate(fun):
-                        if idx==0:
-                            if bIsDict:
-                                sValue = entry[val]
-                            else:
-                                sValue = getattr(entry, val)
-                        else:
-                            if bIsDict:
-                                sValue = sValue[val]
-                            else:
-                                sValue = getattr(sValue, val)
-                # Check for changes in the value of the variable 
-                # if sValue != oVariable[k]:
-                if sValue != oVariable[k] or bVarIsLast or (i>0 and lItem[i-1][k]['last']):
-                    # Check if the previous one's [last] must be changed
-                    if oVariable[k] != "": lItem[i-1][k]['last'] = True
-                    # Adapt the current one's [first] property
-                    oItem[k]['first']= True
-                    # Adapt the variable
-                    oVariable[k] = sValue      
-                    # Indicate that the next ones should be regarded as 'last'
-                    bVarIsLast = True      
-                # Check if this is the last
-                if bIsLastEntry: oItem[k]['last'] = True
-            # Add this object to the list of items
-            lItem.append(oItem)
-    except:
-        oErr.DoError("get_item_list error")
-        lItem = []
+def set_afl_lists(lGroup):
+    """Set the [alist] of each group in [lGroup] to the (ordered) afleveringen of its entries"""
+
+    # Collect the aflevering ids of each group
+    lAflIds = [set([entry.aflevering_id for entry in oGroup.members]) for oGroup in lGroup]
+    id_list = set().union(*lAflIds)
+    # Get all afleveringen of the page in their numerical order with one query
+    lAfl = list(Aflevering.objects.filter(id__in=id_list).select_related('deel').order_by(
+        'sortkey', 'deel__nummer', 'sectie', 'aflnum'))
+    for idx, oGroup in enumerate(lGroup):
+        oGroup.alist = [afl for afl in lAfl if afl.id in lAflIds[idx]]
+    return lGroup
+
+def set_fragment_key(context, sView, get):
+    """Set the context variables for caching the rendered blocks of list view [sView]
+
+    A block is cached under its object id and [fragmentkey], which stands for the
+    filter in [get] and the current generations of the data and of the reference tables.
+    If a generation is not available, the blocks are not kept at all.
+    """
 
-    # Return the list we have made
-    return lItem
+    iData = Generation.get_number()
+    iReference = Generation.get_number(REFDATA_GENERATION)
+    context['fragmentkey'] = "{}_{}_{}".format(get_snapshot_key(sView, get), iData, iReference)
+    context['fragmentSeconds'] = 0 if iData == None or iReference == None else fragmentSeconds
+    return context
+
+def set_descr_lists(lGroup):
+    """Set the [dlist] of each group in [lGroup] to the descriptions of its entries, grouped by toelichting"""
+
+    # Collect the description ids of each group
+    lDescrIds = [set([entry.descr_id for entry in oGroup.members]) for oGroup in lGroup]
+    id_list = set().union(*lDescrIds)
+    # Get all descriptions of the page in their order with one query
+    lDescr = list(Description.objects.filter(id__in=id_list).order_by(Lower('toelichting'), Lower('bronnenlijst')))
+    for idx, oGroup in enumerate(lGroup):
+        lThis = [descr for descr in lDescr if descr.id in lDescrIds[idx]]
+        oGroup.dlist = group_entries(lThis, ["toelichting"])
+    return lGroup
 
 def home(request):
     """Renders the home page."""
@@ -211,94 +225,209 @@ def do_repair(request):
         }
     )
 
-def adapt_search(val):
-    # First trim
-    val = val.strip()  
-    # Adapt for the use of '#'
-    if '#' in val:
-        val = r'(^|(.*\b))' + val.replace('#', r'((\b.*)|$)') # + r'((\b.*)|$)'
-    else:
-        val = '^' + fnmatch.translate(val) + '$'
-    # Make sure to get the hyphen literally  
-    val = val.replace("-", "\-")
-    return val
-
-def export_csv(qs, sFileName):
-    # Create the HttpResponse object with the appropriate CSV header.
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="'+sFileName+'.csv"'
-     
-    # Create a writer for the CSV
-    # writer = csv.writer(response, csv.excel, delimiter='\t')
-    writer = csv.writer(response, csv.excel_tab)
-    # BOM to indicate that this is UTF8
-    response.write(u'\ufeff'.encode('utf8'))
-    # Output the first row with the headings -- these take 'entry' as basis
-    fields = outputColumns
-    # Output the first row with the headings
-    writer.writerow(fields)
-    # Walk through the queryset
-    for obj in qs:
-        writer.writerow(obj.get_row())
-
+def get_export_response(request, content, content_type, sFileName):
+    """Stream the (string) parts of [content] as attachment [sFileName], gzipped if the client accepts that"""
+
+    content = (sPart.encode('utf8') for sPart in content)
+    bGzip = (request != None and re.search(r'\bgzip\b', request.META.get('HTTP_ACCEPT_ENCODING', '')) != None)
+    if bGzip:
+        content = compress_sequence(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    if bGzip:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Content-Disposition'] = 'attachment; filename="'+sFileName+'"'
     return response
 
-def export_xlsx(qs, sFileName):
-    import openpyxl
-    from openpyxl.utils.cell import get_column_letter
-    from openpyxl import Workbook
+def export_csv(qs, sFileName, request=None):
+
+    # Serve a prebuilt export if there is one for this request
+    if request != None:
+        response = artifact_response(request, 'csv', sFileName)
+        if response != None:
+            return response
+
+    def get_lines():
+        # Create a writer for the CSV
+        writer = csv.writer(CsvBuffer(), csv.excel_tab)
+        # BOM to indicate that this is UTF8
+        yield u'\ufeff'
+        # Output the first row with the headings
+        yield writer.writerow(outputColumns)
+        # Walk through the queryset
+        for row in get_export_rows(qs):
+            yield writer.writerow(row)
+
+    # Stream the lines, so that the whole CSV is never in memory
+    return get_export_response(request, get_lines(), 'text/csv', sFileName+'.csv')
+
+def write_xlsx_background(qs, sTitle, sPath):
+    """Write the Excel export of [qs] to [sPath] (to be called in a separate thread)"""
+
+    oErr = ErrHandle()
+    sPart = sPath + ".part"
+    oDone = threading.Event()
+
+    def keep_claim():
+        # Show that the export is still being written (see claim_export)
+        while not oDone.wait(xlsxTouchSeconds):
+            try:
+                os.utime(sPart)
+            except OSError:
+                pass
+
+    threading.Thread(target=keep_claim, daemon=True).start()
+    try:
+        write_xlsx(qs, sTitle, sPart)
+        # Only a complete file gets the final name
+        os.replace(sPart, sPath)
+    except:
+        oErr.DoError("write_xlsx_background")
+        if os.path.exists(sPart):
+            os.remove(sPart)
+    finally:
+        oDone.set()
+        # This thread has its own database connection
+        connection.close()
+
+def get_export_key(qs):
+    """Get a key for the export of [qs], which depends on the query and the data generation"""
+
+    sQuery = "{}_{}".format(qs.query, Generation.get_number())
+    return hashlib.md5(sQuery.encode('utf-8')).hexdigest()
+
+def get_export_path(sKey):
+    return os.path.join(MEDIA_ROOT, "exports", sKey + ".xlsx")
+
+def is_dead_export(sPart):
+    """Check if the unfinished export [sPart] has not been touched for too long: its writer has died"""
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    try:
+        return time.time() - os.path.getmtime(sPart) > xlsxPartSeconds
+    except OSError:
+        return False
+
+def claim_export(sPath):
+    """Claim the writing of export [sPath]: True if this request should write it"""
+
+    sPart = sPath + ".part"
+    if os.path.exists(sPath):
+        return False
+    if is_dead_export(sPart):
+        try:
+            os.remove(sPart)
+        except OSError:
+            pass
+    try:
+        # Only one request can create the unfinished file
+        os.close(os.open(sPart, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+def clean_exports(sDir):
+    """Remove the exports in [sDir] that are too old (including unfinished ones)"""
+
+    oErr = ErrHandle()
+    try:
+        if os.path.exists(sDir):
+            iNow = time.time()
+            for sName in os.listdir(sDir):
+                sPath = os.path.join(sDir, sName)
+                if iNow - os.path.getmtime(sPath) > xlsxKeepSeconds:
+                    os.remove(sPath)
+    except:
+        oErr.DoError("clean_exports")
+
+def export_xlsx(qs, sFileName, request=None):
+    sContentType = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    # Serve a prebuilt export if there is one for this request
+    if request != None:
+        response = artifact_response(request, 'xlsx', sFileName)
+        if response != None:
+            return response
+
+    if qs.count() > xlsxBackgroundRows and request != None:
+        # Large export: make the file in the background, and let the user download it when it is ready
+        sKey = get_export_key(qs)
+        sPath = get_export_path(sKey)
+        clean_exports(os.path.dirname(sPath))
+        os.makedirs(os.path.dirname(sPath), exist_ok=True)
+        # Claim the file, so that a second request does not start another thread
+        if claim_export(sPath):
+            oThread = threading.Thread(target=write_xlsx_background, args=(qs, sFileName, sPath), daemon=True)
+            oThread.start()
+        # Pass on this request, so that an export that has died can be started again
+        sUrl = "{}?key={}&name={}".format(reverse('export_download'), sKey, sFileName)
+        if request.method == "GET":
+            sUrl += "&" + urlencode({'retry': request.get_full_path()})
+        return HttpResponseRedirect(sUrl)
+
+    # Spool the workbook to a temporary file, and stream that file
+    fTemp = tempfile.TemporaryFile()
+    write_xlsx(qs, sFileName, fTemp)
+    fTemp.seek(0)
+    response = FileResponse(fTemp, content_type=sContentType)
     response['Content-Disposition'] = 'attachment; filename='+sFileName+'.xlsx'
-    wb = openpyxl.Workbook()
-    ws = wb.get_active_sheet()
-    ws.title = sFileName
-
-    row_num = 0
-
-    columns = outputColumns
-    for col_num in range(len(columns)):
-        c = ws.cell(row=row_num + 1, column=col_num + 1)
-        c.value = columns[col_num]
-        # c.style.font.bold = True
-        c.font = openpyxl.styles.Font(bold=True)
-        # Set column width
-        # ws.column_dimensions[get_column_letter(col_num+1)].width = columns[col_num][1]
-        # ws.column_dimensions[get_column_letter(col_num+1)].bestFit = True
-        ws.column_dimensions[get_column_letter(col_num+1)].width = 20.0
-
-    # Walk the queryset
-    for obj in qs:
-        row_num += 1
-        row = obj.get_row()
-        for col_num in range(len(row)):
-            c = ws.cell(row=row_num + 1, column=col_num + 1)
-            c.value = row[col_num]
-            c.alignment = openpyxl.styles.Alignment(wrap_text=True)
-
-    wb.save(response)
     return response
 
-def export_html(qs, sFileName):
-    # Create a string with the HTML contents
-    arOut = []
-    arOut.append("<html><head><meta charset='utf-8' /></head><body><table><thead><tr>")
-    fields = outputColumns
-    for f in fields:
-        arOut.append("<th>"+f+"</th>")
-    arOut.append("</tr></thead>")
-    arOut.append("<tbody>")
-    # Walk the contents
-    for obj in qs:
-        sRow = "<tr><td>"+obj.lemma.gloss+"</td><td>"+obj.trefwoord.woord+"</td><td>"+obj.woord+"</td><td>"+obj.dialect.nieuw+"</td><td>"+obj.aflevering.naam+"</td><tr>"
-        arOut.append(sRow)
-    content = "\n".join(arOut)
-    # Create the HttpResponse object with the appropriate header.
-    response = HttpResponse(content, content_type='text/html')
-    response['Content-Disposition'] = 'attachment; filename="'+sFileName+'.htm"'
-     
+def export_download(request):
+    """Download an Excel export that has been made in the background, or report that it is not ready yet"""
+
+    assert isinstance(request, HttpRequest)
+    sKey = request.GET.get('key', '')
+    sFileName = request.GET.get('name', 'export')
+    if not re.match(r'^[0-9a-f]{32}$', sKey) or not re.match(r'^\w+$', sFileName):
+        raise Http404("Unknown export")
+    sPath = get_export_path(sKey)
+    if os.path.exists(sPath):
+        response = FileResponse(open(sPath, "rb"), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = 'attachment; filename='+sFileName+'.xlsx'
+        return response
+    if is_dead_export(sPath + ".part"):
+        # The export has been interrupted: make it again by repeating the export request
+        sRetry = request.GET.get('retry', '')
+        if sRetry.startswith("/") and not sRetry.startswith("//"):
+            return HttpResponseRedirect(sRetry)
+        raise Http404("The export has been interrupted")
+    if not os.path.exists(sPath + ".part"):
+        raise Http404("Unknown export")
+    return render(request, 'dictionary/export_wait.html',
+        {   'title':'{} export'.format(THIS_DICTIONARY),
+            'filename': sFileName + ".xlsx",
+            'year':datetime.now().year,
+        }
+    )
+
+def export_artifact(request):
+    """Download a prebuilt export: everything, or one aflevering, in the indicated format"""
+
+    assert isinstance(request, HttpRequest)
+    sFormat = request.GET.get('format', 'json')
+    response = artifact_response(request, sFormat, THIS_DICTIONARY.lower())
+    if response == None:
+        raise Http404("This export is not available (yet)")
     return response
 
+def export_html(qs, sFileName, request=None):
+
+    def get_lines():
+        # The header of the HTML contents
+        arOut = []
+        arOut.append("<html><head><meta charset='utf-8' /></head><body><table><thead><tr>")
+        for f in outputColumns:
+            arOut.append("<th>"+f+"</th>")
+        arOut.append("</tr></thead>")
+        arOut.append("<tbody>")
+        yield "\n".join(arOut)
+        # Walk the contents
+        for row in get_export_rows(qs):
+            yield "\n<tr><td>"+row[0]+"</td><td>"+row[1]+"</td><td>"+row[2]+"</td><td>"+row[3]+"</td><td>"+row[4]+"</td><tr>"
+
+    # Stream the lines, so that the whole HTML is never in memory
+    return get_export_response(request, get_lines(), 'text/html', sFileName+'.htm')
+
 def do_repair_start(request):
     """Start up the repair action"""
     sRepairType = request.GET.get('repairtype', '')
@@ -323,6 +452,24 @@ def do_repair_start(request):
         bResult = do_repair_clean(oRepair)
         if not bResult:
             data.status = "error"
+    elif sRepairType == "fulltext":
+        oRepair.set_status("Rebuilding the search fields and the full-text index")
+        bResult = wildcard_refresh() and fulltext_rebuild() and Aflevering.update_sortkeys() and Entry.update_toonbaar() \
+            and entrysearch_update()
+        if not bResult:
+            data['status'] = "error"
+
+    # Repairs change the texts that are searched: keep the full-text index in line
+    if sRepairType in ["lemma", "entrydescr", "clean"]:
+        wildcard_refresh()
+        fulltext_rebuild()
+        entrysearch_update()
+        # Cached search results are no longer valid
+        Generation.data_changed()
+        # Make the prebuilt exports, the autocompletion index and the columnar index again
+        artifacts_start()
+        autocomplete_start()
+        columnar_start()
 
     # Return this response
     return JsonResponse(data)
@@ -389,8 +536,28 @@ def import_csv_start(request):
 
         # Call the process
         oResult = csv_to_fixture(sFile, iDeel, iSectie, iAflnum, iStatus, bUseDbase = bUseDbase, bUseOld = True)
+        if iSectie==None or iSectie == "":
+            afl = Aflevering.objects.filter(deel__nummer=iDeel, aflnum=iAflnum).first()
+        else:
+            afl = Aflevering.objects.filter(deel__nummer=iDeel, sectie=iSectie, aflnum=iAflnum).first()
         if oResult == None or oResult['result'] == False:
             data['status'] = 'error'
+        else:
+            # Link new dialects to their coordinates (this may adapt their place names)
+            Dialect.match_coordinates()
+            # Make sure the search fields and the full-text index contain what has been imported
+            wildcard_refresh()
+            fulltext_rebuild()
+            Aflevering.update_sortkeys()
+            Entry.update_toonbaar()
+            # Only the entries of this aflevering need a new search row
+            entrysearch_update(None if afl == None else Entry.objects.filter(aflevering=afl))
+        # Whatever has been imported: cached search results are no longer valid
+        Generation.data_changed(None if afl == None else afl.id)
+        # Make the prebuilt exports, the autocompletion index and the columnar index again
+        artifacts_start()
+        autocomplete_start()
+        columnar_start()
 
         # WSince we are done: explicitly set the status so
         oStatus.set_status("done")
@@ -568,7 +735,7 @@ def import_kloeke_cumul():
     return bSuccess
 
 
-class DictionaryDetailView(DetailView):
+class DictionaryDetailView(ConditionalView, DetailView):
     """Details of an entry from the dictionary"""
 
     model = Entry
@@ -588,7 +755,7 @@ class DictionaryDetailView(DetailView):
         return context
 
 
-class TrefwoordListView(ListView):
+class TrefwoordListView(ConditionalView, ListView):
     """ListView of keywords (trefwoorden)"""
 
     model = Trefwoord
@@ -602,6 +769,7 @@ class TrefwoordListView(ListView):
     qs = None
     bDoTime = False      # Measure time
     strict = True      # Use strict filtering
+    ignore_accents = False  # Disregard case and accents when searching
 
     def get_qs(self):
         if self.qEntry == None:
@@ -610,6 +778,8 @@ class TrefwoordListView(ListView):
             else:
                 # Get the PKs of Entry related to Trefwoord
                 qs = self.get_queryset()
+                # The search snapshot only holds ids: use its (lazy) queryset
+                qs = getattr(qs, 'queryset', qs)
             # Get the Entry queryset related to this
             qs = Entry.objects.filter(trefwoord__pk__in=qs).select_related()
         else:
@@ -620,13 +790,13 @@ class TrefwoordListView(ListView):
         """Check if a CSV response is needed or not"""
         if 'Csv' in self.request.GET.get('submit_type', ''):
             """ Provide CSV response"""
-            return export_csv(self.get_qs(), 'trefwoorden')
+            return export_csv(self.get_qs(), 'trefwoorden', self.request)
         elif 'Excel' in self.request.GET.get('submit_type', ''):
             """ Provide Excel response"""
-            return export_xlsx(self.get_qs(), 'trefwoorden')
+            return export_xlsx(self.get_qs(), 'trefwoorden', self.request)
         elif 'Html' in self.request.GET.get('submit_type', ''):
             """ Provide Html response"""
-            return export_html(self.get_qs(), 'trefwoorden')
+            return export_html(self.get_qs(), 'trefwoorden', self.request)
         else:
             oResponse = super(TrefwoordListView, self).render_to_response(context, **response_kwargs)
             return oResponse
@@ -660,7 +830,7 @@ class TrefwoordListView(ListView):
             if 'mijn' in initial:
                 mijn_id = int(initial['mijn'])
                 context['mijnkeuze'] = mijn_id
-                mijn_inst = Mijn.objects.filter(id=mijn_id).first()
+                mijn_inst = get_mijn(mijn_id)
                 if mijn_inst == None:
                     context['mijnnaam'] = ''
                 else:
@@ -671,7 +841,7 @@ class TrefwoordListView(ListView):
         # Process and retain the choice for Aflevering
         if 'aflevering' in initial:
             context['aflkeuze'] = int(initial['aflevering'])
-            afl = Aflevering.objects.filter(id=context['aflkeuze']).first()
+            afl = get_aflevering(context['aflkeuze'])
             if afl == None:
                 context['afl'] = ''
             else:
@@ -692,85 +862,73 @@ class TrefwoordListView(ListView):
         # Make sure the paginate-values are available
         context['paginateValues'] = paginateValues
 
+        # Tokens for keyset paging to the next and the previous page
+        sField = self.get_keyset_field()
+        if sField != None and context.get('page_obj') != None:
+            context['keyset_next'], context['keyset_previous'] = get_keyset_tokens(context['page_obj'], sField)
+
         # Set the prefix
         context['app_prefix'] = APP_PREFIX
 
         # Set the afleveringen and mijnen that are available
-        context['afleveringen'] = [afl for afl in Aflevering.objects.all()]
-        context['mijnen'] = [mijn for mijn in Mijn.objects.all().order_by('naam')]
+        context['afleveringen'] = get_afleveringen()
+        context['mijnen'] = get_mijnen()
 
         # Set the title of the application
         context['title'] = "{} trefwoorden".format(THIS_DICTIONARY)
 
         # If we are in 'strict' mode, we need to deliver the [qlist]
         if self.strict:
-            # Transform the paginated queryset into a dict sorted by Dialect/Aflevering
-            lAflev = self.get_qafl(context)
-
-            # Get a list with 'first' and 'last' values for each item in the current paginated queryset
+            # Group the entries of the current page by trefwoord, lemma, toelichting and dialectopgave
             lEntry = self.get_qlist(context)
-            # Add the sorted-dialect information to lEntry
-            for idx, item in enumerate(lEntry):
-                # Start or Finish dialect information
-                if item['trefwoord_woord']['first']:
-                    qsa = []
-                # All: add this entry
-                qsa.append(lAflev[idx])
-                if item['trefwoord_woord']['last']:
-                    # COpy the list of Entry elements sorted by Trefwoord/Aflevering here
-                    lEntry[idx]['alist'] = qsa
-                else:
-                    lEntry[idx]['alist'] = None
+            # Add the afleveringen to each trefwoord
+            set_afl_lists(lEntry)
 
             context['qlist'] = lEntry
+            # The rendered trefwoord blocks are cached
+            set_fragment_key(context, "trefwoord", initial)
 
         # Return the calculated context
         return context
       
     def get_qlist(self, context):
-        """Get a list of Entry elements + first/last information"""
+        """Get the entries of the current page grouped by trefwoord"""
 
         # REtrieve the correct queryset, as determined by paginate_by
         qs = context['object_list']
-        # Start the output
-        html = []
-        # Initialize the variables whose changes are important
-        lVars = ["trefwoord_woord", "lemma_gloss", "toelichting", "dialectopgave", "dialect_stad"]
-        lFuns = [["trefwoord", "woord"], ["lemma", "gloss"], Entry.get_toelichting, Entry.dialectopgave, ["dialect", "stad"]]
-        # Get a list of items containing 'first' and 'last' information
-        lItem = get_item_list(lVars, lFuns, qs)
-        # REturn this list
-        return lItem
-
-    def get_qafl(self, context):
-        """Sort the paginated QS by Trefwoord/Aflevering into a list"""
-
-        # REtrieve the correct queryset, as determined by paginate_by
-        qs = context['object_list']
-        qsd = []
-        # Walk through the query set
-        for entry in qs:
-            qsd.append(entry)
-        # Now sort the resulting set
-        qsd = sorted(qsd, key=lambda el: el.trefwoord.woord + " " + el.get_aflevering())
-        # Prepare for processing
-        lVarsD = ["trefw", "afl"]
-        lFunsD = [["trefwoord", "woord"], Entry.get_aflevering]
-        # Create a list of the items
-        lAfl = get_item_list(lVarsD, lFunsD, qsd)
-        # Return the result
-        return lAfl            
+        # The keys of the (nested) groups
+        lSpec = ["trefwoord.woord", "lemma.gloss", Entry.get_toelichting, Entry.dialectopgave]
+        # Get the list of trefwoord groups
+        return group_entries(qs, lSpec)
       
     def get_paginate_by(self, queryset):
         """
         Paginate by specified value in querystring, or use default class property value.
         """
         return self.request.GET.get('paginate_by', self.paginate_by)
-        
+
+    def get_keyset_field(self):
+        """Get the indexed sort key used for keyset paging (if available)"""
+        if wildcard_ready():
+            return "woord_lower"
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        """Use keyset paging if a page token ('after' or 'before') has been passed on"""
+
+        get = self.request.GET if self.request.method == "GET" else self.request.POST
+        sField = self.get_keyset_field()
+        if sField != None and hasattr(queryset, 'queryset'):
+            oPage = get_keyset_page(queryset.queryset, sField, get, page_size, queryset.count())
+            if oPage != None:
+                return (oPage.paginator, oPage, oPage.object_list, oPage.has_other_pages())
+        return super(TrefwoordListView, self).paginate_queryset(queryset, page_size)
+
     def get_entryset(self, page_obj):
         lstQ = []
         bHasSearch = False
         bHasFilter = False
+        bDistinct = not self.strict     # Only needed when the filter joins a to-many relation
 
         # Retrieve the set of trefwoorden from the page_obj
         trefw_list = [item.id for item in page_obj]
@@ -783,48 +941,48 @@ class TrefwoordListView(ListView):
 
         # Check for aflevering being publishable
         if self.strict:
-            lstQ.append(Q(aflevering__toonbaar=True))
+            lstQ.append(toonbaar_filter())
         else:
-            lstQ.append(Q(entry__aflevering__toonbaar=True))
+            lstQ.append(toonbaar_filter("entry__"))
 
         # Check for dialectwoord
         if 'dialectwoord' in get and get['dialectwoord'] != '':
-            val = adapt_search(get['dialectwoord'])
+            val = get['dialectwoord']
             # Adapt Entry filter
             if self.strict:
-                lstQ.append(Q(woord__iregex=val))
+                wildcard_add(lstQ, 'woord', val, ('woord', 'entry'), fold=self.ignore_accents)
             else:
-                lstQ.append(Q(entry__woord__iregex=val))
+                wildcard_add(lstQ, 'entry__woord', val, fold=self.ignore_accents)
             bHasFilter = True
 
         # Check for lemma
         if 'lemma' in get and get['lemma'] != '':
-            val = adapt_search(get['lemma'])
+            val = get['lemma']
             # Adapt Entry filter
             if self.strict:
-                lstQ.append(Q(lemma__gloss__iregex=val))
+                wildcard_add(lstQ, 'lemma__gloss', val, ('gloss', 'entry'), fold=self.ignore_accents)
             else:
-                lstQ.append(Q(entry__lemma__gloss__iregex=val))
+                wildcard_add(lstQ, 'entry__lemma__gloss', val, fold=self.ignore_accents)
             bHasFilter = True
 
         # Check for dialect city
         if 'dialectCity' in get and get['dialectCity'] != '':
-            val = adapt_search(get['dialectCity'])
+            val = get['dialectCity']
             # Adapt Entry filter
             if self.strict:
-                lstQ.append(Q(dialect__stad__iregex=val))
+                wildcard_add(lstQ, 'dialect__stad', val, ('stad', 'entry'), fold=self.ignore_accents)
             else:
-                lstQ.append(Q(entry__dialect__stad__iregex=val))
+                wildcard_add(lstQ, 'entry__dialect__stad', val, fold=self.ignore_accents)
             bHasFilter = True
 
         # Check for dialect code (Kloeke)
         if 'dialectCode' in get and get['dialectCode'] != '':
-            val = adapt_search(get['dialectCode'])
+            val = get['dialectCode']
             # Adapt Entry filter
             if self.strict:
-                lstQ.append(Q(dialect__nieuw__iregex=val))
+                wildcard_add(lstQ, 'dialect__nieuw', val)
             else:
-                lstQ.append(Q(entry__dialect__nieuw__iregex=val))
+                wildcard_add(lstQ, 'entry__dialect__nieuw', val)
             bHasFilter = True
 
         # Check for aflevering
@@ -847,20 +1005,18 @@ class TrefwoordListView(ListView):
             if val.isdigit():
                 iVal = int(val)
                 if iVal>0:
-                    if self.strict:
-                        lstQ.append(Q(mijnlijst__id=iVal))
-                    else:
-                        lstQ.append(Q(entry__mijnlijst__id=iVal))
+                    # Use the bitmask of mijnen: only the join with EntryMijn needs DISTINCT
+                    oQ, bJoin = mijn_filter(iVal, "" if self.strict else "entry__")
+                    lstQ.append(oQ)
+                    bDistinct = bDistinct or bJoin
                     bHasFilter = True
 
         # Order: "trefwoord_woord", "lemma_gloss", "dialectopgave", "dialect_stad"
         # Make sure we apply the filter
-        qse = Entry.objects.filter(*lstQ).distinct().select_related().order_by(
-            Lower('trefwoord__woord'), 
-            'lemma__gloss',  
-            Lower('toelichting'),
-            Lower('woord'), 
-            Lower('dialect__stad'))
+        qse = Entry.objects.filter(*lstQ)
+        if bDistinct:
+            qse = qse.distinct()
+        qse = qse.select_related().order_by(*get_entry_order("trefwoord"))
         self.qEntry = qse
         return qse
         
@@ -878,6 +1034,8 @@ class TrefwoordListView(ListView):
             # Get possible user choice of 'strict'
             if 'strict' in get:
                 self.strict = (get['strict'] == "True")
+            # Get possible user choice of ignoring accents
+            self.ignore_accents = (get.get('ignoreAccents', '') == "True")
 
             lstQ = []
             bHasSearch = False
@@ -886,15 +1044,8 @@ class TrefwoordListView(ListView):
             # Fine-tuning: search string is the LEMMA
             if 'search' in get and get['search'] != '':
                 val = get['search']
-                if '*' in val or '[' in val or '?' in val or '#' in val:
-                    val = adapt_search(val)
-                    lstQ.append(Q(woord__iregex=val) )
-                else:
-                    # Strive for equality, but disregard case
-                    lstQ.append(Q(woord__iexact=val))
-                #val = adapt_search(get['search'])
-                ## Use the 'woord' attribute of Trefwoord
-                #lstQ.append(Q(woord__iregex=val) )
+                # Use the 'woord' attribute of Trefwoord (equality, prefix, wildcards: disregarding case)
+                wildcard_add(lstQ, 'woord', val, ('trefwoord', 'trefwoord'), fold=self.ignore_accents)
                 bHasSearch = True
 
                 # check for possible exact numbers having been given
@@ -903,37 +1054,37 @@ class TrefwoordListView(ListView):
 
             # Check for 'toelichting'
             if 'toelichting' in get and get['toelichting'] != '':
-                val = adapt_search(get['toelichting'])
+                val = get['toelichting']
                 # Try to get to the 'toelichting'
-                lstQ.append(Q(toelichting__iregex=val))
+                wildcard_add(lstQ, 'toelichting', val, ('trefwoord_toelichting', 'trefwoord'))
                 bHasSearch = True
 
             # Check for dialectwoord
             if 'dialectwoord' in get and get['dialectwoord'] != '':
-                val = adapt_search(get['dialectwoord'])
+                val = get['dialectwoord']
                 # Adapt Entry filter
-                lstQ.append(Q(entry__woord__iregex=val))
+                wildcard_add(lstQ, 'entry__woord', val, ('woord', 'trefwoord'), fold=self.ignore_accents)
                 bHasFilter = True
 
             # Check for lemma
             if 'lemma' in get and get['lemma'] != '':
-                val = adapt_search(get['lemma'])
+                val = get['lemma']
                 # Adapt Entry filter
-                lstQ.append(Q(entry__lemma__gloss__iregex=val))
+                wildcard_add(lstQ, 'entry__lemma__gloss', val, ('gloss', 'trefwoord'), fold=self.ignore_accents)
                 bHasFilter = True
 
             # Check for dialect city
             if 'dialectCity' in get and get['dialectCity'] != '':
-                val = adapt_search(get['dialectCity'])
+                val = get['dialectCity']
                 # Adapt Entry filter
-                lstQ.append(Q(entry__dialect__stad__iregex=val))
+                wildcard_add(lstQ, 'entry__dialect__stad', val, ('stad', 'trefwoord'), fold=self.ignore_accents)
                 bHasFilter = True
 
             # Check for dialect code (Kloeke)
             if 'dialectCode' in get and get['dialectCode'] != '':
-                val = adapt_search(get['dialectCode'])
+                val = get['dialectCode']
                 # Adapt Entry filter
-                lstQ.append(Q(entry__dialect__nieuw__iregex=val))
+                wildcard_add(lstQ, 'entry__dialect__nieuw', val)
                 bHasFilter = True
 
             # Check for aflevering
@@ -953,7 +1104,7 @@ class TrefwoordListView(ListView):
                 if val.isdigit():
                     iVal = int(val)
                     if iVal>0:
-                        lstQ.append(Q(entry__mijnlijst__id=iVal))
+                        lstQ.append(mijn_filter(iVal, "entry__")[0])
                         bHasFilter = True
 
             # Debugging: time
@@ -962,11 +1113,13 @@ class TrefwoordListView(ListView):
             # Debugging: mesaure time
             if self.bDoTime: iStart = get_now_time()
 
-            # Figure out which trefwoorden to exclude
-            trefwoord_exclude = Trefwoord.objects.filter(toonbaar=0)
-
             # Create a QSE
-            qse = Trefwoord.objects.exclude(id__in=trefwoord_exclude).filter(*lstQ).select_related().order_by(Lower('woord')).distinct()
+            # Order on the (indexed) lower-case woord, and on the id to make keyset paging possible
+            if wildcard_ready():
+                lOrder = ['woord_lower', 'id']
+            else:
+                lOrder = [Lower('woord'), 'id']
+            qse = Trefwoord.objects.filter(toonbaar=True).filter(*lstQ).select_related().order_by(*lOrder).distinct()
 
             # Debugging: time
             if self.bDoTime: 
@@ -975,9 +1128,10 @@ class TrefwoordListView(ListView):
 
             # Note the number of ITEMS we have
             #   (The nature of these items depends on the approach taken)
-            # self.entrycount = qse.count()
-            # Using 'len' is faster since [qse] is being actually used again
-            self.entrycount = len(qse)
+            # Use the search snapshot: pages and count are served from the (cached) ordered ids
+            #   (the ordered ids are taken from the columnar index, where possible)
+            qse = get_snapshot("trefwoord", get, qse, lambda iGeneration: columnar_select("trefwoord", get, self.ignore_accents, iGeneration))
+            self.entrycount = qse.count()
 
             # Debugging: time
             if self.bDoTime: 
@@ -992,7 +1146,7 @@ class TrefwoordListView(ListView):
         return qse
 
 
-class LemmaListView(ListView):
+class LemmaListView(ConditionalView, ListView):
     """ListView of lemma's"""
 
     model = Lemma
@@ -1009,6 +1163,7 @@ class LemmaListView(ListView):
     qEntry = None
     qs = None
     strict = True      # Use strict filtering ALWAYS
+    ignore_accents = False  # Disregard case and accents when searching
 
     def get_qs(self):
         """Get the Entry elements that are selected"""
@@ -1019,6 +1174,8 @@ class LemmaListView(ListView):
             else:
                 # Get the Lemma PKs
                 qs = self.get_queryset()
+                # The search snapshot only holds ids: use its (lazy) queryset
+                qs = getattr(qs, 'queryset', qs)
             # Get the Entry queryset related to this
             qs = Entry.objects.filter(lemma__pk__in=qs).select_related()
         else:
@@ -1030,15 +1187,15 @@ class LemmaListView(ListView):
         if 'Csv' in self.request.GET.get('submit_type', ''):
             """ Provide CSV response"""
             
-            return export_csv(self.get_qs(), 'begrippen')
+            return export_csv(self.get_qs(), 'begrippen', self.request)
         elif 'Excel' in self.request.GET.get('submit_type', ''):
             """ Provide Excel response"""
 
-            return export_xlsx(self.get_qs(), 'begrippen')
+            return export_xlsx(self.get_qs(), 'begrippen', self.request)
         elif 'Html' in self.request.GET.get('submit_type', ''):
             """ Provide Html response"""
 
-            return export_html(self.get_qs(), 'begrippen')
+            return export_html(self.get_qs(), 'begrippen', self.request)
 
         else:
             iStart = get_now_time()
@@ -1082,6 +1239,9 @@ class LemmaListView(ListView):
                 print("LemmaListView context [b]: {:.1f}".format( get_now_time() - iStart))
 
             oData['html'] = sText
+            # Pass on the tokens for keyset paging
+            oData['next'] = context.get('keyset_next')
+            oData['previous'] = context.get('keyset_previous')
             oData['status'] = "ok"
         except:
             oData['msg'] = oErr.get_error_message()
@@ -1130,6 +1290,11 @@ class LemmaListView(ListView):
         # Make sure the paginate-values are available
         context['paginateValues'] = paginateValues
 
+        # Tokens for keyset paging to the next and the previous page
+        sField = self.get_keyset_field()
+        if sField != None and context.get('page_obj') != None:
+            context['keyset_next'], context['keyset_previous'] = get_keyset_tokens(context['page_obj'], sField)
+
         if 'paginate_by' in initial:
             context['paginateSize'] = int(initial['paginate_by'])
             self.paginate_by = int(initial['paginate_by'])
@@ -1141,7 +1306,7 @@ class LemmaListView(ListView):
             if 'mijn' in initial:
                 mijn_id = int(initial['mijn'])
                 context['mijnkeuze'] = mijn_id
-                mijn_inst = Mijn.objects.filter(id=mijn_id).first()
+                mijn_inst = get_mijn(mijn_id)
                 if mijn_inst == None:
                     context['mijnnaam'] = ''
                 else:
@@ -1152,7 +1317,7 @@ class LemmaListView(ListView):
         # Process and retain the choice for Aflevering
         if 'aflevering' in initial:
             context['aflkeuze'] = int(initial['aflevering'])
-            afl = Aflevering.objects.filter(id=context['aflkeuze']).first()
+            afl = get_aflevering(context['aflkeuze'])
             if afl == None:
                 context['afl'] = ''
             else:
@@ -1168,8 +1333,8 @@ class LemmaListView(ListView):
         context['title'] = "{} begrippen".format(THIS_DICTIONARY)
 
         # Set the afleveringen that are available
-        context['afleveringen'] = [afl for afl in Aflevering.objects.all()]
-        context['mijnen'] = [mijn for mijn in Mijn.objects.all().order_by('naam')]
+        context['afleveringen'] = get_afleveringen()
+        context['mijnen'] = get_mijnen()
 
         # Pass on the word-order boolean
         context['order_word_toel'] = self.bOrderWrdToel
@@ -1182,44 +1347,20 @@ class LemmaListView(ListView):
         # If we are in 'strict' mode, we need to deliver the [qlist]
         if self.strict:
 
-            # Transform the paginated queryset into a dict sorted by Dialect/Aflevering
-            lAflev = self.get_qafl(context)
-            if self.bDoTime:
-                print("LemmaListView context get_qafl(): {:.1f}".format( get_now_time() - iStart))
-                # Reset the time
-                iStart = get_now_time()
-
-            lastDescr = None
-            # Get a list with 'first' and 'last' values for each item in the current paginated queryset
+            # Group the entries of the current page by lemma, trefwoord, toelichting and dialectopgave
             lEntry = self.get_qlist(context)
             if self.bDoTime:
                 print("LemmaListView context get_qlist(): {:.1f}".format( get_now_time() - iStart))
                 # Reset the time
                 iStart = get_now_time()
 
-            # Add the sorted-dialect information to lEntry
-            for idx, item in enumerate(lEntry):
-                # Start or Finish dialect information
-                if item['lemma_gloss']['first']:
-                    qsa = []
-                    # start a list of all lemma-descriptions taken from the entries belonging to one particular lemma
-                    lemma_descr_list = []
-                # All: add this entry
-                qsa.append(lAflev[idx])
-                # If not already present: add description
-                iDescrId = item['entry'].descr.id
-                if iDescrId not in lemma_descr_list:
-                    lemma_descr_list.append(iDescrId)
-                if item['lemma_gloss']['last']:
-                    # COpy the list of Entry elements sorted by Lemma/Aflevering here
-                    lEntry[idx]['alist'] = qsa
-                    # OLD: lEntry[idx]['dlist'] = self.get_qdescr(item['entry'])
-                    lEntry[idx]['dlist'] = self.get_qdescrlist(lemma_descr_list)
-                else:
-                    lEntry[idx]['alist'] = None
-                    lEntry[idx]['dlist'] = None
+            # Add the afleveringen and the descriptions to each lemma
+            set_afl_lists(lEntry)
+            set_descr_lists(lEntry)
 
             context['qlist'] = lEntry
+            # The rendered lemma blocks are cached
+            set_fragment_key(context, "lemma", initial)
         # Finish measuring context time
         if self.bDoTime:
             print("LemmaListView context: {:.1f}".format( get_now_time() - iStart))
@@ -1231,96 +1372,41 @@ class LemmaListView(ListView):
         return context
 
     def get_qlist(self, context):
-        """Get a list of Entry elements + first/last information"""
-
-        # REtrieve the correct queryset, as determined by paginate_by
-        qs = context['object_list']
-        # Start the output
-        html = []
-        # Initialize the variables whose changes are important
-        if self.bOrderWrdToel:
-            lVars = ["lemma_gloss", "trefwoord_woord", "dialectopgave", "toelichting", "dialect_stad"]
-            lFuns = [["lemma", "gloss"], ["trefwoord", "woord"], Entry.dialectopgave, Entry.get_toelichting, ["dialect", "stad"]]
-        else:
-            lVars = ["lemma_gloss", "trefwoord_woord", "toelichting", "dialectopgave", "dialect_stad"]
-            lFuns = [["lemma", "gloss"], ["trefwoord", "woord"], Entry.get_toelichting, Entry.dialectopgave, ["dialect", "stad"]]
-        # Get a list of items containing 'first' and 'last' information
-        lItem = get_item_list(lVars, lFuns, qs)
-        # REturn this list
-        return lItem
-
-    def get_qafl(self, context):
-        """Sort the paginated QS by Lemma/Aflevering into a list"""
-
-        bMethodQset = False
+        """Get the entries of the current page grouped by lemma"""
 
         # REtrieve the correct queryset, as determined by paginate_by
         qs = context['object_list']
+        # The keys of the (nested) groups (the same for both word orders)
+        lSpec = ["lemma.gloss", "trefwoord.woord", Entry.get_toelichting, Entry.dialectopgave]
+        # Get the list of lemma groups
+        return group_entries(qs, lSpec)
 
-        if bMethodQset:
-            # Create a list of entry ids
-            id_list = [item.id for item in qs]
-
-            # Create the correctly sorted queryset
-            qsd = Entry.objects.filter(Q(id__in=id_list)).select_related().order_by(
-                'lemma__gloss', 
-                'aflevering__deel__nummer', 
-                'aflevering__sectie', 
-                'aflevering__aflnum')
-        else:
-            # qsd = copy.copy(qs)
-            # Force evaluation
-            qsd = list(qs)
-            # Now sort the resulting set
-            qsd = sorted(qsd, key=lambda el: (el.lemma.gloss, el.get_aflevering()) )
-
-        # Prepare for processing
-        lVarsD = ["lem", "afl"]
-        lFunsD = [["lemma", "gloss"], Entry.get_aflevering]
-        # Create a list of the items
-        lAfl = get_item_list(lVarsD, lFunsD, qsd)
-        # Return the result
-        return lAfl            
-
-    def get_qdescr(self, entry):
-        """OLD: Sort the paginated QS by Lemma/lmdescr.toelichting into a list"""
-
-        # Get the sorted set of [lmdescr] objects for this lemma
-        #qsd = []
-        ## Walk through the query set
-        #for d in entry.lemma.lmdescr.order_by(Lower('toelichting'), Lower('bronnenlijst')): qsd.append(d)
-        qsd = [d for d in entry.lemma.lmdescr.order_by(Lower('toelichting'), 'bronnenlijst')]
-        # Prepare for processing
-        lVarsD = ["descr", "bronnen"]
-        lFunsD = [["toelichting"], ["bronnenlijst"]]
-        # Create a list of the items
-        lDescr = get_item_list(lVarsD, lFunsD, qsd)
-        # Return the result
-        return lDescr            
-      
-    def get_qdescrlist(self, descr_id_list):
-        """Sort the paginated QS by Lemma/lmdescr.toelichting into a list"""
-
-        # Make a query that gets the indicated id's
-        qsd = Description.objects.filter(Q(id__in=descr_id_list)).order_by(Lower('toelichting'), Lower('bronnenlijst'))
-        # Prepare for processing
-        lVarsD = ["descr", "bronnen"]
-        lFunsD = [["toelichting"], ["bronnenlijst"]]
-        # Create a list of the items
-        lDescr = get_item_list(lVarsD, lFunsD, qsd)
-        # Return the result
-        return lDescr            
-      
     def get_paginate_by(self, queryset):
         """
         Paginate by specified value in querystring, or use default class property value.
         """
         return self.request.GET.get('paginate_by', self.paginate_by)
-        
+
+    def get_keyset_field(self):
+        """Get the indexed sort key used for keyset paging (if available)"""
+        return "gloss"
+
+    def paginate_queryset(self, queryset, page_size):
+        """Use keyset paging if a page token ('after' or 'before') has been passed on"""
+
+        get = self.request.GET if self.request.method == "GET" else self.request.POST
+        sField = self.get_keyset_field()
+        if sField != None and hasattr(queryset, 'queryset'):
+            oPage = get_keyset_page(queryset.queryset, sField, get, page_size, queryset.count())
+            if oPage != None:
+                return (oPage.paginator, oPage, oPage.object_list, oPage.has_other_pages())
+        return super(LemmaListView, self).paginate_queryset(queryset, page_size)
+
     def get_entryset(self, page_obj):
         lstQ = []
         bHasSearch = False
         bHasFilter = False
+        bDistinct = not self.strict     # Only needed when the filter joins a to-many relation
 
         # Initialize timer
         if self.bDoTime: iStart = get_now_time()
@@ -1339,29 +1425,29 @@ class LemmaListView(ListView):
 
         # Check for dialect city
         if 'dialectCity' in get and get['dialectCity'] != '':
-            val = adapt_search(get['dialectCity'])
+            val = get['dialectCity']
             if self.strict:
-                lstQ.append(Q(dialect__stad__iregex=val))
+                wildcard_add(lstQ, 'dialect__stad', val, ('stad', 'entry'), fold=self.ignore_accents)
             else:
-                lstQ.append(Q(entry__dialect__stad__iregex=val))
+                wildcard_add(lstQ, 'entry__dialect__stad', val, fold=self.ignore_accents)
             bHasFilter = True
 
         # Check for dialect code (Kloeke)
         if 'dialectCode' in get and get['dialectCode'] != '':
-            val = adapt_search(get['dialectCode'])
+            val = get['dialectCode']
             if self.strict:
-                lstQ.append(Q(dialect__nieuw__iregex=val))
+                wildcard_add(lstQ, 'dialect__nieuw', val)
             else:
-                lstQ.append(Q(entry__dialect__nieuw__iregex=val))
+                wildcard_add(lstQ, 'entry__dialect__nieuw', val)
             bHasFilter = True
 
         # Check for dialect word, which is a direct member of Entry
         if 'woord' in get and get['woord'] != '':
-            val = adapt_search(get['woord'])
+            val = get['woord']
             if self.strict:
-                lstQ.append(Q(woord__iregex=val))
+                wildcard_add(lstQ, 'woord', val, ('woord', 'entry'), fold=self.ignore_accents)
             else:
-                lstQ.append(Q(entry__woord__iregex=val))
+                wildcard_add(lstQ, 'entry__woord', val, fold=self.ignore_accents)
             bHasFilter = True
 
         # Check for aflevering
@@ -1384,37 +1470,30 @@ class LemmaListView(ListView):
             if val.isdigit():
                 iVal = int(val)
                 if iVal>0:
-                    if self.strict:
-                        lstQ.append(Q(mijnlijst__id=iVal))
-                    else:
-                        lstQ.append(Q(entry__mijnlijst__id=iVal))
+                    # Use the bitmask of mijnen: only the join with EntryMijn needs DISTINCT
+                    oQ, bJoin = mijn_filter(iVal, "" if self.strict else "entry__")
+                    lstQ.append(oQ)
+                    bDistinct = bDistinct or bJoin
                     bHasFilter = True
 
-        # Make sure we filter on aflevering.toonbaar
+        # Make sure we filter on aflevering.toonbaar (copied into the entry)
         if self.strict:
-            lstQ.append(Q(aflevering__toonbaar=True))
+            lstQ.append(toonbaar_filter())
         else:
-            lstQ.append(Q(entry__aflevering__toonbaar=True))
+            lstQ.append(toonbaar_filter("entry__"))
 
         if self.bDoTime: print("LemmaListView get_entryset part 2: {:.1f}".format(get_now_time() - iStart))
 
         # Make the QSE available
         # Order: "lemma_gloss", "trefwoord_woord", "dialectopgave", "dialect_stad"
         if self.bDoTime: iStart = get_now_time()
+        qse = Entry.objects.filter(*lstQ)
+        if bDistinct:
+            qse = qse.distinct()
         if self.bOrderWrdToel:
-            qse = Entry.objects.filter(*lstQ).distinct().select_related().order_by(
-                Lower('lemma__gloss'),  
-                Lower('trefwoord__woord'), 
-                Lower('woord'), 
-                Lower('toelichting'), 
-                Lower('dialect__stad'))
+            qse = qse.select_related().order_by(*get_entry_order("lemma_wrdtoel"))
         else:
-            qse = Entry.objects.filter(*lstQ).distinct().select_related().order_by(
-                Lower('lemma__gloss'),  
-                Lower('trefwoord__woord'), 
-                Lower('toelichting'), 
-                Lower('woord'), 
-                Lower('dialect__stad'))
+            qse = qse.select_related().order_by(*get_entry_order("lemma"))
         if self.bDoTime: print("LemmaListView get_entryset part 3: {:.1f}".format(get_now_time() - iStart))
         # x = str(Entry.objects.filter(*lstQ).distinct().select_related().query)
         self.qEntry = qse
@@ -1432,6 +1511,8 @@ class LemmaListView(ListView):
         # Get possible user choice of 'strict'
         if 'strict' in get:
             self.strict = (get['strict'] == "True")
+        # Get possible user choice of ignoring accents
+        self.ignore_accents = (get.get('ignoreAccents', '') == "True")
 
         lstQ = []
         bHasSearch = False
@@ -1440,12 +1521,8 @@ class LemmaListView(ListView):
         # Fine-tuning: search string is the LEMMA
         if 'search' in get and get['search'] != '':
             val = get['search']
-            if '*' in val or '[' in val or '?' in val or '#' in val:
-                val = adapt_search(val)
-                lstQ.append(Q(gloss__iregex=val) )
-            else:
-                # Strive for equality, but disregard case
-                lstQ.append(Q(gloss__iexact=val))
+            # Equality, prefix or wildcards: disregarding case
+            wildcard_add(lstQ, 'gloss', val, ('gloss', 'lemma'), fold=self.ignore_accents)
             bHasSearch = True
 
             ## check for possible exact numbers having been given
@@ -1455,30 +1532,19 @@ class LemmaListView(ListView):
         # Check for dialect city
         if 'dialectCity' in get and get['dialectCity'] != '':
             val = get['dialectCity']
-            if '*' in val or '[' in val or '?' in val or '#' in val:
-                # val = adapt_search(get['dialectCity'])
-                val = adapt_search(val)
-                lstQ.append(Q(entry__dialect__stad__iregex=val))
-            else:
-                # Strive for equality, but disregard case
-                lstQ.append(Q(entry__dialect__stad__iexact=val))
+            wildcard_add(lstQ, 'entry__dialect__stad', val, ('stad', 'lemma'), fold=self.ignore_accents)
             bHasFilter = True
 
         # Check for dialect code (Kloeke)
         if 'dialectCode' in get and get['dialectCode'] != '':
             val = get['dialectCode']
-            if '*' in val or '[' in val or '?' in val or '#' in val:
-                val = adapt_search(val)
-                lstQ.append(Q(entry__dialect__nieuw__iregex=val))
-            else:
-                # Strive for equality, but disregard case
-                lstQ.append(Q(entry__dialect__nieuw__iexact=val))
+            wildcard_add(lstQ, 'entry__dialect__nieuw', val)
             bHasFilter = True
 
         # Check for dialect word, which is a direct member of Entry
         if 'woord' in get and get['woord'] != '':
-            val = adapt_search(get['woord'])
-            lstQ.append(Q(entry__woord__iregex=val))
+            val = get['woord']
+            wildcard_add(lstQ, 'entry__woord', val, ('woord', 'lemma'), fold=self.ignore_accents)
             bHasFilter = True
 
         # Check for aflevering
@@ -1498,13 +1564,12 @@ class LemmaListView(ListView):
             if val.isdigit():
                 iVal = int(val)
                 if iVal>0:
-                    lstQ.append(Q(entry__mijnlijst__id=iVal))
+                    lstQ.append(mijn_filter(iVal, "entry__")[0])
                     bHasFilter = True
 
         # Method #8 -- use the lemma.toonbaar property
-        lemma_hide = Lemma.objects.filter(toonbaar=0)
-
-        qse = Lemma.objects.exclude(id__in=lemma_hide).filter(*lstQ).select_related().order_by('gloss').distinct()
+        # Order on the (indexed) gloss, and on the id to make keyset paging possible
+        qse = Lemma.objects.filter(toonbaar=True).filter(*lstQ).select_related().order_by('gloss', 'id').distinct()
 
         # Time measurement
         if self.bDoTime:
@@ -1513,9 +1578,10 @@ class LemmaListView(ListView):
 
         # Note the number of ITEMS we have
         #   (The nature of these items depends on the approach taken)
-        # self.entrycount = qse.count()
-        # Note: while taking more time here, it saves time later
-        self.entrycount = len(qse)
+        # Use the search snapshot: pages and count are served from the (cached) ordered ids
+        #   (the ordered ids are taken from the columnar index, where possible)
+        qse = get_snapshot("lemma", get, qse, lambda iGeneration: columnar_select("lemma", get, self.ignore_accents, iGeneration))
+        self.entrycount = qse.count()
 
         # Time measurement
         if self.bDoTime:
@@ -1527,7 +1593,7 @@ class LemmaListView(ListView):
         return qse
 
 
-class LemmaMapView(MapView):
+class LemmaMapView(ConditionalView, MapView):
     model = Lemma
     modEntry = Entry
     frmSearch = LemmaSearchForm
@@ -1536,17 +1602,59 @@ class LemmaMapView(MapView):
 
     def initialize(self):
         super(LemmaMapView, self).initialize()
-        # Entries with a 'form' value
-        self.add_entry('woord', 'str', 'woord', 'woord')
-        self.add_entry('stad', 'str', 'dialect__stad', 'dialectCity')
-        self.add_entry('kloeke', 'str', 'dialect__nieuw', 'dialectCode')
-        self.add_entry('aflevering', 'int', 'aflevering__id', 'aflevering')
-        self.add_entry('mijn', 'int', 'mijnlijst__id', 'mijn')
+        if entrysearch_ready():
+            # Read the flattened search rows (these only hold the visible entries)
+            self.modEntry = EntrySearch
+            # Entries with a 'form' value
+            self.add_entry('woord', 'str', 'woord', 'woord')
+            self.add_entry('stad', 'str', 'stad', 'dialectCity')
+            self.add_entry('kloeke', 'str', 'nieuw', 'dialectCode')
+            self.add_entry('aflevering', 'int', 'aflevering__id', 'aflevering')
+            self.add_entry('mijn', 'int', 'mijnen', 'mijn')
+
+            # Entries without a 'form' value
+            self.add_entry('trefwoord', 'str', 'trefwoord_woord')
+            self.add_entry('point', 'str', 'point')
+            self.add_entry('place', 'str', 'place')
+        else:
+            self.modEntry = Entry
+            # Entries with a 'form' value
+            self.add_entry('woord', 'str', 'woord', 'woord')
+            self.add_entry('stad', 'str', 'dialect__stad', 'dialectCity')
+            self.add_entry('kloeke', 'str', 'dialect__nieuw', 'dialectCode')
+            self.add_entry('aflevering', 'int', 'aflevering__id', 'aflevering')
+            self.add_entry('mijn', 'int', 'mijnlijst__id', 'mijn')
+
+            # Entries without a 'form' value
+            self.add_entry('trefwoord', 'str', 'trefwoord__woord')
+            self.add_entry('point', 'str', 'dialect__coordinate__point')
+            self.add_entry('place', 'str', 'dialect__coordinate__place')
+
+    def query_search(self, lstQ, path, val):
+        """Add the (index-based) filter for [val] on [path], possibly with full-text pre-selection"""
+
+        bFold = (self.request.POST.get('ignoreAccents', '') == "True")
+        if path == "woord":
+            wildcard_add(lstQ, path, val, ('woord', 'entry'), fold=bFold)
+        elif path in ["stad", "dialect__stad"]:
+            wildcard_add(lstQ, path, val, ('stad', 'entry'), fold=bFold)
+        else:
+            wildcard_add(lstQ, path, val)
+        return lstQ
 
-        # Entries without a 'form' value
-        self.add_entry('trefwoord', 'str', 'trefwoord__woord')
-        self.add_entry('point', 'str', 'dialect__coordinate__point')
-        self.add_entry('place', 'str', 'dialect__coordinate__place')
+    def query_number(self, lstQ, path, iVal):
+        """Filter the mijn on the bitmask of the search rows"""
+
+        if path == "mijnen":
+            iMask = Mijn.get_mask(iVal)
+            if iMask == None:
+                # This mijn has no bit of its own
+                lstQ.append(Q(entry__mijnlijst__id=iVal))
+            else:
+                lstQ.append(Q(mijnen__hasbits=iMask))
+        else:
+            lstQ.append(Q(**{path: iVal}))
+        return lstQ
 
     def get_popup(self, entry):
         """Create a popup from the 'key' values defined in [initialize()]"""
@@ -1558,7 +1666,7 @@ class LemmaMapView(MapView):
         return pop_up
     
 
-class LocationListView(ListView):
+class LocationListView(ConditionalView, ListView):
     """Listview of locations"""
 
     model = Dialect     # The LocationListView uses [Dialect]
@@ -1573,6 +1681,7 @@ class LocationListView(ListView):
     qAll = None         # Ordered queryset of ALL
     qs = None           # Current queryset (for speeding up)
     strict = True       # Use strict filtering ALWAYS
+    ignore_accents = False  # Disregard case and accents when searching
     bDoTime = False      # Use timing to determine what goes fastest
 
     def get_qs(self):
@@ -1585,6 +1694,8 @@ class LocationListView(ListView):
             else:
                 # Calculate the  PKs
                 qs = self.get_queryset()
+                # The search snapshot only holds ids: use its (lazy) queryset
+                qs = getattr(qs, 'queryset', qs)
             # Get the Entry elements that refer to the set of dialects
             if not self.strict:
                 # Convert the [Dialect] elements in qs to [Entry] elements
@@ -1597,14 +1708,14 @@ class LocationListView(ListView):
         """Check if a CSV response is needed or not"""
         if 'Csv' in self.request.GET.get('submit_type', ''):
             """ Provide CSV response"""
-            return export_csv(self.get_qs(), 'plaatsen')
+            return export_csv(self.get_qs(), 'plaatsen', self.request)
 
         elif 'Excel' in self.request.GET.get('submit_type', ''):
             """ Provide Excel response"""
-            return export_xlsx(self.get_qs(), 'plaatsen')
+            return export_xlsx(self.get_qs(), 'plaatsen', self.request)
         elif 'Html' in self.request.GET.get('submit_type', ''):
             """ Provide Html response"""
-            return export_html(self.get_qs(), 'plaatsen')
+            return export_html(self.get_qs(), 'plaatsen', self.request)
         else:
             return super(LocationListView, self).render_to_response(context, **response_kwargs)
 
@@ -1640,15 +1751,20 @@ class LocationListView(ListView):
         # Make sure the paginate-values are available
         context['paginateValues'] = paginateValues
 
+        # Tokens for keyset paging to the next and the previous page
+        sField = self.get_keyset_field()
+        if sField != None and context.get('page_obj') != None:
+            context['keyset_next'], context['keyset_previous'] = get_keyset_tokens(context['page_obj'], sField)
+
         if self.bDoTime:
             print("LocationListView context part 0: {:.1f}".format( get_now_time() - iStart))
             # Reset the time
             iStart = get_now_time()
 
         # Set the afleveringen that are available
-        context['afleveringen'] = [afl for afl in Aflevering.objects.all()]
+        context['afleveringen'] = get_afleveringen()
 
-        context['mijnen'] = [mijn for mijn in Mijn.objects.all().order_by('naam')]
+        context['mijnen'] = get_mijnen()
 
         if 'paginate_by' in initial:
             context['paginateSize'] = int(initial['paginate_by'])
@@ -1667,7 +1783,7 @@ class LocationListView(ListView):
             if 'mijn' in initial:
                 mijn_id = int(initial['mijn'])
                 context['mijnkeuze'] = mijn_id
-                mijn_inst = Mijn.objects.filter(id=mijn_id).first()
+                mijn_inst = get_mijn(mijn_id)
                 if mijn_inst == None:
                     context['mijnnaam'] = ''
                 else:
@@ -1678,7 +1794,7 @@ class LocationListView(ListView):
 
         if 'aflevering' in initial:
             context['aflkeuze'] = int(initial['aflevering'])
-            afl = Aflevering.objects.filter(id=context['aflkeuze']).first()
+            afl = get_aflevering(context['aflkeuze'])
             if afl == None:
                 context['afl'] = ''
             else:
@@ -1701,14 +1817,7 @@ class LocationListView(ListView):
         context['strict'] = str(self.strict)
 
         if self.strict:
-            # Transform the paginated queryset into a dict sorted by Dialect/Aflevering
-            lDialect = self.get_qafl(context)
-            if self.bDoTime:
-                print("LocationListView context get_qafl(): {:.1f}".format( get_now_time() - iStart))
-                # Reset the time
-                iStart = get_now_time()
-
-            # Get a list with 'first' and 'last' values for each item in the current paginated queryset
+            # Group the entries of the current page by dialect, lemma and trefwoord
             lEntry = self.get_qlist(context)
 
             if self.bDoTime:
@@ -1716,19 +1825,8 @@ class LocationListView(ListView):
                 # Reset the time
                 iStart = get_now_time()
 
-            # Add the sorted-dialect information to lEntry
-            for idx, item in enumerate(lEntry):
-                # Start or Finish dialect information
-                if item['dialect_stad']['first']:
-                    iDialectStart = idx
-                    qsa = []
-                # All: add this entry
-                qsa.append(lDialect[idx])
-                if item['dialect_stad']['last']:
-                    # COpy the list of Entry elements sorted by Stad/Aflevering here
-                    lEntry[idx]['alist'] = qsa
-                else:
-                    lEntry[idx]['alist'] = None
+            # Add the afleveringen to each dialect
+            set_afl_lists(lEntry)
 
             context['qlist'] = lEntry
 
@@ -1740,47 +1838,43 @@ class LocationListView(ListView):
         return context
       
     def get_qlist(self, context):
-        """Calculate HTML output for the query-set in the context"""
-
-        # REtrieve the correct queryset, as determined by paginate_by
-        qs = context['object_list']
-        # Start the output
-        html = []
-        # Initialize the variables whose changes are important
-        lVars = ["dialect_stad", "lemma_gloss", "trefwoord_woord","toelichting", "dialectopgave"]
-        lFuns = [["dialect", "stad"], ["lemma", "gloss"], ["trefwoord", "woord"], Entry.get_toelichting, Entry.dialectopgave]
-        # Get a list of items containing 'first' and 'last' information
-        lItem = get_item_list(lVars, lFuns, qs)
-        # REturn this list
-        return lItem
-
-    def get_qafl(self, context):
-        """Sort the paginated QS by Dialect/Aflevering and turn into a dict"""
+        """Get the entries of the current page grouped by dialect"""
 
         # REtrieve the correct queryset, as determined by paginate_by
         qs = context['object_list']
-        qsd = list(qs)
-        # Now sort the resulting set
-        qsd = sorted(qsd, key=lambda el: el.dialect.stad + " " + el.get_aflevering())
-
-        # Prepare for dialect processing
-        lVarsD = ["stad", "afl"]
-        lFunsD = [["dialect", "stad"], Entry.get_aflevering]
-        # Create a list of Dialect items
-        lDialect = get_item_list(lVarsD, lFunsD, qsd)
-        # Return the result
-        return lDialect            
+        # The keys of the (nested) groups
+        lSpec = ["dialect.stad", "lemma.gloss", "trefwoord.woord"]
+        # Get the list of dialect groups
+        return group_entries(qs, lSpec)
 
     def get_paginate_by(self, queryset):
         """
         Paginate by specified value in querystring, or use default class property value.
         """
         return self.request.GET.get('paginate_by', self.paginate_by)
-        
+
+    def get_keyset_field(self):
+        """Get the indexed sort key used for keyset paging (if available)"""
+        if wildcard_ready():
+            return "stad_lower"
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        """Use keyset paging if a page token ('after' or 'before') has been passed on"""
+
+        get = self.request.GET if self.request.method == "GET" else self.request.POST
+        sField = self.get_keyset_field()
+        if sField != None and hasattr(queryset, 'queryset'):
+            oPage = get_keyset_page(queryset.queryset, sField, get, page_size, queryset.count())
+            if oPage != None:
+                return (oPage.paginator, oPage, oPage.object_list, oPage.has_other_pages())
+        return super(LocationListView, self).paginate_queryset(queryset, page_size)
+
     def get_entryset(self, page_obj):
         lstQ = []
         bHasSearch = False
         bHasFilter = False
+        bDistinct = False     # Only needed when the filter joins a to-many relation
 
         # Time measurement
         if self.bDoTime: iStart = get_now_time()
@@ -1789,8 +1883,8 @@ class LocationListView(ListView):
         dialect_list = [item.id for item in page_obj]
         lstQ.append(Q(dialect__id__in=dialect_list))
 
-        # Make sure we filter on aflevering.toonbaar
-        lstQ.append(Q(aflevering__toonbaar=True))
+        # Make sure we filter on aflevering.toonbaar (copied into the entry)
+        lstQ.append(toonbaar_filter())
 
         # Time measurement
         if self.bDoTime:
@@ -1817,19 +1911,19 @@ class LocationListView(ListView):
             if val.isdigit():
                 iVal = int(val)
                 if iVal>0:
-                    lstQ.append(Q(mijnlijst__id=iVal) )
+                    # Use the bitmask of mijnen: only the join with EntryMijn needs DISTINCT
+                    oQ, bDistinct = mijn_filter(iVal)
+                    lstQ.append(oQ)
                     bHasFilter = True
 
         bUseLower = True
+        qse = Entry.objects.filter(*lstQ)
+        if bDistinct:
+            qse = qse.distinct()
         if bUseLower:
-            qse = Entry.objects.filter(*lstQ).distinct().select_related().order_by(
-                Lower('dialect__stad'),
-                'lemma__gloss',  
-                Lower('trefwoord__woord'), 
-                Lower('toelichting'), 
-                Lower('woord'))
+            qse = qse.select_related().order_by(*get_entry_order("location"))
         else:
-            qse = Entry.objects.filter(*lstQ).distinct().select_related().order_by(
+            qse = qse.select_related().order_by(
                 'dialect__stad',
                 'lemma__gloss',  
                 'trefwoord__woord', 
@@ -1865,6 +1959,8 @@ class LocationListView(ListView):
         # Get possible user choice of 'strict'
         if 'strict' in get:
             self.strict = (get['strict'] == "True")
+        # Get possible user choice of ignoring accents
+        self.ignore_accents = (get.get('ignoreAccents', '') == "True")
 
         # Queryset: build a list of requirements
         lstQ = []
@@ -1873,19 +1969,14 @@ class LocationListView(ListView):
 
         # Fine-tuning: search string is the STAD
         if 'search' in get and get['search'] != '':
-            val = adapt_search(get['search'])
-            lstQ.append(Q(stad__iregex=val) )
+            val = get['search']
+            wildcard_add(lstQ, 'stad', val, ('stad', 'dialect'), fold=self.ignore_accents)
             bHasSearch = True
 
-            # check for possible exact numbers having been given
-            if re.match('^\d+$', val):
-                query = query | Q(sn__exact=val)
-                lstQ.append(Q(sn__exact=val))
-
         # Check for dialect code (Kloeke)
         if 'nieuw' in get and get['nieuw'] != '':
-            val = adapt_search(get['nieuw'])
-            lstQ.append(Q(nieuw__iregex=val) )
+            val = get['nieuw']
+            wildcard_add(lstQ, 'nieuw', val)
             bHasSearch = True
 
         # Check for aflevering
@@ -1905,7 +1996,7 @@ class LocationListView(ListView):
             if val.isdigit():
                 iVal = int(val)
                 if iVal>0:
-                    lstQ.append(Q(entry__mijnlijst__id=iVal) )
+                    lstQ.append(mijn_filter(iVal, "entry__")[0])
                     bHasFilter = True
 
         # Time measurement
@@ -1913,20 +2004,23 @@ class LocationListView(ListView):
             print("LocationListView get_queryset point 'a': {:.1f}".format( get_now_time() - iStart))
             iStart = get_now_time()
 
-        # Get a list of Dialects that should be excluded
-        dialect_hide = Dialect.objects.filter(toonbaar=0)
-
         # Use the E-WBD approach: be efficient here
-        qs = Dialect.objects.exclude(id__in=dialect_hide).filter(*lstQ).distinct().select_related().order_by(Lower('stad'))
+        # Order on the (indexed) lower-case stad, and on the id to make keyset paging possible
+        if wildcard_ready():
+            lOrder = ['stad_lower', 'id']
+        else:
+            lOrder = [Lower('stad'), 'id']
+        qs = Dialect.objects.filter(toonbaar=True).filter(*lstQ).distinct().select_related().order_by(*lOrder)
 
         # Time measurement
         if self.bDoTime:
             print("LocationListView get_queryset point 'c': {:.1f}".format( get_now_time() - iStart))
             iStart = get_now_time()
 
-        # self.entrycount = qs.count()
-        # Using 'len' is faster since [qse] is being actually used again
-        self.entrycount = len(qs)
+        # Use the search snapshot: pages and count are served from the (cached) ordered ids
+        #   (the ordered ids are taken from the columnar index, where possible)
+        qs = get_snapshot("location", get, qs, lambda iGeneration: columnar_select("location", get, self.ignore_accents, iGeneration))
+        self.entrycount = qs.count()
 
         # Time measurement
         if self.bDoTime:
@@ -1946,48 +2040,21 @@ class DialectListView(ListView):
     entrycount = 0
     bDoTime = False
     bImportKloekeInfo = False
+    ignore_accents = False  # Disregard case and accents when searching
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super(DialectListView, self).get_context_data(**kwargs)
 
-        oErr = ErrHandle()
         # One-time calls
-        qs = Dialect.objects.filter(coordinate__isnull=True)
-        count_dialect = qs.count()
         if self.bImportKloekeInfo: 
             import_kloeke_cumul()
             # Another one-time call
             import_kloeke_info()
-
-        # Try to do repair
-        if count_dialect > 0:
-            with transaction.atomic():
-                for dialect in qs:
-                    # Get the kloekecode minus the last letter and the place-name
-                    kloeke_truncated = dialect.nieuw[0:4]
-                    stad = dialect.stad
-                    # Find this one in Coordinates
-                    coordinate = Coordinate.objects.filter(place__iexact=stad, kloeke__startswith=kloeke_truncated).first()
-                    if coordinate == None and "-" in stad:
-                        stad = stad.replace("-", " ")
-                        coordinate = Coordinate.objects.filter(place__iexact=stad, kloeke__startswith=kloeke_truncated).first()
-                    if coordinate != None:
-                        # ======= DEBUG ==================
-                        oErr.Status("WGD adapt {} to {}".format(dialect.nieuw, coordinate.kloeke))
-                        # ================================
-                        # Adapt the dialect's kloeke code
-                        dialect.nieuw = coordinate.kloeke
-                        # Set the dialect's coordinate entry
-                        dialect.coordinate = coordinate
-                        # Make sure the correct stad (place name) is chosen
-                        dialect.stad = stad
-                        # Save the result
-                        dialect.save()
-            count_after = Dialect.objects.filter(coordinate__isnull=True).count()
-            count_gain = count_dialect - count_after
-            if self.bDoTime:
-                oErr.Status("Count before: {}, after: {}".format(count_dialect, count_after))
+            # Link the dialects to the new coordinates
+            Dialect.match_coordinates()
+            entrysearch_update()
+            Generation.data_changed()
 
         # Get parameters for the search
         initial = self.request.GET
@@ -2029,6 +2096,8 @@ class DialectListView(ListView):
         get = self.request.GET if self.request.method == "GET" else self.request.POST
         get = get.copy()
         self.get = get
+        # Get possible user choice of ignoring accents
+        self.ignore_accents = (get.get('ignoreAccents', '') == "True")
 
         # Fix the sort-order
         get['sortOrder'] = 'stad'
@@ -2037,26 +2106,18 @@ class DialectListView(ListView):
 
         # Fine-tuning: search string is the LEMMA
         if 'search' in get and get['search'] != '':
-            val = adapt_search(get['search'])
-            query = Q(stad__iregex=val) 
-
-            # check for possible exact numbers having been given
-            if re.match('^\d+$', val):
-                query = query | Q(sn__exact=val)
-
+            val = get['search']
             # Apply the filter
-            lstQ.append(query)
+            wildcard_add(lstQ, 'stad', val, fold=self.ignore_accents)
 
         # Check for dialect code (Kloeke)
         if 'nieuw' in get and get['nieuw'] != '':
-            val = adapt_search(get['nieuw'])
-            query = Q(nieuw__iregex=val)
-            
+            val = get['nieuw']
             # Apply the filter
-            lstQ.append(query)
+            wildcard_add(lstQ, 'nieuw', val)
 
         # Calculate the final qs
-        qs = Dialect.objects.exclude(toonbaar=0).filter(*lstQ).order_by('stad').distinct()
+        qs = Dialect.objects.filter(toonbaar=True).filter(*lstQ).order_by('stad').distinct()
 
         # Time measurement
         if self.bDoTime:
@@ -2075,7 +2136,7 @@ class DialectListView(ListView):
         return qs
 
 
-class DialectMapView(MapView):
+class DialectMapView(ConditionalView, MapView):
     model = Dialect
     modEntry = Dialect
     frmSearch = DialectSearchForm
@@ -2097,6 +2158,16 @@ class DialectMapView(MapView):
         self.add_entry('place', 'str', 'coordinate__place')
         self.add_entry('count', 'int', 'count')
 
+    def query_search(self, lstQ, path, val):
+        """Add the (index-based) filter for [val] on [path], possibly with full-text pre-selection"""
+
+        bFold = (self.request.POST.get('ignoreAccents', '') == "True")
+        if path == "stad":
+            wildcard_add(lstQ, path, val, ('stad', 'dialect'), fold=bFold)
+        else:
+            wildcard_add(lstQ, path, val)
+        return lstQ
+
     def get_popup(self, dialect):
         """Create a popup from the 'key' values defined in [initialize()]"""
 
@@ -2117,26 +2188,44 @@ class DialectCheckView(ListView):
         # Retrieve the default context
         context = super(DialectCheckView, self).get_context_data(**kwargs)
 
-        def get_range(qs, d, s):
-            """Get the afleveringen belonging to d/s as a range-string"""
+        # The report is only made again when the data have changed
+        oErr = ErrHandle()
+        oReport = None
+        iGeneration = Generation.get_number()
+        try:
+            if iGeneration != None:
+                oCached = cache.get(dialectCheckKey)
+                if oCached != None and oCached['generation'] == iGeneration:
+                    oReport = oCached['report']
+        except:
+            oErr.DoError("DialectCheckView")
+        if oReport == None:
+            oReport = self.get_report()
+            if iGeneration != None:
+                cache.set(dialectCheckKey, {'generation': iGeneration, 'report': oReport}, dialectCheckSeconds)
+
+        # Add my own stuff to the context
+        context.update(oReport)
+
+        # Return the context
+        return context
+
+    def get_report(self):
+        """Calculate the lists of the report with a few grouped queries"""
+
+        def get_range(lNum, d, s):
+            """Get the (sorted) aflevering numbers [lNum] belonging to d/s as a range-string"""
 
-            lstQ = []
-            lstQ.append(Q(deel__nummer=d))
             if s != None:
-                lstQ.append(Q(sectie=s))
                 sBack = "{}/{}:".format(d,s)
             else:
                 sBack = "{}:".format(d)
-            # qsr = qs.objects.filter(*lstQ).order_by('aflnum')
-            # qsr = Aflevering.objects.filter(id__in=qs).filter(*lstQ).order_by('aflnum')
-            qsr = qs.filter(*lstQ).order_by('aflnum')
-            if qsr.count() == 0:
+            if len(lNum) == 0:
                 return ""
             # Initializations
             prev_num = -1
             bRange = False  # In a range or not
-            for item in qsr:
-                num = item.aflnum
+            for num in lNum:
                 if prev_num == -1:
                     sBack += "{}".format(num)
                 elif prev_num + 1 == num:
@@ -2161,24 +2250,46 @@ class DialectCheckView(ListView):
                 sBack += "{}".format(num)
             return sBack
 
+        def get_afl_list(lDialect):
+            """Get the range-strings of the afleveringen in which the dialects [lDialect] occur"""
+
+            setAfl = set()
+            for item in lDialect:
+                setAfl |= dAflSet.get(item['id'], set())
+            lAfl = []
+            # Get a number of standard ranges
+            for oRange in ranges:
+                lNum = sorted([dAfl[id]['aflnum'] for id in setAfl if id in dAfl and dAfl[id]['deel__nummer'] == oRange['d'] and
+                               (oRange['s'] == None or dAfl[id]['sectie'] == oRange['s'])])
+                sBack = get_range(lNum, oRange['d'], oRange['s'])
+                if sBack != "": lAfl.append(sBack)
+            return lAfl
+
         # The set of ranges that cen be looked at
         ranges = [{'d': 1, 's': None}, {'d': 2, 's': None}, {'d': 3, 's': 1}, {'d': 3, 's': 2}, {'d': 3, 's': 3}, {'d': 3, 's': 4}]
+        oReport = {}
 
-        # Add my own stuff to the context
         # (1) Get a list of unique dialect names
-        qs = Dialect.objects.order_by(Lower('stad')).distinct().select_related()
-        d_list = []
-        for item in qs:
-            d_list.append({'id': item.id, 'stad': item.stad, 'nieuw': item.nieuw})
-        context['d_list']  = d_list
+        d_list = list(Dialect.objects.order_by(Lower('stad')).values('id', 'stad', 'nieuw'))
+        oReport['d_list']  = d_list
 
         # (2) Get a list of unique kloekecodes
-        qs = Dialect.objects.order_by(Lower('nieuw')).distinct().select_related()
-        k_list = []
-        for item in qs:
-            k_list.append({'id': item.id, 'stad': item.stad, 'nieuw': item.nieuw})
-        context['k_list']  = k_list
-
+        k_list = list(Dialect.objects.order_by(Lower('nieuw')).values('id', 'stad', 'nieuw'))
+        oReport['k_list']  = k_list
+
+        # The number of entries per dialect, and the afleveringen each dialect occurs in
+        dCount = {item['dialect']: item['num'] for item in Entry.objects.values('dialect').annotate(num=Count('id')).order_by()}
+        dAflSet = {}
+        for dialect_id, afl_id in Entry.objects.values_list('dialect', 'aflevering').distinct().order_by():
+            dAflSet.setdefault(dialect_id, set()).add(afl_id)
+        dAfl = {item['id']: item for item in Aflevering.objects.values('id', 'sectie', 'aflnum', 'deel__nummer')}
+
+        # The dialects per name and per kloekecode, disregarding case, in the order of their ids
+        dName = {}
+        dCode = {}
+        for item in sorted(d_list, key=lambda item: item['id']):
+            dName.setdefault(item['stad'].lower(), []).append(item)
+            dCode.setdefault(item['nieuw'].lower(), []).append(item)
 
         # (3) Get a list of all names that have more than one entry (modula case)
         d_double = []
@@ -2187,33 +2298,13 @@ class DialectCheckView(ListView):
             name = item['stad']
             if name != last_stad:
                 last_stad = name
-                qs = Dialect.objects.filter(Q(stad__iexact=name))
-                if qs.count()>1:
+                lDialect = dName[name.lower()]
+                if len(lDialect) > 1:
                     # Get all the codes and all the afl for this name
-                    lCode = []
-                    lAfl = []
-                    for d in qs:
-                        # Get all the entries that point to this dialect
-                        qse = Entry.objects.filter(dialect=d).distinct()
-                        qse_count = qse.count()
-                        # Check the code (nieuw) for this dialect
-                        if not d.nieuw in lCode:
-                            lCode.append({'nieuw': d.nieuw,'num': qse_count})
-                        # Check all the afl for this dialect
-                        qsa = Aflevering.objects.filter(entry__in=qse).distinct()
-                        for a in qsa:
-                            if not a.id in lAfl: lAfl.append(a.id)
-                    # Sort the list of afl
-                    qsa = Aflevering.objects.filter(id__in=lAfl).select_related().order_by('deel', 'sectie', 'aflnum')
-                    lAfl = []
-                    # Get a number of standard ranges
-                    for oRange in ranges:
-                        sBack = get_range(qsa, oRange['d'], oRange['s'])
-                        if sBack != "": lAfl.append(sBack)
-                    # Get all the afleveringen for this name
-                    oDouble = {'name': name, 'count': qs.count(), 'codes': lCode, 'afl_list': lAfl}
+                    lCode = [{'nieuw': d['nieuw'], 'num': dCount.get(d['id'], 0)} for d in lDialect]
+                    oDouble = {'name': name, 'count': len(lDialect), 'codes': lCode, 'afl_list': get_afl_list(lDialect)}
                     d_double.append(oDouble)
-        context['d_double'] = d_double
+        oReport['d_double'] = d_double
 
         # (4) Get a list of all kloekecodes that have more than one entry 
         k_double = []
@@ -2222,42 +2313,18 @@ class DialectCheckView(ListView):
             code = item['nieuw']
             if code != last_code:
                 last_code = code
-                # Get all the dialects with this particular kloekecode
-                qs = Dialect.objects.filter(Q(nieuw__iexact=code)).distinct()
-                if qs.count() > 1:
+                lDialect = dCode[code.lower()]
+                if len(lDialect) > 1:
                     # There is more than one city linked to this kloekecode
-                    lStad = []
-                    lAfl = []
-                    for d in qs:
-                        # Get all the entries that point to this dialect
-                        qse = Entry.objects.filter(dialect=d).distinct()
-                        qse_count = qse.count()
-                        # Check the city name (stad) for this dialect
-                        if not d.stad in lStad:
-                            lStad.append({'stad': d.stad,'num': qse_count})
-                        # Check all the afl for this dialect
-                        qsa = Aflevering.objects.filter(entry__in=qse).distinct()
-                        for a in qsa:
-                            if not a.id in lAfl: lAfl.append(a.id)
-                    # Sort the list of afl
-                    qsa = Aflevering.objects.filter(id__in=lAfl).select_related().order_by('deel', 'sectie', 'aflnum')
-                    lAfl = []
-                    # Get a number of standard ranges
-                    for oRange in ranges:
-                        sBack = get_range(qsa, oRange['d'], oRange['s'])
-                        if sBack != "": lAfl.append(sBack)
-                    # Get all the afleveringen for this code
-                    oDouble = {'code': code, 'count': qs.count(), 'cities': lStad, 'afl_list': lAfl}
+                    lStad = [{'stad': d['stad'], 'num': dCount.get(d['id'], 0)} for d in lDialect]
+                    oDouble = {'code': code, 'count': len(lDialect), 'cities': lStad, 'afl_list': get_afl_list(lDialect)}
                     k_double.append(oDouble)
-
-        context['k_double'] = k_double
+        oReport['k_double'] = k_double
 
         # (5) Get a list of all dialects that are used, but that do not have a coordinate
-        dc_list = Dialect.objects.filter(coordinate__isnull=True).order_by('stad').values('stad', 'nieuw', 'id')
-        context['dc_list'] = dc_list
+        oReport['dc_list'] = list(Dialect.objects.filter(coordinate__isnull=True).order_by('stad').values('stad', 'nieuw', 'id'))
 
-        # Return the context
-        return context
+        return oReport
 
     def get_queryset(self):
         qs = Dialect.objects.none()
@@ -2319,29 +2386,25 @@ class MijnListView(ListView):
 
         # Fine-tuning: search string is the LEMMA
         if 'search' in get and get['search'] != '':
-            val = adapt_search(get['search'])
+            val = get['search']
             # The main search is on the NAME of the mine
-            query = Q(naam__iregex=val) 
-
-            # check for possible exact numbers having been given
-            if re.match('^\d+$', val):
-                query = query | Q(sn__exact=val)
+            query = wildcard_filter('naam', val)
 
             # Apply the filter
             qs = qs.filter(query)
 
         # Check for toelichting
         if 'toelichting' in get and get['toelichting'] != '':
-            val = adapt_search(get['toelichting'])
+            val = get['toelichting']
             # query = Q(nieuw__istartswith=val)
-            query = Q(toelichting__iregex=val)
+            query = wildcard_filter('toelichting', val)
             qs = qs.filter(query)
 
         # Check for locatie
         if 'locatie' in get and get['locatie'] != '':
-            val = adapt_search(get['locatie'])
+            val = get['locatie']
             # query = Q(nieuw__istartswith=val)
-            query = Q(locatie__iregex=val)
+            query = wildcard_filter('locatie', val)
             qs = qs.filter(query)
 
         # Make sure we only have distinct values
@@ -0,0 +1,399 @@
+"""Translation of the user's wildcard search patterns into database filters.
+
+The search forms accept patterns with '*', '?' and '[...]' (as in fnmatch)
+and the word-boundary marker '#'. Translating all of these into an anchored
+regular expression means the database has to evaluate the (Python) REGEXP
+function on every row. Here each pattern is classified first:
+
+    exact       kat         equality on the lower-case search field
+    prefix      kat*        range on the lower-case search field
+    suffix      *kat        range on the reversed lower-case search field
+    infix       *kat*       GLOB on the lower-case search field
+    charclass   k?t, [kp]at GLOB on the lower-case search field, plus a range
+                            for a literal start (or end) of the pattern
+    word        kat#        regular expression (no index can be used)
+
+The lower-case and reversed fields ('woord_lower', 'woord_rev' etc.) exist for
+Entry.woord, Lemma.gloss, Trefwoord.woord, Dialect.stad and Dialect.nieuw (and
+are copied into the rows of EntrySearch, see entrysearch.py).
+Other fields, or a database where these fields have not been filled yet,
+fall back to the regular expression.
+
+When the user asks to ignore accents, the pattern is folded (case and
+diacritics removed) and matched against the '_fold' fields of Entry.woord,
+Lemma.gloss, Trefwoord.woord and Dialect.stad instead, in the same way; only
+suffixes cannot use an index there.
+
+The sort keys of Entry (see Entry.update_sortkeys) are copies of the '_lower'
+fields, and are filled together with the search fields. The same goes for the
+bitmask of mijnen of Entry (see Entry.update_mijnen), which mijn_filter() uses
+instead of joining EntryMijn, and for the visibility of Entry (see
+Entry.update_toonbaar), which toonbaar_filter() uses instead of joining the
+aflevering. Each of these has its own marker (see WILDCARD_MARKERS), which
+wildcard_refresh() sets and loading fixtures clears: a feature is only used
+while the columns it needs have been filled.
+"""
+
+import fnmatch
+import time
+from django.db import connection, transaction
+from django.db.models import Q, CharField, Lookup
+from django.db.models.functions import Lower, Reverse
+from django.db.models.signals import post_save
+from wld.dictionary.models import Entry, EntryMijn, Lemma, Trefwoord, Dialect, Aflevering, Mijn, Generation, \
+     get_search_key, get_search_key_rev, get_search_key_fold
+from wld.dictionary.fulltext import fulltext_add, trigram_filter
+from wld.utils import ErrHandle
+
+# The fields that have a '_lower' and a '_rev' search field
+WILDCARD_FIELDS = {'woord': [Entry, Trefwoord], 'gloss': [Lemma], 'stad': [Dialect], 'nieuw': [Dialect]}
+
+# The fields that (also) have a '_fold' search field, without case and accents
+FOLD_FIELDS = {'woord': [Entry, Trefwoord], 'gloss': [Lemma], 'stad': [Dialect]}
+
+# The markers of the derived columns (see Generation.get_filled): the '_lower', '_rev' and '_fold'
+#   search fields, and the sort keys, the mijnen and the visibility of Entry
+WILDCARD_MARKERS = ['searchfields', 'sortkeys', 'mijnen', 'toonbaar']
+
+# Loading fixtures leaves the derived columns empty: the markers cleared by loading objects of a model
+WILDCARD_SOURCES = {Entry: WILDCARD_MARKERS, Lemma: ['searchfields', 'sortkeys'],
+                    Trefwoord: ['searchfields', 'sortkeys'], Dialect: ['searchfields', 'sortkeys'],
+                    EntryMijn: ['mijnen'], Aflevering: ['toonbaar']}
+
+# Number of seconds during which the outcome of [wildcard_filled()] is kept
+WILDCARD_CHECK_SECONDS = 60
+
+# Process-local status of the derived columns: the markers that have been set, and those cleared by this process
+wildcard_status = {'checked': 0, 'filled': set(), 'cleared': set()}
+
+
+@CharField.register_lookup
+class Glob(Lookup):
+    """Case-sensitive GLOB pattern matching (SQLite only)"""
+
+    lookup_name = 'glob'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return "{} GLOB {}".format(lhs, rhs), lhs_params + rhs_params
+
+
+def wildcard_regex(val):
+    """Translate [val] into a regular expression (to be used with 'iregex')"""
+
+    # First trim
+    val = val.strip()
+    # Adapt for the use of '#'
+    if '#' in val:
+        val = r'(^|(.*\b))' + val.replace('#', r'((\b.*)|$)')
+        # Make sure to get the hyphen literally
+        val = val.replace("-", "\-")
+    else:
+        # Note: fnmatch already escapes the hyphen where needed
+        val = '^' + fnmatch.translate(val) + '$'
+    return val
+
+def wildcard_parse(val):
+    """Split pattern [val] into a list of parts, following fnmatch
+
+    Each part is a tuple: ('lit', text), ('any', '*'), ('one', '?') or ('class', '[...]').
+    The literal text and the classes are in lower case and in GLOB syntax.
+    Returns None if the pattern cannot be expressed as a GLOB.
+    """
+
+    lParts = []
+    i = 0
+    n = len(val)
+    while i < n:
+        c = val[i]
+        i += 1
+        if c == '*':
+            # Compress a sequence of stars into one
+            if len(lParts) == 0 or lParts[-1][0] != 'any':
+                lParts.append(('any', '*'))
+        elif c == '?':
+            lParts.append(('one', '?'))
+        elif c == '[':
+            j = i
+            if j < n and val[j] == '!':
+                j += 1
+            if j < n and val[j] == ']':
+                j += 1
+            while j < n and val[j] != ']':
+                j += 1
+            if j >= n:
+                # No closing bracket: fnmatch takes the '[' literally
+                lParts.append(('lit', '['))
+            else:
+                sClass = val[i:j]
+                i = j + 1
+                bNegate = sClass.startswith('!')
+                if bNegate:
+                    sClass = sClass[1:]
+                if '\\' in sClass or sClass == "":
+                    return None
+                # Ranges must stay ranges after converting to lower case
+                k = 0
+                while k + 2 < len(sClass):
+                    if sClass[k+1] == '-':
+                        sFrom = sClass[k]
+                        sUntil = sClass[k+2]
+                        if sFrom.isupper() != sUntil.isupper() or sFrom.lower() > sUntil.lower():
+                            return None
+                        k += 3
+                    else:
+                        k += 1
+                lParts.append(('class', "[{}{}]".format("^" if bNegate else "", sClass.lower())))
+        else:
+            if len(lParts) > 0 and lParts[-1][0] == 'lit':
+                lParts[-1] = ('lit', lParts[-1][1] + c.lower())
+            else:
+                lParts.append(('lit', c.lower()))
+    return lParts
+
+def wildcard_classify(val):
+    """Classify pattern [val]: return the kind of pattern and its parts"""
+
+    val = val.strip()
+    if '#' in val:
+        return 'word', None
+    lParts = wildcard_parse(val)
+    if lParts == None:
+        return 'regex', None
+    sShape = "".join([part[0][0] for part in lParts])
+    if sShape == "" or sShape == "l":
+        sKind = 'exact'
+    elif sShape == "a":
+        sKind = 'all'
+    elif sShape == "la":
+        sKind = 'prefix'
+    elif sShape == "al":
+        sKind = 'suffix'
+    elif sShape == "ala":
+        sKind = 'infix'
+    else:
+        sKind = 'charclass'
+    return sKind, lParts
+
+def wildcard_literals(val):
+    """Get the pieces of (lower-case) literal text that every match of pattern [val] contains"""
+
+    sKind, lParts = wildcard_classify(val)
+    if lParts == None:
+        return []
+    return [sPart for sType, sPart in lParts if sType == 'lit']
+
+def wildcard_filled(sMarker):
+    """Check if the derived column(s) [sMarker] (see WILDCARD_MARKERS) have been filled for all rows"""
+
+    oErr = ErrHandle()
+    iNow = time.time()
+    if iNow - wildcard_status['checked'] > WILDCARD_CHECK_SECONDS:
+        # A single lookup of the markers, instead of searching the columns for empty values
+        oFilled = Generation.get_filled(WILDCARD_MARKERS)
+        for sMissing in sorted(set(WILDCARD_MARKERS) - oFilled):
+            oErr.Status("wildcard_filled: {} have not been filled (see the command 'searchfields')".format(sMissing))
+        wildcard_status['filled'] = oFilled
+        wildcard_status['checked'] = iNow
+    return sMarker in wildcard_status['filled']
+
+def wildcard_ready():
+    """Check if the '_lower', '_rev' and '_fold' search fields have been filled"""
+
+    return wildcard_filled('searchfields')
+
+def sortkeys_ready():
+    """Check if the sort keys of Entry have been filled"""
+
+    return wildcard_filled('sortkeys')
+
+def wildcard_refresh():
+    """Fill the '_lower', '_rev' and '_fold' search fields of all Entry, Lemma, Trefwoord and Dialect objects, and the sort keys, mijnen and visibility of Entry
+
+    This is needed after loading fixtures, since that does not call the models' save() methods.
+    """
+
+    oErr = ErrHandle()
+    bResult = False
+    try:
+        iStart = time.time()
+        with transaction.atomic():
+            if connection.vendor == "sqlite":
+                # SQLite's own LOWER() only handles ASCII: use Python's version instead
+                connection.ensure_connection()
+                connection.connection.create_function("wld_search_key", 1, get_search_key)
+                connection.connection.create_function("wld_search_key_rev", 1, get_search_key_rev)
+                connection.connection.create_function("wld_search_key_fold", 1, get_search_key_fold)
+                with connection.cursor() as cursor:
+                    for sField, lModel in WILDCARD_FIELDS.items():
+                        for cls in lModel:
+                            sSql = "UPDATE {table} SET {field}_lower = wld_search_key({field}), " \
+                                   "{field}_rev = wld_search_key_rev({field})".format(
+                                       table=cls._meta.db_table, field=sField)
+                            if sField in FOLD_FIELDS:
+                                sSql += ", {field}_fold = wld_search_key_fold({field})".format(field=sField)
+                            cursor.execute(sSql)
+            else:
+                for sField, lModel in WILDCARD_FIELDS.items():
+                    for cls in lModel:
+                        cls.objects.update(**{"{}_lower".format(sField): Lower(sField),
+                                              "{}_rev".format(sField): Reverse(Lower(sField))})
+                        if sField in FOLD_FIELDS:
+                            # The database cannot remove accents itself
+                            sFold = "{}_fold".format(sField)
+                            lObj = list(cls.objects.only('id', sField))
+                            for obj in lObj:
+                                setattr(obj, sFold, get_search_key_fold(getattr(obj, sField)))
+                            cls.objects.bulk_update(lObj, [sFold], batch_size=1000)
+        # The sort keys of the entries are taken from the '_lower' fields, their mijnen from EntryMijn
+        #   and their visibility from the aflevering
+        Entry.update_sortkeys()
+        Entry.update_mijnen()
+        Entry.update_toonbaar()
+        for sMarker in WILDCARD_MARKERS:
+            Generation.set_filled(sMarker)
+        # Make sure the next search re-checks the fields
+        wildcard_status['cleared'] = set()
+        wildcard_status['checked'] = 0
+        oErr.Status("wildcard_refresh took {:.1f}s".format(time.time() - iStart))
+        bResult = True
+    except:
+        oErr.DoError("wildcard_refresh")
+    return bResult
+
+def get_range(path, sValue):
+    """Get a range filter on [path] for all values starting with [sValue]"""
+
+    sLast = sValue[-1]
+    iNext = ord(sLast) + 1
+    if iNext > 0x10ffff or (iNext >= 0xd800 and iNext <= 0xdfff):
+        return None
+    return Q(**{"{}__gte".format(path): sValue, "{}__lt".format(path): sValue[:-1] + chr(iNext)})
+
+def get_glob(lParts):
+    """Combine the [lParts] into a GLOB pattern"""
+
+    lGlob = []
+    for sType, sPart in lParts:
+        if sType == 'lit':
+            # The only special character that can occur in a literal
+            sPart = sPart.replace("[", "[[]")
+        lGlob.append(sPart)
+    return "".join(lGlob)
+
+def wildcard_compile(path, val, fold=False):
+    """Compile pattern [val] into a filter on [path]
+
+    With [fold] set, case and accents are ignored (where [path] has a '_fold' field).
+    Returns a tuple (Q-filter, indexed), where [indexed] is True if the filter
+    can be answered using a database index.
+    """
+
+    sField = path.split("__")[-1]
+    bFold = fold and sField in FOLD_FIELDS and wildcard_ready()
+    if bFold:
+        val = get_search_key_fold(val)
+    sKind, lParts = wildcard_classify(val)
+    bSqlite = (connection.vendor == "sqlite")
+    oQ = None
+    bIndexed = False
+    if sField in WILDCARD_FIELDS and sKind not in ['word', 'regex'] and wildcard_ready():
+        sLower = "{}_{}".format(path, "fold" if bFold else "lower")
+        # There is no reversed version of the '_fold' field
+        sRev = None if bFold else "{}_rev".format(path)
+        if sKind == 'all':
+            # Every (non-empty) value matches
+            oQ = Q(**{"{}__isnull".format(path): False})
+        elif sKind == 'exact':
+            sValue = lParts[0][1] if len(lParts) > 0 else ""
+            oQ = Q(**{sLower: sValue})
+            bIndexed = True
+        elif sKind == 'prefix':
+            oQ = get_range(sLower, lParts[0][1])
+            bIndexed = (oQ != None)
+        elif sKind == 'suffix' and sRev != None:
+            oQ = get_range(sRev, lParts[1][1][::-1])
+            bIndexed = (oQ != None)
+        if oQ == None and bSqlite:
+            # Infix, character classes (or a prefix/suffix without range)
+            oQ = Q(**{"{}__glob".format(sLower): get_glob(lParts)})
+            # Try to narrow down using the literal start or end of the pattern
+            if lParts[0][0] == 'lit':
+                oRange = get_range(sLower, lParts[0][1])
+            elif lParts[-1][0] == 'lit' and sRev != None:
+                oRange = get_range(sRev, lParts[-1][1][::-1])
+            else:
+                oRange = None
+            if oRange != None:
+                oQ = oRange & oQ
+                bIndexed = True
+    if oQ == None:
+        # Fall back to the regular expression
+        oQ = Q(**{"{}{}__iregex".format(path, "_fold" if bFold else ""): wildcard_regex(val)})
+    return oQ, bIndexed
+
+def wildcard_filter(path, val, fold=False):
+    """Get the cheapest Q-filter on [path] for pattern [val]"""
+
+    oQ, bIndexed = wildcard_compile(path, val, fold)
+    return oQ
+
+def wildcard_add(lstQ, path, val, fulltext=None, fold=False):
+    """Add the filter for pattern [val] on [path] to the list of filters [lstQ]
+
+    The optional [fulltext] is a tuple (field, target) for fulltext_add(): the
+    full-text pre-selection is only added if the filter itself cannot use an index.
+    Patterns the full-text index cannot help with (such as '*kaol*') are narrowed
+    down using the pieces of literal text they contain and the trigram index.
+    With [fold] set, case and accents are ignored; the full-text and trigram
+    indexes keep the accents, so they cannot be used then.
+    """
+
+    oQ, bIndexed = wildcard_compile(path, val, fold)
+    lstQ.append(oQ)
+    if fulltext != None and not bIndexed and not fold:
+        iCount = len(lstQ)
+        fulltext_add(lstQ, fulltext[0], val, fulltext[1])
+        if len(lstQ) == iCount:
+            oTrigram = trigram_filter(fulltext[0], wildcard_literals(val), fulltext[1])
+            if oTrigram != None:
+                lstQ.append(oTrigram)
+    return lstQ
+
+def mijn_filter(iMijn, path=""):
+    """Get a Q-filter on the entries (at [path]) of mijn [iMijn], and whether it joins EntryMijn
+
+    The bitmask of mijnen of the entry is used where possible. Only the join
+    may give an entry more than once, so only then DISTINCT is needed.
+    """
+
+    iMask = Mijn.get_mask(iMijn)
+    if iMask == None or not wildcard_filled('mijnen'):
+        return Q(**{"{}mijnlijst__id".format(path): iMijn}), True
+    return Q(**{"{}mijnen__hasbits".format(path): iMask}), False
+
+def toonbaar_filter(path=""):
+    """Get a Q-filter on the visible entries (at [path])
+
+    The copy of the visibility in the entry is used where possible; as long as
+    it has not been filled (e.g. after loading fixtures) the aflevering is used.
+    """
+
+    if not wildcard_filled('toonbaar'):
+        return Q(**{"{}aflevering__toonbaar".format(path): True})
+    return Q(**{"{}toonbaar".format(path): True})
+
+def wildcard_loaded(sender, instance, raw=False, **kwargs):
+    """Objects loaded from a fixture have no derived columns: clear the markers of [sender] (once per process)"""
+
+    if raw:
+        lMarker = [sMarker for sMarker in WILDCARD_SOURCES[sender] if sMarker not in wildcard_status['cleared']]
+        for sMarker in lMarker:
+            Generation.set_filled(sMarker, False)
+            wildcard_status['cleared'].add(sMarker)
+        if len(lMarker) > 0:
+            wildcard_status['checked'] = 0
+
+for cls in WILDCARD_SOURCES:
+    post_save.connect(wildcard_loaded, sender=cls)
@@ -115,6 +115,22 @@ class MapView(DetailView):
 
     def get_popup(self, entry):
         return "(no popup specified)"
+
+    def query_search(self, lstQ, path, val):
+        """Add the filter for the search string [val] on [path] (may be overridden)"""
+
+        comparison = "iexact"
+        if '*' in val or '[' in val or '?' in val or '#' in val:
+            val = adapt_search(val)
+            comparison = "iregex"
+        lstQ.append(Q(**{"{}__{}".format(path, comparison): val}))
+        return lstQ
+
+    def query_number(self, lstQ, path, iVal):
+        """Add the filter for the number [iVal] on [path] (may be overridden)"""
+
+        lstQ.append(Q(**{"{}".format(path): iVal}))
+        return lstQ
     
     def post(self, request, *args, **kwargs):
         # Formulate a response
@@ -122,16 +138,12 @@ class MapView(DetailView):
 
         def query_add(lstQ, val, path, type):
             if type == "str" and val != "" and val != None:
-                comparison = "iexact"
-                if '*' in val or '[' in val or '?' in val or '#' in val:
-                    val = adapt_search(val)
-                    comparison = "iregex"
-                lstQ.append(Q(**{"{}__{}".format(path, comparison): val}))
+                self.query_search(lstQ, path, val)
             elif type == "int" and val != "" and val != None:
                 if val.isdigit():
                     iVal = int(val)
                     if iVal>0:
-                        lstQ.append(Q(**{"{}".format(path): iVal}))
+                        self.query_number(lstQ, path, iVal)
 
         oErr = ErrHandle()
         try:
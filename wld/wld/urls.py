@@ -17,6 +17,7 @@ from wld.settings import APP_PREFIX
 import wld.dictionary.forms
 from wld.dictionary.views import *
 from wld.dictionary.adminviews import EntryListView, InfoListView
+from wld.dictionary.apiviews import EntryApiView, LemmaApiView, TrefwoordApiView, DialectApiView, AutocompleteView
 
 # Other Django stuff
 from django.conf.urls import include
@@ -60,6 +61,13 @@ urlpatterns = [
     url(r'^entry/(?P<pk>\d+)', DictionaryDetailView.as_view(), name='output'),
     url(r'^import/start/$', wld.dictionary.views.import_csv_start, name='import_start'),
     url(r'^import/progress/$', wld.dictionary.views.import_csv_progress, name='import_progress'),
+    url(r'^export/download/$', wld.dictionary.views.export_download, name='export_download'),
+    url(r'^export/artifact/$', wld.dictionary.views.export_artifact, name='export_artifact'),
+    url(r'^api/entries/$', EntryApiView.as_view(), name='api_entries'),
+    url(r'^api/lemmas/$', LemmaApiView.as_view(), name='api_lemmas'),
+    url(r'^api/trefwoorden/$', TrefwoordApiView.as_view(), name='api_trefwoorden'),
+    url(r'^api/dialects/$', DialectApiView.as_view(), name='api_dialects'),
+    url(r'^api/complete/(?P<field>\w+)/$', AutocompleteView.as_view(), name='api_complete'),
     url(r'^repair/$', permission_required('dictionary.search_gloss')(wld.dictionary.views.do_repair), name='repair'),
     url(r'^repair/start/$', wld.dictionary.views.do_repair_start, name='repair_start'),
     url(r'^repair/progress/$', wld.dictionary.views.do_repair_progress, name='repair_progress'),